@@ -0,0 +1,90 @@
+"""
+Measure the startup time of the `react-pages` CLI, on a fixture project.
+
+    $ python benchmarks/bench_cli_startup.py
+
+`develop --no-watch` includes the (node) compilation of a single tiny page,
+so it needs the cache to be built. (`react-pages --build-cache`)
+"""
+
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+from react_pages.core import find_npm_prefix
+
+CLI = [sys.executable, "-c", "from react_pages.cli import cli; cli()"]
+
+
+def make_project() -> Path:
+    project_dir = Path(tempfile.mkdtemp())
+    (project_dir / "package.json").write_text('{"name": "fixture", "private": true}')
+    (project_dir / "my_page").mkdir()
+    (project_dir / "my_page" / "index.js").write_text(
+        "document.getElementById('root').textContent = 'hello';\n"
+    )
+    # a nested cwd, so that the prefix has to be found by walking up
+    (project_dir / "my_page" / "components").mkdir()
+    return project_dir
+
+
+def time_command(args, cwd, repeat):
+    times = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        subprocess.run(
+            CLI + args,
+            cwd=cwd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        times.append(timeit.default_timer() - start)
+    return times
+
+
+def report(name, times, unit="ms", scale=1000):
+    print(
+        f"{name:>32}: min {min(times) * scale:8.1f} {unit}, "
+        f"median {statistics.median(times) * scale:8.1f} {unit}"
+    )
+
+
+def main():
+    project_dir = make_project()
+    nested_dir = project_dir / "my_page" / "components"
+
+    report(
+        "npm prefix (subprocess)",
+        timeit.repeat(
+            lambda: subprocess.run(
+                ["npm", "prefix"], cwd=nested_dir, stdout=subprocess.DEVNULL
+            ),
+            number=1,
+            repeat=5,
+        ),
+    )
+    report(
+        "find_npm_prefix() (python)",
+        [
+            t / 1000
+            for t in timeit.repeat(
+                lambda: find_npm_prefix(nested_dir), number=1000, repeat=5
+            )
+        ],
+        unit="us",
+        scale=1_000_000,
+    )
+
+    report("react-pages --cache", time_command(["--cache"], project_dir, 10))
+    report(
+        "react-pages develop --no-watch",
+        time_command(["develop", "--no-watch"], project_dir, 3),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compare the JSON serializer backends on large `js_context` payloads.
+
+    $ python benchmarks/bench_json_backends.py
+"""
+
+import datetime
+import decimal
+import timeit
+import uuid
+
+from django.conf import settings
+
+settings.configure()
+
+from react_pages.serializers import BACKENDS, get_backend  # noqa: E402
+
+
+def make_context(rows):
+    now = datetime.datetime(2018, 6, 1, 12, 30, 15, 123456)
+
+    return {
+        "user": {"id": 1, "name": "Jane Doe", "is_staff": False},
+        "rows": [
+            {
+                "id": i,
+                "uuid": uuid.UUID(int=i),
+                "title": f"Row number {i} – with some unicode ✓",
+                "price": decimal.Decimal(i) / 100,
+                "created": now + datetime.timedelta(minutes=i),
+                "date": (now + datetime.timedelta(days=i)).date(),
+                "tags": ["a", "b", "c"],
+                "score": i * 0.5,
+            }
+            for i in range(rows)
+        ],
+    }
+
+
+def main():
+    for rows in (100, 10_000, 100_000):
+        ctx = make_context(rows)
+        print(f"{rows} rows:")
+
+        for name in BACKENDS:
+            try:
+                backend = get_backend(name)
+            except ImportError:
+                print(f"  {name:>8}: not installed")
+                continue
+
+            number = max(1, 100_000 // rows)
+            size = len(backend.dumps(ctx))
+            t = min(timeit.repeat(lambda: backend.dumps(ctx), number=number, repeat=3))
+            print(
+                f"  {name:>8}: {t / number * 1000:10.3f} ms/op  ({size / 1024:.1f} KiB)"
+            )
+
+
+if __name__ == "__main__":
+    main()
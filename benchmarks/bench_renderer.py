@@ -0,0 +1,83 @@
+"""
+Compare the pre-compiled page renderer against the django template engine.
+
+    $ python benchmarks/bench_renderer.py
+"""
+
+import tempfile
+import timeit
+from pathlib import Path
+
+from django.conf import settings
+
+project_dir = Path(tempfile.mkdtemp())
+(project_dir / "my_page").mkdir()
+(project_dir / "build" / "my_page").mkdir(parents=True)
+(project_dir / "build" / "my_page" / "index.html").write_text(
+    "<!doctype html><html><head><title>My Page</title>"
+    + '<link href="/static/my_page/css/main.1234abcd.css" rel="stylesheet">' * 5
+    + '</head><body><div id="root"></div>'
+    + "<p>"
+    + "lorem ipsum dolor sit amet " * 2000
+    + "</p>"
+    + '<script type="text/javascript" src="/static/my_page/js/main.1234abcd.js"></script>'
+    + "</body></html>"
+)
+
+settings.configure(
+    REACT_PAGES_PROJECT_DIR=str(project_dir),
+    INSTALLED_APPS=["react_pages"],
+    TEMPLATES=[
+        {
+            "BACKEND": "django.template.backends.django.DjangoTemplates",
+            "APP_DIRS": True,
+        }
+    ],
+)
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.shortcuts import render  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+
+from react_pages.templatetags.react_pages import (  # noqa: E402
+    get_page_renderer,
+    render_react_page,
+    serialize_js_context,
+)
+
+
+def make_js_context():
+    return {
+        f"var_{i}": {"id": i, "name": f"item {i}", "tags": ["a", "b"]}
+        for i in range(50)
+    }
+
+
+def render_with_template(request):
+    context = render_react_page("my_page", **make_js_context())
+    return render(request, "react_pages_include_tag.html", context)
+
+
+def render_with_renderer(request):
+    js_vars, preload = serialize_js_context("my_page", make_js_context())
+    return get_page_renderer("my_page").render(js_vars, preload)
+
+
+def main():
+    request = RequestFactory().get("/")
+    number = 2000
+
+    for name, func in (
+        ("template engine", render_with_template),
+        ("pre-compiled", render_with_renderer),
+    ):
+        func(request)  # warm up
+        t = min(timeit.repeat(lambda: func(request), number=number, repeat=3))
+        print(f"{name:>16}: {t / number * 1_000_000:10.1f} us/op")
+
+
+if __name__ == "__main__":
+    main()
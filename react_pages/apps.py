@@ -0,0 +1,37 @@
+import logging
+from time import perf_counter
+
+from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger("react_pages")
+
+
+class ReactPagesConfig(AppConfig):
+    name = "react_pages"
+    verbose_name = "React Pages"
+
+    def ready(self):
+        # connect the receivers that reset the cached settings, and the system checks
+        from react_pages import checks, conf  # noqa: F401
+
+        if getattr(settings, "REACT_PAGES_WARM_PAGES", False):
+            self.warm_pages()
+
+    def warm_pages(self):
+        """
+        Load (and pre-split) every built page into the page store,
+        so that a fresh worker is hot before it accepts traffic.
+        """
+
+        from react_pages.templatetags.react_pages import warm_pages
+
+        s = perf_counter()
+        count, size = warm_pages()
+
+        logger.info(
+            "React Pages: Warmed %d page(s), %d bytes, in %.1f ms",
+            count,
+            size,
+            (perf_counter() - s) * 1000,
+        )
@@ -0,0 +1,35 @@
+EARLY_HINT_EXTENSION = "http.response.early_hint"
+
+# The scope key, where `EarlyHintsMiddleware` places its sender
+SEND_EARLY_HINTS = "react_pages.send_early_hints"
+
+
+class EarlyHintsMiddleware:
+    """
+    An ASGI middleware that lets react page views send a
+    "103 Early Hints" response, if the server supports it.
+    (i.e. the ASGI "http.response.early_hint" extension)
+
+        application = EarlyHintsMiddleware(get_asgi_application())
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and EARLY_HINT_EXTENSION in scope.get(
+            "extensions", {}
+        ):
+
+            async def send_early_hints(links):
+                await send(
+                    {
+                        "type": EARLY_HINT_EXTENSION,
+                        "links": [link.encode("latin-1") for link in links],
+                    }
+                )
+
+            scope = dict(scope)
+            scope[SEND_EARLY_HINTS] = send_early_hints
+
+        await self.app(scope, receive, send)
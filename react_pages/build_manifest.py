@@ -0,0 +1,156 @@
+"""
+Content fingerprints of pages, used to skip re-building unchanged pages on deploy.
+
+A page's fingerprint covers -
+    - its source tree
+    - the modules it resolved during its last build (see DEPS_FILENAME)
+    - the project's package-lock.json and .env files
+    - the environment variables inlined into the bundles (REACT_APP_*, ...)
+    - the react-pages webpack configs & scripts (and their package versions)
+    - the build settings (public url etc.)
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+BUILD_MANIFEST_FILENAME = ".react-pages-build.json"
+
+# Written by `scripts/compile_page.js` into a page's dest dir, after a successful build.
+DEPS_FILENAME = ".react-pages-deps.json"
+
+# Not part of a page's source tree
+IGNORED_DIRS = {"node_modules", "build", "__pycache__"}
+
+# i.e. `.env`, `.env.local`, `.env.production`, ... (see "config/env.js")
+ENV_FILE_RE = re.compile(r"^\.env(\..+)?$")
+
+# The environment variables inlined into the bundles (see "config/env.js")
+ENV_VAR_RE = re.compile(r"^REACT_APP_", re.IGNORECASE)
+ENV_VARS = ("NODE_PATH", "PUBLIC_URL")
+
+# The build settings that affect the output
+FINGERPRINTED_SETTINGS = ("deploy", "public url", "src path", "html template")
+
+
+def _hash_file(h, path: Path):
+    h.update(str(path).encode())
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+    except (FileNotFoundError, IsADirectoryError):
+        h.update(b"\0missing")
+
+
+def _iter_tree(root: Path):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames if d not in IGNORED_DIRS and not d.startswith(".")
+        )
+        for filename in sorted(filenames):
+            if not filename.startswith("."):
+                yield Path(dirpath) / filename
+
+
+def _iter_env_files(npm_prefix: Path):
+    try:
+        names = sorted(os.listdir(npm_prefix))
+    except FileNotFoundError:
+        return
+    for name in names:
+        if ENV_FILE_RE.match(name):
+            yield npm_prefix / name
+
+
+def get_toolchain_fingerprint(npm_prefix: Path, cache_dir: Path) -> str:
+    h = hashlib.sha256()
+
+    for path in (
+        npm_prefix / "package-lock.json",
+        cache_dir / "package.json",
+        cache_dir / "package-lock.json",
+    ):
+        _hash_file(h, path)
+
+    for path in _iter_env_files(npm_prefix):
+        _hash_file(h, path)
+
+    h.update(
+        json.dumps(
+            {
+                key: value
+                for key, value in os.environ.items()
+                if ENV_VAR_RE.match(key) or key in ENV_VARS
+            },
+            sort_keys=True,
+        ).encode()
+    )
+
+    for tree in (cache_dir / "config", cache_dir / "scripts"):
+        for path in _iter_tree(tree):
+            _hash_file(h, path)
+
+    return h.hexdigest()
+
+
+def get_page_fingerprint(settings: dict, toolchain_fingerprint: str) -> str:
+    h = hashlib.sha256(toolchain_fingerprint.encode())
+
+    h.update(
+        json.dumps(
+            [settings[key] for key in FINGERPRINTED_SETTINGS], sort_keys=True
+        ).encode()
+    )
+
+    src_path = Path(settings["src path"])
+    page_dir = src_path.parent
+
+    for path in _iter_tree(page_dir):
+        _hash_file(h, path)
+    _hash_file(h, Path(settings["html template"]))
+
+    # the modules resolved during the last build, outside the page dir
+    for path in load_deps(Path(settings["dest dir"])):
+        if page_dir not in path.parents:
+            _hash_file(h, path)
+
+    return h.hexdigest()
+
+
+def load_deps(dest_dir: Path):
+    try:
+        with open(dest_dir / DEPS_FILENAME, "r") as f:
+            return sorted(Path(path) for path in json.load(f))
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+class BuildManifest:
+    """The fingerprints of built pages, keyed by their dest dir."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+        try:
+            with open(path, "r") as f:
+                self.pages = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.pages = {}
+
+    def is_unchanged(self, dest_dir: Path, fingerprint: str) -> bool:
+        return (
+            self.pages.get(str(dest_dir)) == fingerprint
+            and (dest_dir / "index.html").exists()
+        )
+
+    def record(self, dest_dir: Path, fingerprint: str):
+        self.pages[str(dest_dir)] = fingerprint
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.pages, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,78 @@
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+from react_pages import data_store
+
+logger = logging.getLogger("react_pages")
+
+# Caches that aren't shared across processes
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+}
+DUMMY_CACHES = {
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register(Tags.caches)
+def check_data_cache(app_configs, **kwargs):
+    """
+    The deferred js context values are fetched by the browser in a separate request,
+    which may be served by another process, so they need a shared cache.
+    """
+
+    if data_store.get_threshold() is None:
+        return []
+
+    return get_data_cache_errors()
+
+
+@lru_cache(maxsize=None)
+def warn_deferred_data_cache():
+    """
+    Log the problems with the data cache (once),
+    when `Deferred` is used explicitly, which the system checks can't see.
+    """
+
+    for error in get_data_cache_errors():
+        logger.warning(str(error))
+
+
+def get_data_cache_errors():
+    alias = data_store.get_cache_alias()
+    try:
+        backend = settings.CACHES[alias]["BACKEND"]
+    except KeyError:
+        return [
+            Error(
+                f"React Pages: REACT_PAGES_DATA_CACHE {repr(alias)} "
+                f"isn't one of the CACHES.",
+                id="react_pages.E001",
+            )
+        ]
+
+    if backend in DUMMY_CACHES:
+        return [
+            Error(
+                f"React Pages: The cache {repr(alias)} doesn't store anything, "
+                f"so deferred js context values can never be fetched.",
+                hint="Set REACT_PAGES_DATA_CACHE to a shared cache (e.g. redis).",
+                id="react_pages.E002",
+            )
+        ]
+
+    if backend in PROCESS_LOCAL_CACHES:
+        return [
+            Warning(
+                f"React Pages: The cache {repr(alias)} is local to each process, "
+                f"so deferred js context values may not be found "
+                f"when served by more than one worker process.",
+                hint="Set REACT_PAGES_DATA_CACHE to a shared cache (e.g. redis).",
+                id="react_pages.W001",
+            )
+        ]
+
+    return []
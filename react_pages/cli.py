@@ -6,10 +6,10 @@ from functools import wraps
 from pathlib import Path
 
 import click
-import dotenv
 from crayons import *
 
 from react_pages.core import build, do_build_cache, clear_cahce, \
+    compile_cache_stats, prune_compile_cache, get_npm_prefix, \
     CACHE_DIR, PACKAGE_JSON, copy_files_safe, print_truncated
 
 SPINNER = 'moon'
@@ -30,6 +30,28 @@ def get_build_decorator(*, deploy):
         @click.option('-v', '--verbose',
                       is_flag=True,
                       help='Verbose compiler output')
+        @click.option('-j', '--jobs',
+                      type=click.IntRange(min=1),
+                      default=1,
+                      show_default=True,
+                      help='No. of worker processes to compile the pages in '
+                           '(1 compiles all of them in this process, interleaved)')
+        @click.option('--worker-memory',
+                      type=click.IntRange(min=1),
+                      help='Memory limit (in MB) for each worker process')
+        @click.option('--debounce',
+                      type=click.IntRange(min=0),
+                      default=200,
+                      show_default=True,
+                      help='Time (in ms) to wait for more file changes, '
+                           'before re-building in watch mode')
+        @click.option('--keep-versions',
+                      type=click.IntRange(min=1),
+                      default=3600,
+                      show_default=True,
+                      help='Time (in seconds) to keep the previous builds of a page, '
+                           'after a new one is published, '
+                           'for the requests still using them')
         @click.option('--static-url',
                       help='''
                       The base url for static assets (css / js/ media). 
@@ -43,6 +65,20 @@ def get_build_decorator(*, deploy):
             build(*args, **kwargs, deploy=deploy)
             return val
 
+        if deploy:
+            wrapper = click.option('--shared-chunks',
+                                   is_flag=True,
+                                   help='Compile all pages together, '
+                                        'with the code shared between them '
+                                        '(e.g. react) in a common vendor chunk. '
+                                        'The --static-url must then point '
+                                        'to the build dir, without `{page name}`.')(wrapper)
+            wrapper = click.option('--force',
+                                   is_flag=True,
+                                   help='Re-build every page, '
+                                        'even the ones that are unchanged '
+                                        'since the last deploy')(wrapper)
+
         return wrapper
 
     return build_decorator
@@ -151,6 +187,8 @@ def init_page(page_name):
         # update .env
         dotenv_path = Path.cwd() / '.env'
         if dotenv_path.exists():
+            import dotenv
+
             node_path = dotenv.get_key(str(dotenv_path), 'NODE_PATH') or "."
             page_node_path = os.path.relpath(page_dir, dotenv_path.parent)
 
@@ -182,6 +220,9 @@ def deploy():
     Start a file watcher,
     and create a production build when a file change is observed.
 
+    With --no-watch, pages that are unchanged since the last deploy
+    (same sources, dependencies, lockfile and build settings) are skipped.
+
     Output location: {npm prefix}/build/{page name}/js/bundle.js.
 
     {npm prefix} is the output of the "npm prefix" command.
@@ -219,6 +260,42 @@ def develop():
     check_cache()
 
 
+@click.command(short_help='Pack the built pages into a single file')
+@click.option('--build-dir',
+              type=click.Path(exists=True, file_okay=False),
+              help='the build directory (default: {npm prefix}/build)')
+def pack(build_dir):
+    """
+    Pack every built page into a single, memory-mappable file,
+    that is shared by all the django worker processes.
+
+    (use with REACT_PAGES_PAGE_STORE = "mmap")
+
+    Output location: {build dir}/pages.pack
+    """
+
+    from react_pages.page_pack import write_pack
+
+    if build_dir is None:
+        build_dir = get_npm_prefix() / 'build'
+
+    print(
+        '{} {}…'.format(
+            white('Packing pages in', bold=True),
+            green(build_dir, bold=True),
+        )
+    )
+
+    index = write_pack(Path(build_dir))
+
+    for page_name in index['pages']:
+        print(blue(f'Packed {page_name}'))
+    print(
+        cyan(f'Done! (generation {index["generation"]}, '
+             f'{len(index["pages"])} page(s))')
+    )
+
+
 @click.command(
     short_help='manage.py runserver alternative',
     context_settings={'ignore_unknown_options': True,
@@ -262,11 +339,98 @@ def runserver(runserver_args):
             'directory containing "manage.py".'))
 
 
+@click.group(short_help='Manage the build daemon')
+def daemon():
+    """
+    A background build daemon, that keeps a warm compiler per page in memory.
+
+    While it runs, `react-pages develop / deploy --no-watch` use it,
+    instead of starting node (and compiling every page) from scratch.
+
+    One daemon per project and mode. (develop / deploy)
+    """
+
+
+def daemon_mode_option(func):
+    return click.option('--deploy',
+                        is_flag=True,
+                        help='The daemon for production builds')(func)
+
+
+def get_daemon_client(deploy):
+    from react_pages.daemon import get_running_daemon
+
+    client = get_running_daemon(get_npm_prefix(), deploy)
+    if client is None:
+        exit(red('The build daemon is not running!'))
+    return client
+
+
+@daemon.command('start', short_help='Start the build daemon')
+@daemon_mode_option
+def daemon_start(deploy):
+    from react_pages.daemon import DaemonError, start_daemon
+
+    check_cache()
+
+    try:
+        client = start_daemon(get_npm_prefix(), deploy)
+    except DaemonError as e:
+        exit(red(e))
+
+    status = client.status()
+    print(cyan(f'Build daemon running (pid {status["pid"]}, {status["mode"]}) '
+               f'on {client.socket_path}'))
+
+
+@daemon.command('stop', short_help='Stop the build daemon')
+@daemon_mode_option
+def daemon_stop(deploy):
+    get_daemon_client(deploy).shutdown()
+    print(cyan('Done!'))
+
+
+@daemon.command('status', short_help='Show the status of the build daemon')
+@daemon_mode_option
+def daemon_status(deploy):
+    status = get_daemon_client(deploy).status()
+
+    print(cyan(f'Build daemon running (pid {status["pid"]}, {status["mode"]}), '
+               f'up for {status["uptime"]:.0f}s'))
+    for page_name in status['pages']:
+        print(blue(f'  {page_name}'))
+
+
+@daemon.command('stats', short_help='Show the build stats of the build daemon')
+@daemon_mode_option
+def daemon_stats(deploy):
+    stats = get_daemon_client(deploy).stats()
+
+    print(white(f'Memory: {stats["memory"]["rss"] / 1024 / 1024:.0f} MB rss, '
+                f'{stats["memory"]["heap_used"] / 1024 / 1024:.0f} MB heap',
+                bold=True))
+    for page in stats['pages']:
+        duration = page['last_duration']
+        print('  {} {} builds, last took {}'.format(
+            magenta(page['name'], bold=True),
+            page['builds'],
+            green(f'{duration / 1000:.1f}s') if duration is not None else '-',
+        ))
+
+
 @click.group(invoke_without_command=True)
 @click.option('--cache', help='Output the cache location.', is_flag=True)
 @click.option('--build-cache', help='Rebuild the cache.', is_flag=True)
 @click.option('--rm', help='Clear the cache.', is_flag=True)
-def cli(cache, build_cache, rm):
+@click.option('--cache-stats',
+              help='Show the size of the compilation (babel / uglify) cache.',
+              is_flag=True)
+@click.option('--prune-cache',
+              type=click.IntRange(min=0),
+              metavar='MB',
+              help='Evict the least recently used entries '
+                   'from the compilation cache, until it fits in MB megabytes.')
+def cli(cache, build_cache, rm, cache_stats, prune_cache):
     if cache:
         print(CACHE_DIR)
         exit()
@@ -279,12 +443,22 @@ def cli(cache, build_cache, rm):
         clear_cahce()
         exit()
 
+    if cache_stats:
+        compile_cache_stats()
+        exit()
+
+    if prune_cache is not None:
+        prune_compile_cache(prune_cache)
+        exit()
+
 
 cli.add_command(init_project)
 cli.add_command(init_page)
 cli.add_command(deploy)
 cli.add_command(develop)
 cli.add_command(runserver)
+cli.add_command(pack)
+cli.add_command(daemon)
 
 if __name__ == '__main__':
     cli()
@@ -0,0 +1,76 @@
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.templatetags.static import static
+
+from react_pages.checks import warn_deferred_data_cache
+from react_pages.page_pack import PACK_FILENAME, MmapPageStore
+from react_pages.page_store import PageStore
+from react_pages.serializers import get_default_backend
+
+
+@lru_cache(maxsize=None)
+def get_project_dir() -> Path:
+    try:
+        return Path(settings.REACT_PAGES_PROJECT_DIR).resolve()
+    except AttributeError:
+        raise ImproperlyConfigured(
+            'React Pages: Please specify "REACT_PAGES_PROJECT_DIR" '
+            "in your settings.py!"
+        )
+
+
+def get_build_dir() -> Path:
+    return get_project_dir() / "build"
+
+
+def get_chunk_url(manifest: dict, path: str) -> str:
+    """The url of a shared chunk, from a page's manifest."""
+
+    public_url = manifest.get("public url")
+    if public_url is not None:
+        return public_url.rstrip("/") + "/" + path
+
+    # the build dir is one of the STATICFILES_DIRS
+    return static(path)
+
+
+@lru_cache(maxsize=None)
+def get_page_store():
+    check_interval = getattr(settings, "REACT_PAGES_PAGE_CACHE_CHECK_INTERVAL", 1.0)
+
+    page_store = PageStore(
+        get_build_dir(),
+        max_size=getattr(settings, "REACT_PAGES_PAGE_CACHE_SIZE", 128),
+        check_interval=check_interval,
+        inline_css_max_size=getattr(settings, "REACT_PAGES_INLINE_CSS_MAX_SIZE", None),
+        chunk_url=get_chunk_url,
+    )
+
+    backend = getattr(settings, "REACT_PAGES_PAGE_STORE", "memory")
+    if backend == "memory":
+        return page_store
+    elif backend == "mmap":
+        return MmapPageStore(
+            getattr(settings, "REACT_PAGES_PAGE_PACK", get_build_dir() / PACK_FILENAME),
+            page_store,
+            check_interval=check_interval,
+        )
+    else:
+        raise ImproperlyConfigured(
+            f"React Pages: Unknown REACT_PAGES_PAGE_STORE {repr(backend)}. "
+            f'Choose one of "memory", "mmap".'
+        )
+
+
+@receiver(setting_changed)
+def clear_caches(setting, **kwargs):
+    if setting.startswith("REACT_PAGES_"):
+        get_project_dir.cache_clear()
+        get_page_store.cache_clear()
+        get_default_backend.cache_clear()
+        warn_deferred_data_cache.cache_clear()
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache, wraps
+from time import monotonic
+
+from django.db import connections
+from django.utils import translation
+
+logger = logging.getLogger("react_pages")
+
+_MISSING = object()
+
+
+class ContextProvider:
+    __slots__ = ("name", "attr_name", "timeout", "default")
+
+    def __init__(self, name, attr_name, timeout, default):
+        self.name = name
+        self.attr_name = attr_name
+        self.timeout = timeout
+        self.default = default
+
+    def get_timeout(self, view):
+        if self.timeout is not None:
+            return self.timeout
+        return view.context_provider_timeout
+
+
+def context_provider(name=None, *, timeout=None, default=_MISSING):
+    """
+    Mark a view method as a context provider.
+
+    All the context providers of a view run concurrently (alongside `get_js_context()`),
+    and their results are merged into the `js_context`, under `name`.
+    (defaults to the name of method)
+
+    If a provider takes longer than `timeout` seconds,
+    `default` is used instead, or `TimeoutError` is raised if there isn't one.
+
+        class MyPageView(ReactPageView):
+            page_name = "my_page"
+
+            @context_provider(timeout=0.5, default=[])
+            def recommendations(self):
+                return fetch_recommendations(self.request.user)
+
+    Providers may be async functions as well.
+
+    In `ReactPageView`, providers run in threads (with the request's language active),
+    so they don't share the request's transaction (e.g. with `ATOMIC_REQUESTS`),
+    and one that times out is left running in its thread, until it returns.
+    """
+
+    def decorator(func):
+        func.react_pages_context_provider = (name or func.__name__, timeout, default)
+        return func
+
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def get_context_providers(view_cls):
+    providers = []
+
+    for attr_name in dir(view_cls):
+        attr = getattr(view_cls, attr_name, None)
+
+        try:
+            name, timeout, default = attr.react_pages_context_provider
+        except AttributeError:
+            continue
+
+        providers.append(ContextProvider(name, attr_name, timeout, default))
+
+    return tuple(providers)
+
+
+def _timed_out(view, provider):
+    if provider.default is _MISSING:
+        raise TimeoutError(
+            f"React Pages: The context provider {repr(provider.name)} "
+            f"of {view.__class__} timed out, "
+            f"after {provider.get_timeout(view)} seconds."
+        )
+
+    return provider.default
+
+
+def _in_thread(func):
+    # Threads don't inherit the active language of the request.
+    language = translation.get_language()
+
+    # Every thread gets its own db connections, which must be closed.
+    @wraps(func)
+    def wrapper(*args):
+        try:
+            with translation.override(language):
+                return func(*args)
+        finally:
+            connections.close_all()
+
+    return wrapper
+
+
+def gather_context(view, get_js_context) -> tuple:
+    """
+    Call `get_js_context()` on the current thread,
+    while the context providers of view run concurrently, in threads.
+
+    Returns `(js_context, provided_js_context)`.
+    """
+
+    providers = get_context_providers(type(view))
+    if not providers:
+        return get_js_context(), {}
+
+    start = monotonic()
+    pool = ThreadPoolExecutor(max_workers=len(providers))
+    futures = []
+
+    try:
+        for provider in providers:
+            func = getattr(view, provider.attr_name)
+            if asyncio.iscoroutinefunction(func):
+                futures.append(pool.submit(_in_thread(asyncio.run), func()))
+            else:
+                futures.append(pool.submit(_in_thread(func)))
+
+        js_context = get_js_context()
+
+        provided_js_context = {}
+        for provider, future in zip(providers, futures):
+            timeout = provider.get_timeout(view)
+            if timeout is not None:
+                timeout = max(0, start + timeout - monotonic())
+
+            try:
+                provided_js_context[provider.name] = future.result(timeout)
+            except FutureTimeoutError:
+                if not future.cancel():
+                    # threads can't be stopped
+                    logger.warning(
+                        "React Pages: The context provider %r of %s timed out, "
+                        "and is left running in a thread.",
+                        provider.name,
+                        view.__class__,
+                    )
+                provided_js_context[provider.name] = _timed_out(view, provider)
+
+        return js_context, provided_js_context
+    finally:
+        # don't start the ones still queued, if something failed
+        for future in futures:
+            future.cancel()
+        # and don't wait for the ones that timed out
+        pool.shutdown(wait=False)
+
+
+async def agather_context(view, get_js_context) -> tuple:
+    """
+    Await `get_js_context()`,
+    while the context providers of view run concurrently, on the event loop.
+
+    Returns `(js_context, provided_js_context)`.
+    """
+
+    from asgiref.sync import sync_to_async
+
+    providers = get_context_providers(type(view))
+    if not providers:
+        return await get_js_context(), {}
+
+    start = monotonic()
+
+    tasks = []
+    for provider in providers:
+        func = getattr(view, provider.attr_name)
+        if asyncio.iscoroutinefunction(func):
+            coro = func()
+        else:
+            coro = sync_to_async(_in_thread(func), thread_sensitive=False)()
+        tasks.append(asyncio.ensure_future(coro))
+
+    try:
+        js_context = await get_js_context()
+
+        provided_js_context = {}
+        for provider, task in zip(providers, tasks):
+            timeout = provider.get_timeout(view)
+            if timeout is not None:
+                timeout = max(0, start + timeout - monotonic())
+
+            # unlike `asyncio.wait_for()`, this won't wait for the cancellation
+            # (which, for a sync provider, means waiting for its thread to finish)
+            await asyncio.wait({task}, timeout=timeout)
+
+            if task.done():
+                provided_js_context[provider.name] = task.result()
+            else:
+                task.cancel()
+                provided_js_context[provider.name] = _timed_out(view, provider)
+    except BaseException:
+        # don't leave the rest running, and never awaited
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    return js_context, provided_js_context
@@ -1,12 +1,23 @@
 import base64
 import hashlib
 import json
+import os
 import shutil
 import subprocess
+import tempfile
+import time
+from functools import lru_cache
 from pathlib import Path
 
 from crayons import *
-from halo import Halo
+
+from react_pages.build_manifest import (
+    BUILD_MANIFEST_FILENAME,
+    DEPS_FILENAME,
+    BuildManifest,
+    get_page_fingerprint,
+    get_toolchain_fingerprint,
+)
 
 SPINNER = "moon"
 
@@ -17,7 +28,14 @@ def _get_path_hash(location):
     return encoded_hash
 
 
-CACHE_DIR = Path.home() / ".react-pages" / _get_path_hash(Path(__file__)) / "nodejs"
+REACT_PAGES_HOME = Path.home() / ".react-pages"
+
+CACHE_DIR = REACT_PAGES_HOME / _get_path_hash(Path(__file__)) / "nodejs"
+
+# The babel-loader & uglify caches.
+# Kept outside CACHE_DIR, so that they survive a rebuild of the cache.
+# (The entries are keyed by tool versions anyway)
+COMPILE_CACHE_DIR = CACHE_DIR.parent / "compile-cache"
 
 PACKAGE_JSON = {
     "name": "",
@@ -28,24 +46,158 @@ PACKAGE_JSON = {
 }
 
 
-def overwrite_cache_files():
+# node_modules, keyed by the hash of "package-lock.json".
+# Shared by the cache dirs of every react-pages install, using hard links.
+NODE_MODULES_STORE = REACT_PAGES_HOME / "node_modules"
+
+# The npm (tarball) cache, used to install offline whenever possible.
+NPM_CACHE_DIR = REACT_PAGES_HOME / "npm-cache"
+
+# The "package-lock.json" hash, of the node_modules installed in CACHE_DIR
+LOCK_HASH_FILENAME = ".react-pages-lock-hash"
+
+# Never synced / removed, by `sync_cache_files()`
+CACHE_DIR_IGNORED = {"node_modules", LOCK_HASH_FILENAME}
+
+
+def _files_differ(a: Path, b: Path) -> bool:
+    try:
+        if a.stat().st_size != b.stat().st_size:
+            return True
+    except FileNotFoundError:
+        return True
+    return a.read_bytes() != b.read_bytes()
+
+
+def sync_cache_files():
+    """
+    Bring the files in CACHE_DIR up to date with the ones in the package,
+    copying only the ones that changed, and removing the stale ones.
+
+    Return the no. of files that changed.
+    """
+
+    src_dir = Path(__file__).parent / "nodejs"
+    changed = 0
+
+    src_files = set()
+    for src in src_dir.rglob("*"):
+        rel = src.relative_to(src_dir)
+        if rel.parts[0] in CACHE_DIR_IGNORED or not src.is_file():
+            continue
+        src_files.add(rel)
+
+        dest = CACHE_DIR / rel
+        if _files_differ(src, dest):
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(src, dest)
+            changed += 1
+
     if CACHE_DIR.exists():
-        shutil.rmtree(CACHE_DIR)
+        for dest in sorted(CACHE_DIR.rglob("*"), reverse=True):
+            rel = dest.relative_to(CACHE_DIR)
+            if rel.parts[0] in CACHE_DIR_IGNORED:
+                continue
+            if dest.is_dir():
+                if not any(dest.iterdir()):
+                    dest.rmdir()
+            elif rel not in src_files:
+                dest.unlink()
+                changed += 1
 
-    shutil.copytree(Path(__file__).parent.joinpath("nodejs"), CACHE_DIR)
+    return changed
 
-    return CACHE_DIR
 
+def get_lock_hash() -> str:
+    return hashlib.sha256((CACHE_DIR / "package-lock.json").read_bytes()).hexdigest()
+
+
+def _link_tree(src: Path, dest: Path):
+    def link(src, dest):
+        try:
+            os.link(src, dest)
+        except OSError:
+            # e.g. the store is on a different device
+            shutil.copy2(src, dest)
+
+    shutil.copytree(src, dest, symlinks=True, copy_function=link)
 
-def do_build_cache():
-    print(white("Building cache…", bold=True))
-    print(blue(f"Cache dir: {CACHE_DIR}"))
 
-    overwrite_cache_files()
+def _populate_store(lock_hash: str) -> Path:
+    """Return the node_modules for lock hash from the store, installing them if needed."""
+
+    store_dir = NODE_MODULES_STORE / lock_hash
+    if store_dir.exists():
+        return store_dir / "node_modules"
+
+    NODE_MODULES_STORE.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=NODE_MODULES_STORE, prefix=".install-"))
+    try:
+        for name in ("package.json", "package-lock.json"):
+            shutil.copy2(CACHE_DIR / name, tmp_dir / name)
+
+        run_subproc(
+            [
+                "/usr/bin/env",
+                "npm",
+                "ci",
+                "--prefer-offline",
+                "--no-audit",
+                "--cache",
+                NPM_CACHE_DIR,
+            ],
+            cwd=tmp_dir,
+            enable_spinner=True,
+        )
+
+        try:
+            # atomic, in case another install raced us to it
+            tmp_dir.rename(store_dir)
+        except OSError:
+            pass
+    finally:
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return store_dir / "node_modules"
+
+
+def install_node_modules(force=False):
+    """
+    Install the node modules into CACHE_DIR,
+    unless they're already installed for the current "package-lock.json".
+    """
+
+    lock_hash = get_lock_hash()
+    lock_hash_file = CACHE_DIR / LOCK_HASH_FILENAME
+    node_modules = CACHE_DIR / "node_modules"
+
+    if (
+        not force
+        and node_modules.exists()
+        and lock_hash_file.exists()
+        and lock_hash_file.read_text() == lock_hash
+    ):
+        print(blue("Node modules are up-to-date."))
+        return
 
     print(white("Installing node modules…"))
 
-    run_subproc(["/usr/bin/env", "npm", "install"], cwd=CACHE_DIR, enable_spinner=True)
+    store_node_modules = _populate_store(lock_hash)
+
+    if node_modules.exists():
+        shutil.rmtree(node_modules)
+    _link_tree(store_node_modules, node_modules)
+
+    lock_hash_file.write_text(lock_hash)
+
+
+def do_build_cache():
+    print(white("Building cache…", bold=True))
+    print(blue(f"Cache dir: {CACHE_DIR}"))
+
+    print(blue(f"Synced {sync_cache_files()} files."))
+    install_node_modules()
 
     print(cyan("Done!"))
 
@@ -60,6 +212,72 @@ def clear_cahce():
     print(cyan("Done!"))
 
 
+def _iter_cache_files(cache_dir: Path):
+    for path in cache_dir.rglob("*"):
+        if path.is_file():
+            stat = path.stat()
+            yield path, stat.st_size, max(stat.st_atime, stat.st_mtime)
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def compile_cache_stats():
+    print(white("Compilation cache…", bold=True))
+    print(blue(f"Cache dir: {COMPILE_CACHE_DIR}"))
+
+    if not COMPILE_CACHE_DIR.exists():
+        print(yellow("Empty!"))
+        return
+
+    for tool_dir in sorted(COMPILE_CACHE_DIR.iterdir()):
+        files = list(_iter_cache_files(tool_dir))
+        size = sum(size for _, size, _ in files)
+        print(
+            "{} {} files, {}".format(
+                white(f"{tool_dir.name}:", bold=True),
+                len(files),
+                green(_format_size(size)),
+            )
+        )
+
+
+def prune_compile_cache(max_size_mb: int):
+    """Evict the least recently used entries, until the cache fits in `max_size_mb`."""
+
+    print(white("Pruning compilation cache…", bold=True))
+    print(blue(f"Cache dir: {COMPILE_CACHE_DIR}"))
+
+    if not COMPILE_CACHE_DIR.exists():
+        print(cyan("Done!"))
+        return
+
+    files = sorted(_iter_cache_files(COMPILE_CACHE_DIR), key=lambda it: it[2])
+    total_size = sum(size for _, size, _ in files)
+    max_size = max_size_mb * 1024 * 1024
+
+    evicted, evicted_size = 0, 0
+    for path, size, _ in files:
+        if total_size - evicted_size <= max_size:
+            break
+        # a missing entry is just a cache miss, for both the tools
+        path.unlink()
+        evicted += 1
+        evicted_size += size
+
+    print(
+        cyan(
+            f"Done! Evicted {evicted} entries ({_format_size(evicted_size)}), "
+            f"{_format_size(total_size - evicted_size)} left."
+        )
+    )
+
+
 def handle_subproc_result(result, enable_spinner):
     if result is not None:
         if enable_spinner:
@@ -93,6 +311,9 @@ def run_subproc(cmd, *, enable_spinner=False, **kwargs):
     result = None
     try:
         if enable_spinner:
+            # slow to import, and only needed here
+            from halo import Halo
+
             with Halo(spinner=SPINNER):
                 result = subprocess.run(cmd, encoding="utf-8", **kwargs)
         else:
@@ -104,23 +325,27 @@ def run_subproc(cmd, *, enable_spinner=False, **kwargs):
         handle_subproc_result(result, enable_spinner)
 
 
-def get_npm_bin(cwd=Path.cwd()):
-    return Path(
-        subprocess.check_output(
-            ["/usr/bin/env", "npm", "bin"], encoding="utf-8", cwd=cwd
-        ).strip()
-    )
+def find_npm_prefix(cwd: Path):
+    """
+    Same as `npm prefix`, without spawning npm.
 
+    The closest parent dir of cwd that contains a "package.json" or "node_modules".
+    """
+
+    for path in (cwd, *cwd.parents):
+        if (path / "package.json").exists() or (path / "node_modules").is_dir():
+            return path
+
+    return None
 
-def get_npm_root(cwd=Path.cwd()):
-    return Path(
-        subprocess.check_output(
-            ["/usr/bin/env", "npm", "root"], encoding="utf-8", cwd=cwd
-        ).strip()
-    )
 
+@lru_cache(maxsize=None)
+def _get_npm_prefix(cwd: Path) -> Path:
+    prefix = find_npm_prefix(cwd)
+    if prefix is not None:
+        return prefix
 
-def get_npm_prefix(cwd=Path.cwd()):
+    # let npm decide, for anything out of the ordinary
     return Path(
         subprocess.check_output(
             ["/usr/bin/env", "npm", "prefix"], encoding="utf-8", cwd=cwd
@@ -128,6 +353,18 @@ def get_npm_prefix(cwd=Path.cwd()):
     )
 
 
+def get_npm_prefix(cwd: Path = None) -> Path:
+    return _get_npm_prefix(Path(cwd or Path.cwd()).resolve())
+
+
+def get_npm_root(cwd: Path = None) -> Path:
+    return get_npm_prefix(cwd) / "node_modules"
+
+
+def get_npm_bin(cwd: Path = None) -> Path:
+    return get_npm_root(cwd) / ".bin"
+
+
 def resolve_paths(src: str, dest: str):
     """Given src and dest str, yield some src paths and dest dirs"""
 
@@ -149,19 +386,20 @@ def resolve_paths(src: str, dest: str):
 def resolve_dest_dir(src_path: Path, dest: str) -> Path:
     # fallback to default destination location
     if dest is None:
-        dest_dir = get_npm_prefix() / "build"
+        build_dir = get_npm_prefix() / "build"
     else:
-        dest_dir = Path(dest)
+        build_dir = Path(dest)
 
-    dest_dir = dest_dir / src_path.parent.name
+    build_dir.mkdir(parents=True, exist_ok=True)
 
-    if dest_dir.exists():
-        if not dest_dir.is_dir():
-            exit(red("destination must be a directory."))
-    else:
-        dest_dir.mkdir(parents=True)
+    # Not resolved itself, since its a symlink to the current version of the page,
+    # created when the page is first published. (see "scripts/publish.js")
+    dest_dir = build_dir.resolve() / src_path.parent.name
 
-    return dest_dir.resolve()
+    if dest_dir.exists() and not dest_dir.is_dir():
+        exit(red("destination must be a directory."))
+
+    return dest_dir
 
 
 def resolve_src_paths(src: str):
@@ -199,19 +437,75 @@ def courtesy_notice(msg):
     print(cyan(f"Courtesy Notice: {msg}", bold=True))
 
 
+def record_build(build_manifest, settings_list, toolchain_fingerprint, started_at):
+    """Record the fingerprints of pages, that were (successfully) built just now."""
+
+    for settings in settings_list:
+        dest_dir = Path(settings["dest dir"])
+        try:
+            if (dest_dir / DEPS_FILENAME).stat().st_mtime < started_at:
+                continue
+        except FileNotFoundError:
+            continue
+
+        build_manifest.record(
+            dest_dir, get_page_fingerprint(settings, toolchain_fingerprint)
+        )
+
+    build_manifest.save()
+
+
+def build_with_daemon(daemon, settings_list):
+    """Build pages using a (warm) build daemon, instead of a fresh node process."""
+
+    from react_pages.daemon import DaemonError
+
+    print(yellow(f"Using build daemon: {daemon.socket_path}"))
+
+    has_errors = False
+    try:
+        for event in daemon.build(settings_list):
+            if event["type"] == "output":
+                print(event["text"])
+            elif event["type"] == "done":
+                has_errors |= event["has_errors"]
+                status = red("✖") if event["has_errors"] else green("✔")
+                print(f"{status} {event['page']}  ({event['duration'] / 1000:.1f}s)")
+    except DaemonError as e:
+        print(red(e))
+        has_errors = True
+
+    if has_errors:
+        exit(red("Failed!"))
+
+
 def build(
     source: str,
     destination: str,
     no_watch: bool,
     verbose: bool,
     static_url: str,
+    jobs: int = 1,
+    worker_memory: int = None,
+    force: bool = False,
+    shared_chunks: bool = False,
+    debounce: int = 200,
+    keep_versions: int = 3600,
     *,
     deploy=False,
 ):
     npm_root = get_npm_root()
     npm_prefix = get_npm_prefix()
 
+    # Unchanged pages are only skipped for one-off deploy builds.
+    # (Not with shared chunks, since all pages are compiled together)
+    incremental = deploy and no_watch and not force and not shared_chunks
+    toolchain_fingerprint = None
+    build_manifest = None
+    started_at = time.time()
+
     settings_list = []
+    skipped = 0
     for src_path, dest_dir, public_dir in resolve_paths(source, destination):
         print(
             "{} {} ~> {}…".format(
@@ -221,43 +515,85 @@ def build(
             )
         )
 
-        copy_files_safe(public_dir, ("favicon.ico", "manifest.json"), dest_dir)
-
-        if static_url is None:
+        if shared_chunks:
+            # the assets of all pages go into a common dir, under the build dir
+            if static_url is None:
+                public_url = ".."
+            else:
+                public_url = static_url.format(**{"page name": ""}).rstrip("/")
+        elif static_url is None:
             public_url = "."
         else:
             public_url = static_url.format(**{"page name": src_path.parent.name})
 
-        settings_list.append(
-            {
-                "spinner": SPINNER,
-                "deploy": deploy,
-                "watch": not no_watch,
-                "verbose": verbose,
-                "public url": public_url,
-                "page name": str(green(src_path.parent.name, bold=True)),
-                "src path": str(src_path),
-                "dest dir": str(dest_dir),
-                "html template": str(public_dir / "index.html"),
-                "package.json": str(npm_prefix / "package.json"),
-                "node_modules": str(npm_root),
-                "npm prefix": str(npm_prefix),
-                "react-pages node_modules": str(CACHE_DIR / "node_modules"),
-            }
-        )
+        settings = {
+            "spinner": SPINNER,
+            "deploy": deploy,
+            "watch": not no_watch,
+            "verbose": verbose,
+            "jobs": jobs,
+            "shared chunks": shared_chunks,
+            "worker memory": worker_memory,
+            "watch debounce": debounce,
+            "keep versions": keep_versions,
+            "public url": public_url,
+            "page name": str(green(src_path.parent.name, bold=True)),
+            "src path": str(src_path),
+            "dest dir": str(dest_dir),
+            "html template": str(public_dir / "index.html"),
+            "public dir": str(public_dir),
+            "package.json": str(npm_prefix / "package.json"),
+            "node_modules": str(npm_root),
+            "npm prefix": str(npm_prefix),
+            "react-pages node_modules": str(CACHE_DIR / "node_modules"),
+            "compile cache dir": str(COMPILE_CACHE_DIR),
+        }
+
+        if deploy:
+            if build_manifest is None:
+                build_manifest = BuildManifest(
+                    dest_dir.parent / BUILD_MANIFEST_FILENAME
+                )
+                toolchain_fingerprint = get_toolchain_fingerprint(npm_prefix, CACHE_DIR)
+
+            if incremental and build_manifest.is_unchanged(
+                dest_dir, get_page_fingerprint(settings, toolchain_fingerprint)
+            ):
+                print(blue(f"Unchanged: {src_path.parent.name}"))
+                skipped += 1
+                continue
+
+        settings_list.append(settings)
 
     if len(settings_list):
-        run_subproc(
-            [
-                "/usr/bin/env",
-                "node",
-                CACHE_DIR / "scripts" / "react_pages.js",
-                json.dumps(settings_list),
-            ],
-            cwd=get_npm_prefix(),
-        )
+        if no_watch:
+            from react_pages.daemon import get_running_daemon
+
+            daemon = get_running_daemon(npm_prefix, deploy)
+        else:
+            daemon = None
+
+        if daemon is not None:
+            build_with_daemon(daemon, settings_list)
+        else:
+            run_subproc(
+                [
+                    "/usr/bin/env",
+                    "node",
+                    CACHE_DIR / "scripts" / "react_pages.js",
+                    json.dumps(settings_list),
+                ],
+                cwd=npm_prefix,
+            )
+
+        if build_manifest is not None and no_watch:
+            record_build(
+                build_manifest, settings_list, toolchain_fingerprint, started_at
+            )
 
         print(cyan("Done!"))
+    elif skipped:
+        print(cyan(f"Done! (all {skipped} pages unchanged)"))
     else:
         print(red("You must create a page first!"))
 
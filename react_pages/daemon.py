@@ -0,0 +1,184 @@
+"""
+A client for the build daemon. (`nodejs/scripts/react_pages_daemon.js`)
+
+The daemon keeps a warm webpack compiler per page in memory,
+so that one-off builds don't pay for starting node, requiring webpack & babel,
+and building every module graph from scratch.
+
+One daemon per project and mode (develop / deploy),
+since the webpack config reads NODE_ENV on startup.
+(The project's ".env" is re-loaded by the daemon, whenever it changes)
+"""
+
+import hashlib
+import json
+import socket
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from react_pages.core import CACHE_DIR
+
+DAEMONS_DIR = CACHE_DIR.parent / "daemons"
+
+# The max. length of a unix socket path, on most platforms
+MAX_SOCKET_PATH_LEN = 100
+
+
+class DaemonError(Exception):
+    pass
+
+
+def get_mode(deploy: bool) -> str:
+    return "deploy" if deploy else "develop"
+
+
+def _get_daemon_name(npm_prefix: Path, deploy: bool) -> str:
+    digest = hashlib.sha256(str(npm_prefix).encode()).hexdigest()[:12]
+    return f"{digest}-{get_mode(deploy)}"
+
+
+def get_socket_path(npm_prefix: Path, deploy: bool) -> Path:
+    name = _get_daemon_name(npm_prefix, deploy)
+    path = DAEMONS_DIR / f"{name}.sock"
+
+    if len(str(path)) > MAX_SOCKET_PATH_LEN:
+        path = Path(tempfile.gettempdir()) / f"react-pages-{name}.sock"
+
+    return path
+
+
+def get_log_path(npm_prefix: Path, deploy: bool) -> Path:
+    return DAEMONS_DIR / f"{_get_daemon_name(npm_prefix, deploy)}.log"
+
+
+class DaemonClient:
+    def __init__(self, npm_prefix: Path, deploy: bool, *, timeout=None):
+        self.npm_prefix = npm_prefix
+        self.deploy = deploy
+        self.socket_path = get_socket_path(npm_prefix, deploy)
+        # None means wait forever (builds can take a while)
+        self.timeout = timeout
+
+    def _connect(self, timeout) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(self.socket_path))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def is_running(self) -> bool:
+        if not self.socket_path.exists():
+            return False
+
+        try:
+            self._connect(1).close()
+        except OSError:
+            return False
+
+        return True
+
+    def request(self, command: str, **kwargs):
+        """
+        Send a request to the daemon, and yield its events, as they arrive.
+
+        The last one is always the result. (type "result")
+        """
+
+        try:
+            sock = self._connect(self.timeout)
+        except OSError as e:
+            raise DaemonError(f"The build daemon isn't running ({e}).")
+
+        with sock, sock.makefile("r", encoding="utf-8") as f:
+            sock.sendall(json.dumps({"command": command, **kwargs}).encode() + b"\n")
+
+            for line in f:
+                event = json.loads(line)
+
+                if event["type"] == "result" and "error" in event:
+                    raise DaemonError(event["error"])
+
+                yield event
+
+                if event["type"] == "result":
+                    return
+
+        raise DaemonError("The build daemon closed the connection.")
+
+    def call(self, command: str, **kwargs) -> dict:
+        """Send a request to the daemon, and return its result."""
+
+        for event in self.request(command, **kwargs):
+            if event["type"] == "result":
+                return event
+
+    def build(self, settings_list):
+        return self.request("build", settings_list=settings_list)
+
+    def rebuild(self, page_name):
+        return self.request("rebuild", page=page_name)
+
+    def status(self) -> dict:
+        return self.call("status")
+
+    def stats(self) -> dict:
+        return self.call("stats")
+
+    def shutdown(self) -> dict:
+        return self.call("shutdown")
+
+
+def start_daemon(npm_prefix: Path, deploy: bool, *, timeout=30) -> DaemonClient:
+    """Start the daemon for project in the background, and wait for it to listen."""
+
+    client = DaemonClient(npm_prefix, deploy)
+    if client.is_running():
+        return client
+
+    log_path = get_log_path(npm_prefix, deploy)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(log_path, "ab") as log:
+        proc = subprocess.Popen(
+            [
+                "/usr/bin/env",
+                "node",
+                str(CACHE_DIR / "scripts" / "react_pages_daemon.js"),
+                str(client.socket_path),
+                get_mode(deploy),
+            ],
+            cwd=npm_prefix,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            # outlive the cli
+            start_new_session=True,
+        )
+
+    deadline = time.monotonic() + timeout
+    while not client.is_running():
+        if proc.poll() is not None:
+            raise DaemonError(
+                f"The build daemon exited with code {proc.returncode}. "
+                f"See {log_path}."
+            )
+        if time.monotonic() > deadline:
+            proc.terminate()
+            raise DaemonError(f"The build daemon didn't start in time. See {log_path}.")
+        time.sleep(0.05)
+
+    return client
+
+
+def get_running_daemon(npm_prefix: Path, deploy: bool):
+    """Return a client for the daemon of project, if its running, else None."""
+
+    client = DaemonClient(npm_prefix, deploy)
+    if client.is_running():
+        return client
+    return None
@@ -0,0 +1,104 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import NoReverseMatch, reverse
+
+
+class Deferred:
+    """
+    Marks a js context value for out-of-band delivery.
+
+    Instead of being inlined in the page, it is served from a separate,
+    content-addressed (and long-lived, privately cacheable) JSON endpoint;
+    and the JS variable becomes a Promise for the value.
+
+        render_react_page("my_page", dataset=Deferred(big_dataset))
+
+    Values larger than `settings.REACT_PAGES_DEFER_THRESHOLD` bytes
+    are deferred automatically.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f"Deferred({self.value!r})"
+
+
+class DeferredPromise(bytes):
+    """
+    The JS for a value delivered out-of-band - a Promise for it, instead of the value.
+
+    Returned by `serialize_js_context()`, to tell these apart from the inlined values.
+    (e.g. for server-side rendering, which only gets the inlined values)
+    """
+
+    __slots__ = ()
+
+
+def get_cache_alias() -> str:
+    # must be shared by all the processes (see `react_pages.checks`)
+    return getattr(settings, "REACT_PAGES_DATA_CACHE", "default")
+
+
+def get_cache():
+    return caches[get_cache_alias()]
+
+
+def get_timeout():
+    # seconds, since the last time the data was used (in a page)
+    return getattr(settings, "REACT_PAGES_DATA_TIMEOUT", 24 * 60 * 60)
+
+
+def get_cache_control():
+    # private, since the data usually comes from a user's js context
+    return getattr(
+        settings,
+        "REACT_PAGES_DATA_CACHE_CONTROL",
+        "private, max-age=31536000, immutable",
+    )
+
+
+def get_threshold():
+    return getattr(settings, "REACT_PAGES_DEFER_THRESHOLD", None)
+
+
+def cache_key(digest):
+    return f"react_pages:data:{digest}"
+
+
+def store(data: bytes) -> str:
+    """Store data, and return its digest."""
+
+    digest = hashlib.sha256(data).hexdigest()[:32]
+
+    cache = get_cache()
+    key = cache_key(digest)
+    timeout = get_timeout()
+
+    # avoid re-sending the (large) data to the cache, if its already there
+    if not cache.touch(key, timeout):
+        cache.set(key, data, timeout)
+
+    return digest
+
+
+def load(digest) -> bytes:
+    """Return the stored data, or None."""
+
+    return get_cache().get(cache_key(digest))
+
+
+def get_url(digest) -> str:
+    try:
+        return reverse("react_pages:data", kwargs={"digest": digest})
+    except NoReverseMatch:
+        raise ImproperlyConfigured(
+            "React Pages: Deferred js context values are served by react_pages.urls. "
+            "Please add `path('react-pages/', include('react_pages.urls'))` "
+            "to your urls.py!"
+        )
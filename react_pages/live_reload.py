@@ -0,0 +1,206 @@
+"""
+Reload the pages open in a browser, whenever `react-pages develop` re-builds them.
+
+Every (re-)build is published atomically, along with a generation no. for the page.
+(see "scripts/publish.js")
+Pages rendered with DEBUG get a small script,
+that listens to the server-sent events of `live_reload_view()`,
+and reloads the tab only when its own page is re-built.
+"""
+
+import asyncio
+import json
+import re
+import time
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
+from django.urls import NoReverseMatch, reverse
+
+from react_pages.conf import get_build_dir, get_page_store
+from react_pages.page_store import GENERATIONS_FILENAME, Generations
+
+_BODY_END_RE = re.compile(r"</body\s*>", re.IGNORECASE)
+
+_lock = Lock()
+# page name -> the generation of the page currently in the page store
+_seen = {}
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "REACT_PAGES_LIVE_RELOAD", settings.DEBUG)
+
+
+def get_poll_interval() -> float:
+    return getattr(settings, "REACT_PAGES_LIVE_RELOAD_INTERVAL", 0.25)
+
+
+@lru_cache(maxsize=None)
+def _get_generations(build_dir: Path) -> Generations:
+    return Generations(build_dir / GENERATIONS_FILENAME)
+
+
+def get_generation(page_name: str) -> int:
+    """The generation page was last published in. (always up-to-date)"""
+
+    generations = _get_generations(get_build_dir())
+    generations.refresh()
+
+    return generations.pages.get(page_name, 0)
+
+
+def sync_generation(page_name: str) -> int:
+    """
+    Return the current generation of page,
+    dropping it from the page store, if it was re-built since it was loaded.
+
+    (So that a page is never older than the generation it reports)
+    """
+
+    generation = get_generation(page_name)
+
+    with _lock:
+        changed = _seen.get(page_name) != generation
+        _seen[page_name] = generation
+
+    if changed:
+        get_page_store().invalidate(page_name)
+
+    return generation
+
+
+def get_script(page_name: str, generation: int) -> str:
+    """
+    The script that reloads the page, when it's re-built.
+
+    Empty, if `react_pages.urls` isn't included in the project's urls.
+    """
+
+    try:
+        url = reverse("react_pages:live_reload")
+    except NoReverseMatch:
+        return ""
+
+    query = urlencode({"page": page_name, "generation": generation})
+    src = json.dumps(f"{url}?{query}")
+
+    return (
+        "<script>(function () {"
+        f"var source = new EventSource({src});"
+        'source.addEventListener("build", function () {'
+        "source.close(); window.location.reload();"
+        "});"
+        "})();</script>"
+    )
+
+
+def insert_script(html: str, page_name: str, generation: int) -> str:
+    """Add the live-reload script before "</body>", or at the end."""
+
+    script = get_script(page_name, generation)
+
+    body_end = None
+    for body_end in _BODY_END_RE.finditer(html):
+        pass
+    if body_end:
+        return html[: body_end.start()] + script + html[body_end.start() :]
+    return html + script
+
+
+def _poll(page_name: str, state: list):
+    """
+    The next event (or None), for the current generation of page.
+
+    `state` is `[the last generation sent, when the last event was sent]`.
+    """
+
+    current = get_generation(page_name)
+
+    if current > state[0]:
+        state[:] = current, time.monotonic()
+        data = json.dumps({"page": page_name, "generation": current})
+        return f"event: build\ndata: {data}\n\n"
+
+    # keep the connection alive
+    if time.monotonic() - state[1] > 15:
+        state[1] = time.monotonic()
+        return ": ping\n\n"
+
+    return None
+
+
+# reconnect quickly, e.g. after a runserver restart
+_RETRY = "retry: 1000\n\n"
+
+
+def iter_events(page_name: str, generation: int):
+    """
+    Server-sent events, one for each new generation of page.
+
+    Keeps the connection alive with a comment, every 15 seconds.
+    """
+
+    interval = get_poll_interval()
+    state = [generation, time.monotonic()]
+
+    yield _RETRY
+
+    while True:
+        event = _poll(page_name, state)
+        if event is not None:
+            yield event
+
+        time.sleep(interval)
+
+
+async def aiter_events(page_name: str, generation: int):
+    """
+    Like `iter_events()`, for ASGI.
+
+    (django consumes a sync iterator in a thread, until it's exhausted -
+    which would hold up every other sync view, since this one never is)
+    """
+
+    interval = get_poll_interval()
+    state = [generation, time.monotonic()]
+
+    yield _RETRY
+
+    while True:
+        event = _poll(page_name, state)
+        if event is not None:
+            yield event
+
+        await asyncio.sleep(interval)
+
+
+def live_reload_view(request):
+    """Stream the build events of a page. (DEBUG only, by default)"""
+
+    if not is_enabled():
+        raise Http404("React Pages: Live reload is disabled.")
+
+    page_name = request.GET.get("page", "")
+    try:
+        generation = int(request.GET.get("generation", 0))
+    except ValueError:
+        generation = 0
+
+    # (async streaming needs django >= 4.2)
+    if isinstance(request, ASGIRequest) and django.VERSION >= (4, 2):
+        events = aiter_events(page_name, generation)
+    else:
+        events = iter_events(page_name, generation)
+
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # don't let proxies (e.g. nginx) buffer the events
+    response["X-Accel-Buffering"] = "no"
+
+    return response
@@ -0,0 +1,188 @@
+"use strict";
+
+const crypto = require("crypto");
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+const UglifyJS = require("uglify-js");
+const workerFarm = require("worker-farm");
+const { RawSource, SourceMapSource } = require("webpack-sources");
+
+const UGLIFY_VERSION = require("uglify-js/package.json").version;
+
+/*
+ * Minify the JS chunks with uglify-js,
+ * caching the results on disk (keyed by chunk contents, uglify options & version),
+ * and minifying the chunks that aren't cached, in parallel, on all the cores.
+ *
+ * (The `cache` & `parallel` options of uglifyjs-webpack-plugin 1.x,
+ * on the versions already in the lockfile)
+ */
+class CachedUglifyJsPlugin {
+  constructor(options) {
+    this.cacheDir = options.cache;
+    this.sourceMap = Boolean(options.sourceMap);
+    this.uglifyOptions = options.uglifyOptions || {};
+    this.parallel = options.parallel
+      ? Math.max(1, os.cpus().length - 1)
+      : 1;
+  }
+
+  getCacheKey(source, inputMap) {
+    return crypto
+      .createHash("sha256")
+      .update(
+        JSON.stringify({
+          version: UGLIFY_VERSION,
+          options: this.uglifyOptions,
+          sourceMap: this.sourceMap
+        })
+      )
+      .update(source)
+      .update(inputMap ? JSON.stringify(inputMap) : "")
+      .digest("hex");
+  }
+
+  readCache(key) {
+    try {
+      return JSON.parse(
+        fs.readFileSync(path.join(this.cacheDir, key + ".json"), "utf8")
+      );
+    } catch (e) {
+      return null;
+    }
+  }
+
+  writeCache(key, result) {
+    // atomic, since other pages may be writing the same entry
+    const file = path.join(this.cacheDir, key + ".json");
+    const tmp = file + "." + process.pid + ".tmp";
+    try {
+      fs.mkdirSync(this.cacheDir, { recursive: true });
+      fs.writeFileSync(tmp, JSON.stringify(result));
+      fs.renameSync(tmp, file);
+    } catch (e) {
+      // (e.g. a full disk) it's only a cache, so the entry is simply missed next time
+      try {
+        fs.unlinkSync(tmp);
+      } catch (e) {
+        // never written
+      }
+    }
+  }
+
+  apply(compiler) {
+    compiler.plugin("compilation", compilation => {
+      if (this.sourceMap) {
+        compilation.plugin("build-module", module => {
+          module.useSourceMap = true;
+        });
+      }
+
+      compilation.plugin("optimize-chunk-assets", (chunks, callback) => {
+        const tasks = [];
+
+        for (const chunk of chunks) {
+          for (const file of chunk.files) {
+            if (!/\.js$/.test(file)) continue;
+
+            const asset = compilation.assets[file];
+            let source, inputMap;
+            if (this.sourceMap) {
+              const sourceAndMap = asset.sourceAndMap();
+              source = sourceAndMap.source;
+              inputMap = sourceAndMap.map;
+            } else {
+              source = asset.source();
+            }
+
+            tasks.push({ file, source, inputMap, key: this.getCacheKey(source, inputMap) });
+          }
+        }
+
+        const pending = tasks.filter(task => {
+          task.result = this.readCache(task.key);
+          return !task.result;
+        });
+
+        const finish = () => {
+          for (const task of tasks) {
+            const { error, code, map } = task.result;
+
+            if (error) {
+              compilation.errors.push(
+                new Error(task.file + " from UglifyJs\n" + error)
+              );
+            } else if (map) {
+              compilation.assets[task.file] = new SourceMapSource(
+                code,
+                task.file,
+                JSON.parse(map),
+                task.source,
+                task.inputMap
+              );
+            } else {
+              compilation.assets[task.file] = new RawSource(code);
+            }
+          }
+          callback();
+        };
+
+        if (!pending.length) {
+          return finish();
+        }
+
+        const minify =
+          this.parallel > 1 && pending.length > 1
+            ? workerFarm(
+                { maxConcurrentWorkers: Math.min(this.parallel, pending.length) },
+                require.resolve("./uglify-worker")
+              )
+            : null;
+
+        let remaining = pending.length;
+        for (const task of pending) {
+          const options = this.getMinifyOptions(task);
+          const done = (err, result) => {
+            task.result = err ? { error: String(err) } : result;
+            if (!task.result.error) {
+              this.writeCache(task.key, task.result);
+            }
+
+            if (--remaining === 0) {
+              if (minify) workerFarm.end(minify);
+              finish();
+            }
+          };
+
+          if (minify) {
+            minify({ source: task.source, options }, done);
+          } else {
+            done(null, minifySource(task.source, options));
+          }
+        }
+      });
+    });
+  }
+
+  getMinifyOptions(task) {
+    const options = Object.assign({}, this.uglifyOptions);
+    if (this.sourceMap) {
+      options.sourceMap = { content: task.inputMap };
+    }
+    return options;
+  }
+}
+
+function minifySource(source, options) {
+  const result = UglifyJS.minify(source, options);
+
+  if (result.error) {
+    return { error: result.error.message + " [" + result.error.line + "," + result.error.col + "]" };
+  }
+  return { code: result.code, map: result.map || null };
+}
+
+CachedUglifyJsPlugin.minifySource = minifySource;
+
+module.exports = CachedUglifyJsPlugin;
@@ -0,0 +1,64 @@
+"use strict";
+
+// Where the assets of all pages (and the shared chunks) go, inside the build dir.
+const SHARED_DIR = "_shared";
+
+/*
+ * Writes an "asset-manifest.json" into each page's dir,
+ * listing the chunks required by the page, in load order.
+ * (runtime, vendor, page)
+ *
+ * The paths are relative to the build dir.
+ * If the public path is absolute, it is written to the manifest as "public url",
+ * otherwise, django resolves the paths using `static()`.
+ */
+class PageChunksManifestPlugin {
+  constructor(options) {
+    this.pages = options.pages;
+    this.publicPath = options.publicPath;
+  }
+
+  apply(compiler) {
+    compiler.plugin("emit", (compilation, callback) => {
+      for (const page of this.pages) {
+        const entrypoint = compilation.entrypoints[page];
+        if (!entrypoint) continue;
+
+        const chunks = { js: [], css: [] };
+        for (const chunk of entrypoint.chunks) {
+          for (const file of chunk.files) {
+            if (/\.js$/.test(file)) chunks.js.push(file);
+            else if (/\.css$/.test(file)) chunks.css.push(file);
+          }
+        }
+
+        const manifest = { chunks };
+
+        // The page's own chunk, for preloading
+        const own = entrypoint.chunks.find(chunk => chunk.name === page);
+        if (own) {
+          for (const file of own.files) {
+            if (/\.js$/.test(file)) manifest["main.js"] = file;
+            else if (/\.css$/.test(file)) manifest["main.css"] = file;
+          }
+        }
+
+        if (/^(\/|https?:)/.test(this.publicPath)) {
+          manifest["public url"] = this.publicPath;
+        }
+
+        const json = JSON.stringify(manifest, null, 2);
+        compilation.assets[page + "/asset-manifest.json"] = {
+          source: () => json,
+          size: () => json.length
+        };
+      }
+
+      callback();
+    });
+  }
+}
+
+PageChunksManifestPlugin.SHARED_DIR = SHARED_DIR;
+
+module.exports = PageChunksManifestPlugin;
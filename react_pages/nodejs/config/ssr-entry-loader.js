@@ -0,0 +1,21 @@
+"use strict";
+
+/*
+ * The entry of a page's server bundle, i.e. "ssr-entry-loader!<path to server.js>"
+ * (see `webpack.config.server.js`)
+ *
+ * Exports `render(context)`, for the page's root component (the default export of "server.js").
+ */
+module.exports = function() {};
+
+module.exports.pitch = function(remainingRequest) {
+  this.cacheable();
+
+  return [
+    "var render = require(" + JSON.stringify(require.resolve("./ssr-render")) + ").render;",
+    "var root = require(" + JSON.stringify(remainingRequest) + ");",
+    "exports.render = function (context) {",
+    "  return render(root.default || root, context);",
+    "};"
+  ].join("\n");
+};
@@ -0,0 +1,7 @@
+"use strict";
+
+// Stylesheets have no effect on the server. (see `webpack.config.server.js`)
+module.exports = function() {
+  this.cacheable();
+  return "module.exports = {};";
+};
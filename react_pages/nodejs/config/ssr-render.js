@@ -0,0 +1,30 @@
+"use strict";
+
+// Part of a page's server bundle. (see `ssr-entry-loader.js`)
+
+var React = require("react");
+var ReactDOMServer = require("react-dom/server");
+
+/*
+ * Render the page's root component, with the js context as its props.
+ *
+ * The context is also made available as globals (like in the browser),
+ * for the duration of the render.
+ */
+exports.render = function render(Root, context) {
+  var names = Object.keys(context);
+  var previous = {};
+
+  names.forEach(function(name) {
+    previous[name] = global[name];
+    global[name] = context[name];
+  });
+
+  try {
+    return ReactDOMServer.renderToString(React.createElement(Root, context));
+  } finally {
+    names.forEach(function(name) {
+      global[name] = previous[name];
+    });
+  }
+};
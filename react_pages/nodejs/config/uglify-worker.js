@@ -0,0 +1,13 @@
+"use strict";
+
+// A `worker-farm` worker, for `CachedUglifyJsPlugin`.
+
+const { minifySource } = require("./CachedUglifyJsPlugin");
+
+module.exports = function minify(task, callback) {
+  try {
+    callback(null, minifySource(task.source, task.options));
+  } catch (e) {
+    callback(null, { error: String(e.stack || e) });
+  }
+};
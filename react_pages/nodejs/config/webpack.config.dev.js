@@ -169,9 +169,9 @@ module.exports = function get_custom_config(settings) {
                 ),
                 plugins: customConfig.babelPlugins,
                 // This is a feature of `babel-loader` for webpack (not Babel itself).
-                // It enables caching results in ./node_modules/.cache/babel-loader/
-                // directory for faster rebuilds.
-                cacheDirectory: true
+                // It enables caching results in the compilation cache dir,
+                // for faster rebuilds. (shared across pages and runs)
+                cacheDirectory: path.join(settings["compile cache dir"], "babel-loader")
               }
             },
             ...customConfig.webpackLoaders,
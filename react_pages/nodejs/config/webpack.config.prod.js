@@ -1,5 +1,6 @@
 "use strict";
 
+const crypto = require("crypto");
 const path = require("path");
 const webpack = require("webpack");
 const HtmlWebpackPlugin = require("html-webpack-plugin");
@@ -7,11 +8,13 @@ const ExtractTextPlugin = require("extract-text-webpack-plugin");
 const ManifestPlugin = require("webpack-manifest-plugin");
 const InterpolateHtmlPlugin = require("react-dev-utils/InterpolateHtmlPlugin");
 const SWPrecacheWebpackPlugin = require("sw-precache-webpack-plugin");
+const CachedUglifyJsPlugin = require("./CachedUglifyJsPlugin");
 // const eslintFormatter = require('react-dev-utils/eslintFormatter');
 // const ModuleScopePlugin = require('react-dev-utils/ModuleScopePlugin');
 // const paths = require("./paths");
 const getClientEnvironment = require("./env");
 const getCustomConfig = require("./custom-react-scripts/config");
+const PageChunksManifestPlugin = require("./PageChunksManifestPlugin");
 
 const WebpackMildCompile = require("webpack-mild-compile").Plugin;
 
@@ -36,8 +39,27 @@ module.exports = function get_custom_config(settings) {
     throw new Error("Production builds must have NODE_ENV=production.");
   }
 
+  // With shared chunks, all the pages are compiled together, into the build dir,
+  // and their assets go into a common dir. (see `get_shared_settings()`)
+  const pages = settings["pages"];
+  const assetPrefix = pages ? PageChunksManifestPlugin.SHARED_DIR + "/" : "";
+
   // Note: defined here because it will be used more than once.
-  const cssFilename = "css/[name].[contenthash:8].css";
+  const cssFilename = assetPrefix + "css/[name].[contenthash:8].css";
+  const mediaFilename = assetPrefix + "media/[name].[hash:8].[ext]";
+
+  const htmlMinifyOptions = {
+    removeComments: true,
+    collapseWhitespace: true,
+    removeRedundantAttributes: true,
+    useShortDoctype: true,
+    removeEmptyAttributes: true,
+    removeStyleLinkTypeAttributes: true,
+    keepClosingSlash: true,
+    minifyJS: true,
+    minifyCSS: true,
+    minifyURLs: true
+  };
 
   // This is the production configuration.
   // It compiles slowly and is focused on producing a fast and minimal bundle.
@@ -49,15 +71,20 @@ module.exports = function get_custom_config(settings) {
     // You can exclude the *.map files from the build during deployment.
     devtool: shouldUseSourceMap ? "source-map" : false,
     // In production, we only want to load the polyfills and the app code.
-    entry: [require.resolve("./polyfills"), settings["src path"]],
+    entry: pages
+      ? pages.reduce((entry, page) => {
+          entry[page["name"]] = [require.resolve("./polyfills"), page["src path"]];
+          return entry;
+        }, {})
+      : [require.resolve("./polyfills"), settings["src path"]],
     output: {
       // The build folder.
       path: settings["dest dir"],
       // Generated JS file names (with nested folders).
       // There will be one main bundle, and one file per asynchronous chunk.
       // We don't currently advertise code splitting but Webpack supports it.
-      filename: "js/[name].[chunkhash:8].js",
-      chunkFilename: "js/[name].[chunkhash:8].chunk.js",
+      filename: assetPrefix + "js/[name].[chunkhash:8].js",
+      chunkFilename: assetPrefix + "js/[name].[chunkhash:8].chunk.js",
       // We inferred the "public path" (such as / or /my-project) from homepage.
       publicPath: publicPath,
       // Point sourcemap entries to original disk location (format as URL on Windows)
@@ -138,7 +165,7 @@ module.exports = function get_custom_config(settings) {
               loader: require.resolve("url-loader"),
               options: {
                 limit: 10000,
-                name: "media/[name].[hash:8].[ext]"
+                name: mediaFilename
               }
             },
             // Process JS with Babel.
@@ -153,7 +180,10 @@ module.exports = function get_custom_config(settings) {
                   customConfig.babelPresets
                 ),
                 plugins: customConfig.babelPlugins,
-                compact: true
+                compact: true,
+                // Cache the results on disk, shared across pages and runs.
+                // Keyed by file contents, loader options & babel version.
+                cacheDirectory: path.join(settings["compile cache dir"], "babel-loader")
               }
             },
             ...customConfig.webpackLoaders,
@@ -169,7 +199,7 @@ module.exports = function get_custom_config(settings) {
               // by webpacks internal loaders.
               exclude: [/\.js$/, /\.html$/, /\.json$/],
               options: {
-                name: "media/[name].[hash:8].[ext]"
+                name: mediaFilename
               }
             }
             // ** STOP ** Are you adding a new loader?
@@ -186,42 +216,53 @@ module.exports = function get_custom_config(settings) {
       // in `package.json`, in which case it will be the pathname of that URL.
       new InterpolateHtmlPlugin(env.raw),
       // Generates an `index.html` file with the <script> injected.
-      new HtmlWebpackPlugin({
-        inject: true,
-        template: settings["html template"],
-        minify: {
-          removeComments: true,
-          collapseWhitespace: true,
-          removeRedundantAttributes: true,
-          useShortDoctype: true,
-          removeEmptyAttributes: true,
-          removeStyleLinkTypeAttributes: true,
-          keepClosingSlash: true,
-          minifyJS: true,
-          minifyCSS: true,
-          minifyURLs: true
-        }
-      }),
+      // With shared chunks, one per page, and the chunk tags are left to django.
+      // (see the page's "asset-manifest.json")
+      ...(pages
+        ? pages.map(
+            page =>
+              new HtmlWebpackPlugin({
+                inject: false,
+                filename: page["name"] + "/index.html",
+                template: page["html template"],
+                chunks: [page["name"]],
+                minify: htmlMinifyOptions
+              })
+          )
+        : [
+            new HtmlWebpackPlugin({
+              inject: true,
+              template: settings["html template"],
+              minify: htmlMinifyOptions
+            })
+          ]),
       // Makes some environment variables available to the JS code, for example:
       // if (process.env.NODE_ENV === 'production') { ... }. See `./env.js`.
       // It is absolutely essential that NODE_ENV was set to production here.
       // Otherwise React will be compiled in the very slow development mode.
       new webpack.DefinePlugin(env.stringified),
       // Minify the code.
-      new webpack.optimize.UglifyJsPlugin({
-        compress: {
-          warnings: false,
-          // Disabled because of an issue with Uglify breaking seemingly valid code:
-          // https://github.com/facebookincubator/create-react-app/issues/2376
-          // Pending further investigation:
-          // https://github.com/mishoo/UglifyJS2/issues/2011
-          comparisons: false
-        },
-        output: {
-          comments: false,
-          // Turned on because emoji and regex is not minified properly using default
-          // https://github.com/facebookincubator/create-react-app/issues/2488
-          ascii_only: true
+      new CachedUglifyJsPlugin({
+        // Cache the minified chunks on disk, shared across pages and runs.
+        // Keyed by chunk contents, uglify options & version.
+        cache: path.join(settings["compile cache dir"], "uglifyjs"),
+        // Minify chunks in parallel, on all the cores.
+        parallel: true,
+        uglifyOptions: {
+          compress: {
+            warnings: false,
+            // Disabled because of an issue with Uglify breaking seemingly valid code:
+            // https://github.com/facebookincubator/create-react-app/issues/2376
+            // Pending further investigation:
+            // https://github.com/mishoo/UglifyJS2/issues/2011
+            comparisons: false
+          },
+          output: {
+            comments: false,
+            // Turned on because emoji and regex is not minified properly using default
+            // https://github.com/facebookincubator/create-react-app/issues/2488
+            ascii_only: true
+          }
         },
         sourceMap: shouldUseSourceMap
       }),
@@ -229,42 +270,88 @@ module.exports = function get_custom_config(settings) {
       new ExtractTextPlugin({
         filename: cssFilename
       }),
-      // Generate a manifest file which contains a mapping of all asset filenames
-      // to their corresponding output file so that tools can pick it up without
-      // having to parse `index.html`.
-      new ManifestPlugin({
-        fileName: "asset-manifest.json"
-      }),
-      // Generate a service worker script that will precache, and keep up to date,
-      // the HTML & assets that are part of the Webpack build.
-      new SWPrecacheWebpackPlugin({
-        // By default, a cache-busting query parameter is appended to requests
-        // used to populate the caches, to ensure the responses are fresh.
-        // If a URL is already hashed by Webpack, then there is no concern
-        // about it being stale, and the cache-busting can be skipped.
-        dontCacheBustUrlsMatching: /\.\w{8}\./,
-        filename: "service-worker.js",
-        logger(message) {
-          if (message.indexOf("Total precache size is") === 0) {
-            // This message occurs for every build and is a bit too noisy.
-            return;
-          }
-          if (message.indexOf("Skipping static resource") === 0) {
-            // This message obscures real errors so we ignore it.
-            // https://github.com/facebookincubator/create-react-app/issues/2612
-            return;
-          }
-          console.log(message);
-        },
-        minify: true,
-        // For unknown URLs, fallback to the index page
-        navigateFallback: publicUrl + "/index.html",
-        // Ignores URLs starting from /__ (useful for Firebase):
-        // https://github.com/facebookincubator/create-react-app/issues/2237#issuecomment-302693219
-        navigateFallbackWhitelist: [/^(?!\/__).*/],
-        // Don't precache sourcemaps (they're large) and build asset manifest:
-        staticFileGlobsIgnorePatterns: [/\.map$/, /asset-manifest\.json$/]
-      }),
+      ...(pages
+        ? [
+            // Move the modules from node_modules shared by pages,
+            // into a common "vendor" chunk, cached once across all pages.
+            new webpack.optimize.CommonsChunkPlugin({
+              name: "vendor",
+              minChunks: (module, count) =>
+                Boolean(module.resource) &&
+                /node_modules/.test(module.resource) &&
+                count >= Math.min(2, pages.length)
+            }),
+            // Pin the webpack runtime (with the chunk -> hash map) into its own chunk,
+            // so that it's the only one that changes along with any other chunk.
+            new webpack.optimize.CommonsChunkPlugin({
+              name: "runtime",
+              minChunks: Infinity
+            }),
+            // Stable module ids (instead of incrementing numbers),
+            // so that a change in one page doesn't change the vendor chunk hash.
+            new webpack.HashedModuleIdsPlugin(),
+            // Stable chunk ids too, since the ids of a chunk end up in its contents.
+            // (otherwise adding / removing a page, renumbers the vendor chunk)
+            new webpack.NamedChunksPlugin(chunk => {
+              if (chunk.name) return chunk.name;
+              // lazy-loaded chunks, named after their modules
+              const modules = chunk
+                .mapModules(
+                  module =>
+                    module.libIdent({ context: settings["npm prefix"] }) ||
+                    module.identifier()
+                )
+                .sort();
+              return crypto
+                .createHash("md5")
+                .update(modules.join("\n"))
+                .digest("hex")
+                .slice(0, 8);
+            }),
+            // Write each page's manifest, listing its chunks in load order.
+            new PageChunksManifestPlugin({
+              pages: pages.map(page => page["name"]),
+              publicPath: publicPath
+            })
+          ]
+        : [
+            // Generate a manifest file which contains a mapping of all asset filenames
+            // to their corresponding output file so that tools can pick it up without
+            // having to parse `index.html`.
+            new ManifestPlugin({
+              fileName: "asset-manifest.json"
+            }),
+            // Generate a service worker script that will precache, and keep up to date,
+            // the HTML & assets that are part of the Webpack build.
+            new SWPrecacheWebpackPlugin({
+              // By default, a cache-busting query parameter is appended to requests
+              // used to populate the caches, to ensure the responses are fresh.
+              // If a URL is already hashed by Webpack, then there is no concern
+              // about it being stale, and the cache-busting can be skipped.
+              dontCacheBustUrlsMatching: /\.\w{8}\./,
+              filename: "service-worker.js",
+              logger(message) {
+                if (message.indexOf("Total precache size is") === 0) {
+                  // This message occurs for every build and is a bit too noisy.
+                  return;
+                }
+                if (message.indexOf("Skipping static resource") === 0) {
+                  // This message obscures real errors so we ignore it.
+                  // https://github.com/facebookincubator/create-react-app/issues/2612
+                  return;
+                }
+                console.log(message);
+              },
+              minify: true,
+              // For unknown URLs, fallback to the index page
+              navigateFallback: publicUrl + "/index.html",
+              // Ignores URLs starting from /__ (useful for Firebase):
+              // https://github.com/facebookincubator/create-react-app/issues/2237#issuecomment-302693219
+              navigateFallbackWhitelist: [/^(?!\/__).*/],
+              // Don't precache sourcemaps (they're large) and build asset manifest:
+              staticFileGlobsIgnorePatterns: [/\.map$/, /asset-manifest\.json$/]
+            })
+          ]),
       // Moment.js is an extremely popular library that bundles large locale files
       // by default due to how Webpack interprets its code. This is a practical
       // solution that requires the user to opt into importing specific locales.
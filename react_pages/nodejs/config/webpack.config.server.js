@@ -0,0 +1,152 @@
+"use strict";
+
+const fs = require("fs");
+const path = require("path");
+const webpack = require("webpack");
+const getClientEnvironment = require("./env");
+const getCustomConfig = require("./custom-react-scripts/config");
+const PageChunksManifestPlugin = require("./PageChunksManifestPlugin");
+
+// Next to a page's "index.js", exports the page's root component, for server-side rendering.
+const SSR_ROOT_FILENAME = "server.js";
+// Where the server bundle goes, inside the page's build dir. (read by "react_pages/ssr.py")
+const SSR_BUNDLE = ".ssr/server.js";
+
+// The root component of a page, if it has one.
+function getSsrRoot(srcPath) {
+  const root = path.join(path.dirname(srcPath), SSR_ROOT_FILENAME);
+  return fs.existsSync(root) ? root : null;
+}
+
+/*
+ * The config for the server bundle of the page(s) with a "server.js",
+ * or null if there aren't any.
+ *
+ * The bundle is self-contained (react included), and exports a single
+ * `render(context)` function, used by `scripts/ssr_worker.js`.
+ *
+ * Assets are given the same urls as in the browser, but aren't emitted,
+ * and stylesheets only export their (css modules) class names.
+ */
+module.exports = function get_server_config(settings) {
+  const pages = (settings["pages"] || [
+    { name: null, "src path": settings["src path"] }
+  ]).filter(page => getSsrRoot(page["src path"]));
+
+  if (!pages.length) {
+    return null;
+  }
+
+  const isDev = process.env.NODE_ENV !== "production";
+  const publicUrl = settings["public url"];
+  const env = getClientEnvironment(publicUrl);
+  const customConfig = getCustomConfig(isDev);
+
+  const assetPrefix = settings["pages"] ? PageChunksManifestPlugin.SHARED_DIR + "/" : "";
+  const mediaFilename = assetPrefix + "media/[name].[hash:8].[ext]";
+  const localIdentName =
+    process.env.REACT_APP_CSS_MODULE_CLASSNAME_TEMPLATE ||
+    "[sha512:hash:base32]-[name]-[local]";
+
+  const cssModules = (test, loader, options) => ({
+    test,
+    use: [
+      {
+        loader: require.resolve("css-loader/locals"),
+        options: { importLoaders: 1, modules: true, localIdentName }
+      }
+    ].concat(loader ? [{ loader: require.resolve(loader), options }] : [])
+  });
+
+  return {
+    bail: !isDev,
+    devtool: false,
+    target: "node",
+    // One entry per page, with the page's root component aliased in.
+    entry: pages.reduce((entry, page) => {
+      entry[page["name"] ? page["name"] + "/" + SSR_BUNDLE : SSR_BUNDLE] =
+        require.resolve("./ssr-entry-loader") + "!" + getSsrRoot(page["src path"]);
+      return entry;
+    }, {}),
+    output: {
+      // Replaced by the version dir, on every build. (see `scripts/compile_page.js`)
+      path: settings["dest dir"],
+      filename: "[name]",
+      libraryTarget: "commonjs2",
+      publicPath: publicUrl + "/"
+    },
+    resolve: {
+      modules: [
+        settings["node_modules"],
+        settings["react-pages node_modules"],
+        settings["npm prefix"]
+      ].concat(process.env.NODE_PATH.split(path.delimiter).filter(Boolean)),
+      extensions: [".web.js", ".js", ".json", ".web.jsx", ".jsx"],
+      alias: {
+        "react-native": "react-native-web"
+      }
+    },
+    module: {
+      strictExportPresence: true,
+      rules: [
+        {
+          oneOf: [
+            {
+              test: [/\.bmp$/, /\.gif$/, /\.jpe?g$/, /\.png$/],
+              loader: require.resolve("url-loader"),
+              options: {
+                limit: 10000,
+                name: mediaFilename,
+                emitFile: false
+              }
+            },
+            {
+              test: /\.(js|jsx)$/,
+              loader: require.resolve("babel-loader"),
+              include: settings["npm prefix"],
+              exclude: [/node_modules/, /build/],
+              options: {
+                babelrc: false,
+                presets: [require.resolve("babel-preset-react-app")].concat(
+                  customConfig.babelPresets
+                ),
+                plugins: customConfig.babelPlugins,
+                compact: true,
+                cacheDirectory: path.join(settings["compile cache dir"], "babel-loader")
+              }
+            },
+            cssModules(/\.module\.css$/),
+            cssModules(/\.module\.s[ac]ss$/, "sass-loader", {
+              includePaths: process.env.NODE_PATH.split(path.delimiter).filter(Boolean)
+            }),
+            cssModules(/\.module\.less$/, "less-loader"),
+            cssModules(/\.module\.styl$/, "stylus-loader"),
+            {
+              test: /\.(css|s[ac]ss|less|styl)$/,
+              loader: require.resolve("./ssr-null-loader")
+            },
+            {
+              loader: require.resolve("file-loader"),
+              exclude: [/\.js$/, /\.html$/, /\.json$/],
+              options: {
+                name: mediaFilename,
+                emitFile: false
+              }
+            }
+          ]
+        }
+      ]
+    },
+    plugins: [new webpack.DefinePlugin(env.stringified)],
+    // Leave these to node
+    node: {
+      __dirname: false,
+      __filename: false
+    },
+    performance: {
+      hints: false
+    }
+  };
+};
+
+module.exports.SSR_BUNDLE = SSR_BUNDLE;
@@ -0,0 +1,258 @@
+'use strict';
+
+const path = require('path');
+const child_process = require('child_process');
+const {setup_env, reload_env, create_compiler, rebuild_page} = require('./compile_page');
+
+/*
+ * Builds pages in this process, keeping the compiler of each page around.
+ *
+ * builder.build(settings, hooks) -> Promise of {duration, has_errors, deps}
+ * (hooks - {start(), progress(percent), output(text)})
+ * builder.reset() - drop the compilers, and load the .env files afresh
+ */
+class LocalBuilder {
+  constructor(deploy) {
+    this.deploy = deploy;
+    this.get_custom_config = setup_env(deploy);
+    this.compilers = new Map();  // dest dir -> compiler
+  }
+
+  build(settings, hooks) {
+    let compiler = this.compilers.get(settings['dest dir']);
+    if (!compiler) {
+      compiler = create_compiler(settings, this.get_custom_config);
+      this.compilers.set(settings['dest dir'], compiler);
+    }
+
+    return new Promise((resolve) => {
+      compiler.reporter = Object.assign({}, hooks, {done: resolve});
+      rebuild_page(compiler, settings);
+    });
+  }
+
+  reset() {
+    this.get_custom_config = reload_env(this.deploy);
+    this.compilers.clear();
+  }
+
+  close() {}
+}
+
+/*
+ * Builds pages in a pool of worker processes,
+ * each with its own memory limit (`worker memory`, in MB).
+ *
+ * A page sticks to the worker that first built it,
+ * which keeps its compiler around, for (warm) re-builds.
+ */
+class PoolBuilder {
+  constructor(jobs, worker_memory) {
+    const exec_argv = process.execArgv.slice();
+    if (worker_memory) {
+      exec_argv.push('--max-old-space-size=' + worker_memory);
+    }
+
+    this.exec_argv = exec_argv;
+    this.workers = [];
+    this.assigned = new Map();  // dest dir -> worker
+
+    for (let i = 0; i < jobs; i++) {
+      this.workers.push(this.fork());
+    }
+  }
+
+  fork() {
+    const worker = {
+      proc: child_process.fork(
+          path.join(__dirname, 'react_pages_worker.js'), [], {execArgv: this.exec_argv}
+      ),
+      pages: new Set(),
+      current: null,
+      queue: Promise.resolve(),
+      dead: false,
+    };
+
+    worker.proc.on('message', (msg) => {
+      const current = worker.current;
+      if (!current) return;
+
+      switch (msg.type) {
+        case 'start':
+          current.hooks.start();
+          break;
+        case 'progress':
+          current.hooks.progress(msg.percent);
+          break;
+        case 'output':
+          current.hooks.output(msg.text);
+          break;
+        case 'done':
+          worker.current = null;
+          current.resolve(msg);
+          break;
+      }
+    });
+
+    worker.proc.on('exit', (code, signal) => {
+      worker.dead = true;
+
+      // its pages go to the other workers, from now on
+      for (const dest_dir of worker.pages) {
+        if (this.assigned.get(dest_dir) === worker) this.assigned.delete(dest_dir);
+      }
+
+      const current = worker.current;
+      if (current && (code || signal)) {
+        worker.current = null;
+        current.hooks.output(
+            'Worker for ' + current.page + ' died (' + (signal || 'exit code ' + code) + ')'
+        );
+        current.resolve({duration: 0, has_errors: true, deps: []});
+      }
+    });
+
+    return worker;
+  }
+
+  get_worker(dest_dir) {
+    let worker = this.assigned.get(dest_dir);
+
+    if (!worker) {
+      const alive = this.workers.filter((worker) => !worker.dead);
+      if (!alive.length) {
+        alive.push(this.fork());
+        this.workers.push(alive[0]);
+      }
+
+      worker = alive.reduce((a, b) => (b.pages.size < a.pages.size ? b : a));
+      worker.pages.add(dest_dir);
+      this.assigned.set(dest_dir, worker);
+    }
+
+    return worker;
+  }
+
+  build(settings, hooks) {
+    const worker = this.get_worker(settings['dest dir']);
+
+    // a worker builds a single page at a time
+    worker.queue = worker.queue.then(() => new Promise((resolve) => {
+      if (worker.dead) {
+        hooks.output('Worker for ' + settings['page name'] + ' is dead');
+        resolve({duration: 0, has_errors: true, deps: []});
+        return;
+      }
+
+      worker.current = {page: settings['page name'], hooks, resolve};
+      worker.proc.send({type: 'compile', settings});
+    }));
+
+    return worker.queue;
+  }
+
+  /*
+   * Replace the workers with fresh ones (which load the .env files afresh).
+   * The old ones exit once they're done with their current build.
+   */
+  reset() {
+    const old_workers = this.workers;
+
+    this.workers = old_workers.map(() => this.fork());
+    this.assigned.clear();
+
+    for (const worker of old_workers) {
+      worker.queue.then(() => {
+        if (!worker.dead) worker.proc.send({type: 'exit'});
+      });
+    }
+  }
+
+  close() {
+    for (const worker of this.workers) {
+      if (!worker.dead) worker.proc.send({type: 'exit'});
+    }
+  }
+}
+
+/*
+ * A bounded queue of page builds.
+ *
+ * At most `concurrency` pages build at a time.
+ * A page that is pushed while it is already queued, is only built once,
+ * and one that is pushed while it is building, is built again, once it finishes.
+ */
+class BuildQueue {
+  constructor(builder, concurrency, reporter) {
+    this.builder = builder;
+    this.concurrency = concurrency;
+    this.reporter = reporter;
+
+    this.queue = [];
+    this.queued = new Set();  // dest dirs
+    this.running = new Set();
+    this.dirty = new Map();  // dest dir -> settings
+
+    // called with (settings, result), after each build
+    this.on_done = null;
+    // called whenever the queue runs dry
+    this.on_idle = null;
+  }
+
+  push(settings) {
+    const key = settings['dest dir'];
+
+    if (this.running.has(key)) {
+      this.dirty.set(key, settings);
+    }
+    else if (!this.queued.has(key)) {
+      this.queued.add(key);
+      this.queue.push(settings);
+    }
+
+    this.drain();
+  }
+
+  drain() {
+    while (this.running.size < this.concurrency && this.queue.length) {
+      const settings = this.queue.shift();
+      this.queued.delete(settings['dest dir']);
+      this.start(settings);
+    }
+  }
+
+  start(settings) {
+    const key = settings['dest dir'];
+    const page = settings['page name'];
+    const reporter = this.reporter;
+
+    this.running.add(key);
+
+    const hooks = {
+      start: () => reporter.start(page),
+      progress: (percent) => reporter.progress(page, percent),
+      output: (text) => reporter.output(text),
+    };
+
+    this.builder.build(settings, hooks).then((result) => {
+      this.running.delete(key);
+      reporter.done(page, result);
+
+      if (this.on_done) this.on_done(settings, result);
+
+      if (this.dirty.has(key)) {
+        const settings = this.dirty.get(key);
+        this.dirty.delete(key);
+        this.push(settings);
+      }
+
+      this.drain();
+
+      if (!this.running.size && !this.queue.length && this.on_idle) {
+        this.on_idle();
+      }
+    });
+  }
+}
+
+module.exports = {LocalBuilder, PoolBuilder, BuildQueue};
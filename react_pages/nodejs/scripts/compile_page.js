@@ -0,0 +1,268 @@
+'use strict';
+
+const fs = require('fs');
+const path = require('path');
+const webpack = require('webpack');
+const {create_version_dir, discard_version_dir, publish_version} = require('./publish');
+const get_server_config = require('../config/webpack.config.server');
+
+const CONFIG_DIR = path.join(__dirname, '..', 'config');
+
+// Read by "react_pages/build_manifest.py", to fingerprint the page.
+const DEPS_FILENAME = '.react-pages-deps.json';
+
+// Webpack output options
+const normal_opts = {
+  all: false,
+  errors: true,
+  moduleTrace: true,
+  colors: true,
+};
+const verbose_opts = {
+  colors: true,
+  chunks: false,
+};
+
+// The environment, before any .env files were loaded into it
+let base_env = null;
+
+function setup_env(deploy) {
+  if (!base_env) {
+    base_env = Object.assign({}, process.env);
+  }
+
+  if (deploy) {
+    process.env.BABEL_ENV = 'production';
+    process.env.NODE_ENV = 'production';
+    return require('../config/webpack.config.prod');
+  }
+  else {
+    process.env.BABEL_ENV = 'development';
+    process.env.NODE_ENV = 'development';
+    return require('../config/webpack.config.dev');
+  }
+}
+
+/*
+ * Load the .env files afresh (e.g. after they were edited, in watch mode).
+ *
+ * The config modules read the environment when they're loaded,
+ * so they're loaded again as well. Compilers created before, keep the old values.
+ */
+function reload_env(deploy) {
+  for (const key of Object.keys(process.env)) {
+    if (!(key in base_env)) delete process.env[key];
+  }
+  Object.assign(process.env, base_env);
+
+  for (const file of Object.keys(require.cache)) {
+    if (file.startsWith(CONFIG_DIR + path.sep)) delete require.cache[file];
+  }
+
+  return setup_env(deploy);
+}
+
+/*
+ * Create the (webpack) compiler for a page.
+ *
+ * The compiler reports to `compiler.reporter`, which may be swapped between runs,
+ * so that a compiler can be kept around, and re-used. (see `react_pages_daemon.js`)
+ *
+ * reporter.start() - a compilation started
+ * reporter.progress(percent) - compilation progress, from 0 to 1
+ * reporter.output(text) - compiler output, to be printed
+ * reporter.done({duration, has_errors, deps, generation}) - a compilation finished (and was published)
+ */
+function create_compiler(settings, get_custom_config) {
+  const config = get_custom_config(settings);
+
+  // console.debug('webpack config:', util.inspect(config, false, null));
+  const compiler = webpack(config);
+
+  compiler.reporter = null;
+  compiler.started_at = Date.now();
+  // The files that went into the last build (and the ones it looked for, but were missing)
+  compiler.deps = null;
+
+  compiler.plugin('done', (stats) => {
+    compiler.deps = get_deps(stats);
+  });
+
+  // The server bundle, for server-side rendering, if the page has a "server.js"
+  const server_config = get_server_config(settings);
+  compiler.server_compiler = server_config && webpack(server_config);
+  compiler.server_deps = null;
+
+  if (compiler.server_compiler) {
+    compiler.server_compiler.plugin('done', (stats) => {
+      compiler.server_deps = get_deps(stats);
+    });
+  }
+
+  compiler.apply(
+      new webpack.ProgressPlugin((percent) => {
+        if (percent === 0) {
+          compiler.started_at = Date.now();
+          compiler.reporter.start();
+        }
+        compiler.reporter.progress(percent);
+      })
+  );
+
+  return compiler;
+}
+
+/*
+ * Re-build a (previously built) page, using the same compiler.
+ *
+ * Webpack is told which files changed since the last build,
+ * so that it only re-builds those modules. (like `compiler.watch()` does)
+ */
+function rebuild_page(compiler, settings) {
+  compiler.fileTimestamps = get_timestamps(compiler.deps);
+  compiler.contextTimestamps = {};
+
+  // Build into a new version dir, that is published only if the build succeeds
+  compiler.outputPath = compiler.options.output.path = create_version_dir(settings);
+
+  compiler.run(get_output_handler(compiler, settings));
+}
+
+function get_deps(stats) {
+  return Array.from(stats.compilation.fileDependencies).concat(
+      Array.from(stats.compilation.missingDependencies || [])
+  );
+}
+
+function get_timestamps(files) {
+  const timestamps = {};
+
+  for (const file of files || []) {
+    try {
+      timestamps[file] = fs.statSync(file).mtime.getTime();
+    }
+    catch (e) {
+      // missing files are always re-built
+    }
+  }
+
+  return timestamps;
+}
+
+/*
+ * Build the server bundle of a page, into the same version dir as its (client) build.
+ */
+function build_server_bundle(compiler, callback) {
+  const server_compiler = compiler.server_compiler;
+
+  server_compiler.fileTimestamps = get_timestamps(compiler.server_deps);
+  server_compiler.contextTimestamps = {};
+  server_compiler.outputPath = server_compiler.options.output.path = compiler.outputPath;
+
+  server_compiler.run((err, stats) => {
+    const has_errors = Boolean(err) || stats.hasErrors();
+
+    if (has_errors) {
+      compiler.reporter.output(
+          'Server bundle:\n' + String(err ? err.stack || err : stats.toString(normal_opts))
+      );
+    }
+
+    callback(has_errors);
+  });
+}
+
+/*
+ * The callback for `compiler.run()`.
+ */
+function get_output_handler(compiler, settings) {
+  return (err, stats) => {
+    const reporter = compiler.reporter;
+
+    let to_print;
+    if (err) {
+      to_print = err.stack || err;
+
+      if (err.details) {
+        to_print += '\n' + err.details;
+      }
+    }
+    else {
+      to_print = stats.toString(settings['verbose'] ? verbose_opts : normal_opts)
+    }
+
+    if (to_print) {
+      reporter.output(String(to_print));
+    }
+
+    const publish = async (has_errors) => {
+      if (has_errors) {
+        discard_version_dir(compiler.outputPath);
+        return null;
+      }
+
+      write_deps(compiler.outputPath, stats);
+      return publish_version(settings, compiler.outputPath);
+    };
+
+    const finish = (has_errors) => {
+      publish(has_errors)
+          .catch((e) => {
+            reporter.output('Failed to publish the build: ' + (e.stack || e));
+            return null;
+          })
+          .then((generation) => reporter.done({
+            duration: Date.now() - compiler.started_at,
+            has_errors: has_errors || generation === null,
+            deps: (compiler.deps || []).concat(compiler.server_deps || []),
+            generation,
+          }));
+    };
+
+    const has_errors = Boolean(err) || stats.hasErrors();
+
+    if (has_errors || !compiler.server_compiler) {
+      finish(has_errors);
+    }
+    else {
+      build_server_bundle(compiler, finish);
+    }
+  };
+}
+
+/*
+ * The settings for compiling all pages together, into the build dir,
+ * with the code shared between them split into common chunks.
+ */
+function get_shared_settings(settings_list) {
+  return Object.assign({}, settings_list[0], {
+    'page name': settings_list.length + ' pages (shared chunks)',
+    'dest dir': path.dirname(settings_list[0]['dest dir']),
+    'pages': settings_list.map((settings) => ({
+      'name': path.basename(settings['dest dir']),
+      'src path': settings['src path'],
+      'html template': settings['html template'],
+      'public dir': settings['public dir'],
+    })),
+  });
+}
+
+// Record the files that went into a successful build (outside of node_modules)
+function write_deps(output_dir, stats) {
+  const deps = Array.from(stats.compilation.fileDependencies)
+      .filter(file => !file.split(path.sep).includes('node_modules'))
+      .sort();
+
+  fs.writeFileSync(
+      path.join(output_dir, DEPS_FILENAME), JSON.stringify(deps)
+  );
+}
+
+module.exports = {
+  setup_env,
+  reload_env,
+  create_compiler,
+  rebuild_page,
+  get_output_handler,
+  get_shared_settings,
+};
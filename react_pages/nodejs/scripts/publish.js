@@ -0,0 +1,409 @@
+'use strict';
+
+/*
+ * Atomic, versioned publishing of builds.
+ *
+ * Each build is written to a new version dir, inside the build dir -
+ *
+ *   build/.versions/<page>/<version>/  (or "build/.versions/_all/<version>/", with shared chunks)
+ *
+ * and once it has been fully written, it is published by atomically
+ * replacing the symlink "build/<page>" (or "build/.versions/_all/current"),
+ * so that readers never see a partially written build.
+ *
+ * Every publish bumps the generation no. in "build/.react-pages-generations.json" -
+ *
+ *   {"generation": <last published>, "pages": {"<page>": <generation it was published in>, ...}}
+ *
+ * (read by "react_pages/page_store.py" and "react_pages/live_reload.py")
+ *
+ * Old versions are kept for `keep versions` seconds after they're replaced,
+ * for the requests (and browsers) still using them.
+ * In watch mode, where every save publishes a version, a process only keeps
+ * the previous version of its own builds.
+ */
+
+const fs = require('fs-extra');
+const path = require('path');
+const {SHARED_DIR} = require('../config/PageChunksManifestPlugin');
+
+const GENERATIONS_FILENAME = '.react-pages-generations.json';
+const VERSIONS_DIR = '.versions';
+// The version dirs of compilations with shared chunks (all pages together)
+const SHARED_VERSIONS = '_all';
+const CURRENT_LINK = 'current';
+// Copied from the page's "public" dir, into each build
+const PUBLIC_FILES = ['favicon.ico', 'manifest.json'];
+
+const DEFAULT_KEEP_VERSIONS = 60 * 60;  // seconds
+const LOCK_TIMEOUT = 10 * 1000;  // ms
+
+let version_count = 0;
+let lock_count = 0;
+
+// The build dir, containing the dirs of all pages.
+function get_build_dir(settings) {
+  if (settings['pages']) {
+    return settings['dest dir'];
+  }
+  return path.dirname(settings['dest dir']);
+}
+
+// The names of the pages built by a compilation.
+function get_page_names(settings) {
+  if (settings['pages']) {
+    return settings['pages'].map((page) => page['name']);
+  }
+  return [path.basename(settings['dest dir'])];
+}
+
+function get_versions_dir(settings) {
+  const name = settings['pages'] ? SHARED_VERSIONS : path.basename(settings['dest dir']);
+  return path.join(get_build_dir(settings), VERSIONS_DIR, name);
+}
+
+/*
+ * A new (empty) dir, for the output of a build.
+ */
+function create_version_dir(settings) {
+  version_count += 1;
+
+  const version = [
+    Date.now().toString(36), process.pid.toString(36), version_count.toString(36),
+  ].join('-');
+
+  const version_dir = path.join(get_versions_dir(settings), version);
+  fs.mkdirsSync(version_dir);
+
+  return version_dir;
+}
+
+function discard_version_dir(version_dir) {
+  fs.removeSync(version_dir);
+}
+
+/*
+ * Publish a (successful) build, written to `version_dir`.
+ *
+ * Returns (a Promise of) the generation it was published in.
+ */
+async function publish_version(settings, version_dir) {
+  const build_dir = get_build_dir(settings);
+  const versions_dir = get_versions_dir(settings);
+
+  copy_public_files(settings, version_dir);
+
+  let replaced;
+  if (settings['pages']) {
+    // Link the pages (and the shared chunks) to the current version once,
+    // so that all of them are published together, by a single swap.
+    const current = path.join(versions_dir, CURRENT_LINK);
+    const names = get_page_names(settings).concat([SHARED_DIR]);
+
+    replaced = resolve_link(current);
+    swap_link(current, path.basename(version_dir), versions_dir);
+
+    for (const name of names) {
+      const target = path.relative(build_dir, path.join(current, name));
+      if (read_link(path.join(build_dir, name)) !== target) {
+        swap_link(path.join(build_dir, name), target, versions_dir);
+      }
+    }
+  }
+  else {
+    const link = settings['dest dir'];
+    replaced = resolve_link(link);
+    swap_link(link, path.relative(build_dir, version_dir), versions_dir);
+  }
+
+  // Marks when it was replaced, for `prune_versions()`
+  if (replaced) {
+    touch(replaced);
+  }
+
+  const generation = await bump_generation(build_dir, get_page_names(settings));
+
+  prune_versions(
+      versions_dir,
+      [path.basename(version_dir), replaced && path.basename(replaced)],
+      settings['keep versions'] == null ? DEFAULT_KEEP_VERSIONS : settings['keep versions'],
+      Boolean(settings['watch'])
+  );
+
+  return generation;
+}
+
+function copy_public_files(settings, version_dir) {
+  const pages = settings['pages'] || [settings];
+
+  for (const page of pages) {
+    const public_dir = page['public dir'];
+    if (!public_dir) continue;
+
+    const page_dir = settings['pages'] ? path.join(version_dir, page['name']) : version_dir;
+
+    for (const name of PUBLIC_FILES) {
+      const src = path.join(public_dir, name);
+      if (fs.existsSync(src)) {
+        fs.copySync(src, path.join(page_dir, name));
+      }
+    }
+  }
+}
+
+function read_link(link) {
+  try {
+    return fs.readlinkSync(link);
+  }
+  catch (e) {
+    return null;
+  }
+}
+
+// The (absolute) path a symlink points to, or null.
+function resolve_link(link) {
+  const target = read_link(link);
+  return target && path.resolve(path.dirname(link), target);
+}
+
+function touch(file) {
+  const now = new Date();
+  try {
+    fs.utimesSync(file, now, now);
+  }
+  catch (e) {
+    // already gone
+  }
+}
+
+/*
+ * Atomically point `link` to `target`.
+ *
+ * A (non-symlink) dir at `link`, from before versioned builds,
+ * is moved into `versions_dir` first, as an old version.
+ */
+function swap_link(link, target, versions_dir) {
+  let stat = null;
+  try {
+    stat = fs.lstatSync(link);
+  }
+  catch (e) {
+    // doesn't exist yet
+  }
+
+  if (stat && stat.isDirectory()) {
+    const legacy = path.join(
+        versions_dir, 'legacy-' + path.basename(link) + '-' + Date.now().toString(36)
+    );
+    fs.renameSync(link, legacy);
+    touch(legacy);
+  }
+
+  const tmp = link + '.' + process.pid + '.tmp';
+  fs.removeSync(tmp);
+  fs.symlinkSync(target, tmp);
+  fs.renameSync(tmp, link);
+}
+
+/*
+ * Increment the generation, and record it for the pages just published.
+ *
+ * Builds may be published concurrently by several processes (workers, the daemon),
+ * so the read-modify-write happens under a lock file.
+ */
+function bump_generation(build_dir, page_names) {
+  const file = path.join(build_dir, GENERATIONS_FILENAME);
+
+  return with_lock(file + '.lock', () => {
+    const generations = read_generations(file);
+
+    generations.generation += 1;
+    for (const name of page_names) {
+      generations.pages[name] = generations.generation;
+    }
+
+    const tmp = file + '.' + process.pid + '.tmp';
+    fs.writeFileSync(tmp, JSON.stringify(generations));
+    fs.renameSync(tmp, file);
+
+    return generations.generation;
+  });
+}
+
+function read_generations(file) {
+  let generations;
+  try {
+    generations = JSON.parse(fs.readFileSync(file, 'utf8'));
+  }
+  catch (e) {
+    return {generation: 0, pages: {}};
+  }
+
+  // from an older version, with only the generation of each page
+  if (typeof generations.generation !== 'number') {
+    const pages = generations;
+    generations = {generation: Math.max(0, ...Object.values(pages)), pages};
+  }
+
+  return generations;
+}
+
+/*
+ * Run `func()` holding the lock file `lock`.
+ *
+ * The lock file holds the pid of its owner (and when it was taken),
+ * so a lock left behind by a crashed process, or held for longer than `LOCK_TIMEOUT`,
+ * is broken, instead of being waited on forever.
+ */
+async function with_lock(lock, func) {
+  lock_count += 1;
+  const token = process.pid + ':' + Date.now() + ':' + lock_count;
+
+  for (let delay = 5; ; delay = Math.min(delay * 2, 100)) {
+    try {
+      fs.writeFileSync(lock, token, {flag: 'wx'});
+      break;
+    }
+    catch (e) {
+      if (e.code !== 'EEXIST') throw e;
+    }
+
+    const holder = read_lock(lock);
+    if (holder === null) continue;  // just released
+
+    if (is_stale(holder) && take_stale_lock(lock, holder, token)) {
+      break;
+    }
+
+    // without blocking the other builds of this process
+    await sleep(delay);
+  }
+
+  try {
+    return func();
+  }
+  finally {
+    const holder = read_lock(lock);
+    if (holder && holder.token === token) {
+      fs.removeSync(lock);
+    }
+  }
+}
+
+// The owner of a lock file - {token, pid, time}, or null if there's none.
+function read_lock(lock) {
+  try {
+    const token = fs.readFileSync(lock, 'utf8');
+    const [pid, time] = token.split(':').map(Number);
+
+    // (an owner that's only just writing it)
+    return {token, pid, time: time || fs.statSync(lock).mtime.getTime()};
+  }
+  catch (e) {
+    return null;
+  }
+}
+
+function is_stale(holder) {
+  return Date.now() - holder.time > LOCK_TIMEOUT || (holder.pid && !is_running(holder.pid));
+}
+
+function is_running(pid) {
+  try {
+    process.kill(pid, 0);
+    return true;
+  }
+  catch (e) {
+    return e.code === 'EPERM';
+  }
+}
+
+/*
+ * Take over a stale lock, returning whether it was taken.
+ *
+ * The stale lock is replaced by a fresh one with a single, atomic rename,
+ * so there's never a moment without a lock, in which someone else could take it.
+ * Processes take turns at this (under "<lock>.break"), so that only one of the ones
+ * that found the same stale lock replaces it.
+ */
+function take_stale_lock(lock, holder, token) {
+  const guard = lock + '.break';
+  try {
+    fs.writeFileSync(guard, token, {flag: 'wx'});
+  }
+  catch (e) {
+    if (e.code !== 'EEXIST') throw e;
+
+    // left behind by a process that crashed, while taking over
+    try {
+      if (Date.now() - fs.statSync(guard).mtime.getTime() > LOCK_TIMEOUT) {
+        fs.removeSync(guard);
+      }
+    }
+    catch (e) {
+      // already gone
+    }
+    return false;
+  }
+
+  try {
+    // released, or taken over already, since it was found stale
+    const current = read_lock(lock);
+    if (!current || current.token !== holder.token) return false;
+
+    const tmp = lock + '.' + process.pid + '.tmp';
+    fs.writeFileSync(tmp, token);
+    fs.renameSync(tmp, lock);
+    return true;
+  }
+  finally {
+    fs.removeSync(guard);
+  }
+}
+
+function sleep(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+/*
+ * Remove the versions that were replaced more than `keep_seconds` ago,
+ * except for the ones in `keep`.
+ *
+ * With `prune_own`, the versions created by this process are removed right away.
+ *
+ * The version dirs of other processes' builds that are still being written
+ * look just like ones that were replaced, so they're never pruned with `keep_seconds` <= 0.
+ */
+function prune_versions(versions_dir, keep, keep_seconds, prune_own) {
+  if (keep_seconds <= 0 && !prune_own) return;
+  const cutoff = keep_seconds > 0 ? Date.now() - keep_seconds * 1000 : -Infinity;
+
+  for (const name of fs.readdirSync(versions_dir)) {
+    if (keep.includes(name) || name === CURRENT_LINK) continue;
+
+    const version_dir = path.join(versions_dir, name);
+    try {
+      if ((prune_own && is_own_version(name))
+          || fs.statSync(version_dir).mtime.getTime() < cutoff) {
+        fs.removeSync(version_dir);
+      }
+    }
+    catch (e) {
+      // removed by someone else
+    }
+  }
+}
+
+// Created by this process? (see `create_version_dir()`)
+function is_own_version(name) {
+  const parts = name.split('-');
+  return parts.length === 3 && parts[1] === process.pid.toString(36);
+}
+
+module.exports = {
+  GENERATIONS_FILENAME,
+  get_build_dir,
+  create_version_dir,
+  discard_version_dir,
+  publish_version,
+};
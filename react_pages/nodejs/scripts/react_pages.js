@@ -1,94 +1,243 @@
 #!/usr/bin/env node
 'use strict';
 
-const webpack = require('webpack');
+const os = require('os');
+const path = require('path');
 const cli = require('commander');
 const ora = require('ora');
-// const util = require('util');
+const {get_shared_settings} = require('./compile_page');
+const {LocalBuilder, PoolBuilder, BuildQueue} = require('./build_queue');
 
-cli
-    .arguments('[settings_json]')
-    .action(react_pages)
-    .parse(process.argv); // end with parse to parse through the input
-
-// Webpack output options
-const normal_opts = {
-  all: false,
-  errors: true,
-  moduleTrace: true,
-  colors: true,
-};
-const verbose_opts = {
-  colors: true,
-  chunks: false,
-};
+const DEFAULT_WATCH_DEBOUNCE = 200;  // ms
 
 function react_pages(settings_list_json) {
-  const settings_list = JSON.parse(settings_list_json);
+  let settings_list = JSON.parse(settings_list_json);
 
-  const verbose = settings_list[0]['verbose'];
-  const deploy = settings_list[0]['deploy'];
+  // All the pages, in a single compilation
+  if (settings_list[0]['shared chunks']) {
+    settings_list = [get_shared_settings(settings_list)];
+  }
 
-  let get_custom_config;
+  const first = settings_list[0];
+  const jobs = Math.min(first['jobs'] || 1, settings_list.length);
 
-  if (deploy) {
-    process.env.BABEL_ENV = 'production';
-    process.env.NODE_ENV = 'production';
-    get_custom_config = require('../config/webpack.config.prod');
+  const spinner = ora({'spinner': 'moon'}).start();
+  const reporter = new Reporter(spinner, settings_list);
 
-  }
-  else {
-    process.env.BABEL_ENV = 'development';
-    process.env.NODE_ENV = 'development';
-    get_custom_config = require('../config/webpack.config.dev');
-  }
+  // Spread the pages across a pool of worker processes (a page at a time, per worker),
+  // or build all of them right here, interleaved (like a single webpack process would)
+  const builder = jobs > 1
+      ? new PoolBuilder(jobs, first['worker memory'])
+      : new LocalBuilder(first['deploy']);
+  const concurrency = jobs > 1 ? jobs : settings_list.length;
+  // Only the initial build interleaves every page. A change to a shared component
+  // (i.e. affecting every page) re-builds a few of them at a time.
+  const watch_concurrency = jobs > 1 ? jobs : Math.min(os.cpus().length, settings_list.length);
 
-  const spinner = ora({'spinner': 'moon'}).start();
+  const queue = new BuildQueue(builder, concurrency, reporter);
+
+  // dest dir -> files the page was built from
+  const deps = new Map();
+
+  queue.on_done = (settings, result) => {
+    if (result.deps && result.deps.length) {
+      deps.set(settings['dest dir'], new Set(result.deps));
+    }
+  };
+
+  queue.on_idle = () => {
+    queue.on_idle = null;
+
+    if (first['watch']) {
+      queue.concurrency = watch_concurrency;
+      watch(settings_list, builder, queue, deps);
+    }
+    else {
+      builder.close();
+    }
+  };
 
   for (const settings of settings_list) {
-    const config = get_custom_config(settings);
+    queue.push(settings);
+  }
+}
 
-    // console.debug('webpack config:', util.inspect(config, false, null));
-    const compiler = webpack(config);
+/*
+ * Watch the files of all the pages, with a single watcher,
+ * and re-build only the pages that depend on the changed files.
+ *
+ * A change to the .env files re-builds every page, with the new environment.
+ */
+function watch(settings_list, builder, queue, deps) {
+  // required lazily, since one-off builds don't need it
+  const {SharedWatcher, is_env_file} = require('./watcher');
 
-    const handle_output = (err, stats) => {
-      let to_print;
-      if (err) {
-        to_print = err.stack || err;
+  const npm_prefix = settings_list[0]['npm prefix'];
+  const debounce = settings_list[0]['watch debounce'] || DEFAULT_WATCH_DEBOUNCE;
 
-        if (err.details) {
-          to_print += '\n' + err.details;
-        }
+  const ignored_dirs = [];
+  for (const settings of settings_list) {
+    const dest_dir = settings['dest dir'];
+    ignored_dirs.push(dest_dir);
+
+    // i.e. "build/", when the pages go to "build/<page>/"
+    if (path.dirname(dest_dir) !== npm_prefix) {
+      ignored_dirs.push(path.dirname(dest_dir));
+    }
+  }
+
+  const watcher = new SharedWatcher({
+    roots: [npm_prefix],
+    ignored_dirs,
+    debounce,
+    on_change: (files) => {
+      let affected;
+      if (files.some(is_env_file)) {
+        builder.reset();
+        affected = settings_list;
       }
       else {
-        to_print = stats.toString(verbose ? verbose_opts : normal_opts)
+        affected = get_affected_pages(files, settings_list, deps);
       }
 
-      const was_spinning = spinner.isSpinning;
-      if (was_spinning) spinner.stop();
-      if (to_print) {
-        console.log(to_print);
+      for (const settings of affected) {
+        queue.push(settings);
       }
-      if (was_spinning) spinner.start();
-    };
+    },
+  });
+
+  // e.g. files from outside the project dir
+  for (const files of deps.values()) {
+    watcher.add(Array.from(files));
+  }
+
+  const record_deps = queue.on_done;
+  queue.on_done = (settings, result) => {
+    record_deps(settings, result);
+    if (result.deps) watcher.add(result.deps);
+  };
+}
+
+/*
+ * The pages that need a re-build, when these files change.
+ *
+ * Pages that don't know their dependencies yet (e.g. their first build crashed),
+ * are re-built for any change inside their source dir.
+ */
+function get_affected_pages(files, settings_list, deps) {
+  return settings_list.filter((settings) => {
+    const page_deps = deps.get(settings['dest dir']);
+
+    if (page_deps) {
+      return files.some((file) => page_deps.has(file));
+    }
+
+    const src_dirs = settings['pages']
+        ? settings['pages'].map((page) => path.dirname(page['src path']))
+        : [path.dirname(settings['src path'])];
+
+    return files.some(
+        (file) => src_dirs.some((dir) => file.startsWith(dir + path.sep))
+    );
+  });
+}
 
-    if (settings['watch']) {
-      compiler.watch({}, handle_output);
+/*
+ * Reports the progress of all pages, to a single console.
+ */
+class Reporter {
+  constructor(spinner, settings_list) {
+    this.spinner = spinner;
+    this.pages = settings_list.map((settings) => settings['page name']);
+    this.watch = settings_list[0]['watch'];
+
+    this.started_at = Date.now();
+    this.active = new Map();  // page -> percent
+    this.durations = new Map();  // page -> duration of first build
+    this.failed = new Set();
+    this.summary_printed = false;
+  }
+
+  is_built(page) {
+    return this.durations.has(page);
+  }
+
+  start(page) {
+    this.active.set(page, 0);
+    this.update_spinner();
+  }
+
+  progress(page, percent) {
+    if (this.active.has(page)) {
+      this.active.set(page, percent);
+      this.update_spinner();
+    }
+  }
+
+  update_spinner() {
+    if (!this.active.size) return;
+
+    const parts = [];
+    for (const [page, percent] of this.active) {
+      parts.push(page + ' ' + Math.round(percent * 100) + '%');
+    }
+
+    this.spinner.text = parts.join('  ');
+    if (!this.spinner.isSpinning) this.spinner.start();
+  }
+
+  output(text) {
+    const was_spinning = this.spinner.isSpinning;
+    if (was_spinning) this.spinner.stop();
+    console.log(text);
+    if (was_spinning) this.spinner.start();
+  }
+
+  done(page, result) {
+    this.active.delete(page);
+
+    if (result.has_errors) {
+      this.failed.add(page);
+      this.spinner.fail(page + '  ( ' + timeStamp() + ' )');
+      if (!this.watch) process.exitCode = 1;
     }
     else {
-      compiler.run(handle_output);
+      this.failed.delete(page);
+      this.spinner.succeed(page + '  ( ' + timeStamp() + ' )');
     }
 
-    compiler.apply(
-        new webpack.ProgressPlugin((handler) => {
-          if (handler === 0) {
-            spinner.start();
-          }
-          if (handler === 1) {
-            spinner.succeed(settings['page name'] + '  ( ' + timeStamp() + ' )');
-            spinner.stop()
-          }
-        })
+    if (!this.is_built(page)) {
+      this.durations.set(page, result.duration);
+    }
+
+    if (this.active.size) {
+      this.update_spinner();
+    }
+    else {
+      this.spinner.stop();
+    }
+
+    if (!this.summary_printed && this.durations.size === this.pages.length) {
+      this.summary_printed = true;
+      this.print_summary();
+    }
+  }
+
+  print_summary() {
+    if (this.pages.length < 2) return;
+
+    const rows = Array.from(this.durations).sort((a, b) => b[1] - a[1]);
+
+    console.log('\nBuild summary:');
+    for (const [page, duration] of rows) {
+      const status = this.failed.has(page) ? '✖' : '✔';
+      console.log(
+          '  ' + status + ' ' + (duration / 1000).toFixed(1).padStart(7) + 's  ' + page
+      );
+    }
+    console.log(
+        '  ' + this.pages.length + ' pages in ' +
+        ((Date.now() - this.started_at) / 1000).toFixed(1) + 's\n'
     );
   }
 }
@@ -118,4 +267,9 @@ function timeStamp() {
 
   // Return the formatted string
   return time.join(":") + " " + suffix;
-}
\ No newline at end of file
+}
+
+cli
+    .arguments('[settings_json]')
+    .action(react_pages)
+    .parse(process.argv); // end with parse to parse through the input
@@ -0,0 +1,282 @@
+'use strict';
+
+/*
+ * A long-lived build daemon, that keeps a warm compiler per page in memory.
+ *
+ *   $ node react_pages_daemon.js <socket path> <develop|deploy>
+ *
+ * Listens on a unix socket, for newline-delimited JSON requests, one per connection -
+ *
+ *   {"command": "build", "settings_list": [...]}  - build pages
+ *   {"command": "rebuild", "page": "<page name>"}  - re-build an already built page
+ *   {"command": "status"}
+ *   {"command": "stats"}
+ *   {"command": "shutdown"}
+ *
+ * and responds with newline-delimited JSON events -
+ * ("start", "progress", "output", "done", same as `react_pages_worker.js`)
+ * ending with a single {"type": "result", ...}.
+ *
+ * The .env files are re-loaded (and the compilers re-created) before a build,
+ * if they changed since they were last loaded.
+ */
+
+const fs = require('fs');
+const net = require('net');
+const path = require('path');
+const {
+  setup_env,
+  reload_env,
+  create_compiler,
+  rebuild_page,
+  get_shared_settings,
+} = require('./compile_page');
+const {is_env_file} = require('./watcher');
+
+const socket_path = process.argv[2];
+const mode = process.argv[3];
+const deploy = mode === 'deploy';
+
+let get_custom_config = setup_env(deploy);
+let env_fingerprint = get_env_fingerprint();
+const started_at = Date.now();
+
+// dest dir -> {compiler, settings, key, name, builds, last duration, ...}
+const pages = new Map();
+
+// The settings that don't change the compiler
+const IGNORED_SETTINGS = [
+  'page name', 'watch', 'verbose', 'jobs', 'worker memory', 'watch debounce', 'keep versions',
+];
+
+function settings_key(settings) {
+  const copy = Object.assign({}, settings);
+  for (const key of IGNORED_SETTINGS) delete copy[key];
+  return JSON.stringify(copy);
+}
+
+/*
+ * The contents of the .env files (see "config/env.js"), in the project dir (the cwd).
+ */
+function get_env_fingerprint() {
+  return fs.readdirSync(process.cwd()).filter(is_env_file).sort().map((file) => {
+    let contents;
+    try {
+      contents = fs.readFileSync(file, 'utf8');
+    }
+    catch (e) {
+      contents = '';
+    }
+    return file + '\0' + contents;
+  }).join('\0');
+}
+
+/*
+ * The builds must use the current .env,
+ * since it's part of the fingerprint of incremental deploys. (see "build_manifest.py")
+ */
+function check_env() {
+  const fingerprint = get_env_fingerprint();
+  if (fingerprint === env_fingerprint) return;
+
+  env_fingerprint = fingerprint;
+  get_custom_config = reload_env(deploy);
+
+  // compilers created before keep the old values
+  for (const page of pages.values()) {
+    page.compiler = create_compiler(page.settings, get_custom_config);
+  }
+}
+
+function get_page(settings) {
+  const key = settings_key(settings);
+  let page = pages.get(settings['dest dir']);
+
+  if (!page || page.key !== key) {
+    page = {
+      compiler: create_compiler(settings, get_custom_config),
+      settings,
+      key,
+      name: path.basename(settings['dest dir']),
+      queue: Promise.resolve(),
+      builds: 0,
+      last_duration: null,
+      last_has_errors: null,
+    };
+    pages.set(settings['dest dir'], page);
+  }
+
+  // for the reporter
+  page.settings = settings;
+  return page;
+}
+
+function run_page(page, send) {
+  const label = page.settings['page name'];
+  const settings = Object.assign({}, page.settings, {watch: false});
+
+  // a compiler can't run concurrently with itself
+  page.queue = page.queue.then(() => new Promise((resolve) => {
+    let last_percent = -1;
+
+    page.compiler.reporter = {
+      start: () => send({type: 'start', page: label}),
+      progress: (percent) => {
+        if (percent === 1 || percent - last_percent >= 0.05) {
+          last_percent = percent;
+          send({type: 'progress', page: label, percent});
+        }
+      },
+      output: (text) => send({type: 'output', page: label, text}),
+      done: (result) => {
+        delete result.deps;
+        page.builds += 1;
+        page.last_duration = result.duration;
+        page.last_has_errors = result.has_errors;
+
+        send(Object.assign({type: 'done', page: label}, result));
+        resolve(result);
+      },
+    };
+
+    rebuild_page(page.compiler, settings);
+  }));
+
+  return page.queue;
+}
+
+function run_pages(page_list, send) {
+  return Promise.all(page_list.map((page) => run_page(page, send))).then(
+      (results) => ({has_errors: results.some((result) => result.has_errors)})
+  );
+}
+
+const commands = {
+  build(request, send) {
+    let settings_list = request['settings_list'];
+
+    if (settings_list[0]['deploy'] !== deploy) {
+      return Promise.resolve({error: 'This daemon only builds for ' + mode + '.'});
+    }
+    check_env();
+
+    if (settings_list[0]['shared chunks']) {
+      settings_list = [get_shared_settings(settings_list)];
+    }
+
+    return run_pages(settings_list.map(get_page), send);
+  },
+
+  rebuild(request, send) {
+    const page_list = Array.from(pages.values()).filter(
+        (page) => page.name === request['page']
+    );
+
+    if (!page_list.length) {
+      return Promise.resolve({error: 'Unknown page ' + request['page'] + '.'});
+    }
+
+    check_env();
+
+    return run_pages(page_list, send);
+  },
+
+  status() {
+    return Promise.resolve({
+      pid: process.pid,
+      mode,
+      uptime: (Date.now() - started_at) / 1000,
+      pages: Array.from(pages.values()).map((page) => page.name),
+    });
+  },
+
+  stats() {
+    const memory = process.memoryUsage();
+
+    return Promise.resolve({
+      pid: process.pid,
+      mode,
+      uptime: (Date.now() - started_at) / 1000,
+      memory: {rss: memory.rss, heap_used: memory.heapUsed},
+      pages: Array.from(pages.values()).map((page) => ({
+        name: page.name,
+        builds: page.builds,
+        last_duration: page.last_duration,
+        last_has_errors: page.last_has_errors,
+        files: page.compiler.deps ? page.compiler.deps.length : null,
+      })),
+    });
+  },
+
+  shutdown() {
+    setImmediate(shutdown);
+    return Promise.resolve({});
+  },
+};
+
+function handle_connection(socket) {
+  let buffer = '';
+  let handled = false;
+
+  const send = (msg) => {
+    if (!socket.destroyed) socket.write(JSON.stringify(msg) + '\n');
+  };
+
+  socket.setEncoding('utf8');
+  socket.on('error', () => {});
+  socket.on('data', (data) => {
+    if (handled) return;
+    buffer += data;
+
+    const i = buffer.indexOf('\n');
+    if (i < 0) return;
+    handled = true;
+
+    let request;
+    try {
+      request = JSON.parse(buffer.slice(0, i));
+    }
+    catch (e) {
+      send({type: 'result', error: 'Invalid request: ' + e.message});
+      socket.end();
+      return;
+    }
+
+    const command = commands[request['command']];
+    const result = command
+        ? command(request, send)
+        : Promise.resolve({error: 'Unknown command ' + request['command'] + '.'});
+
+    result
+        .catch((err) => ({error: String(err.stack || err)}))
+        .then((result) => {
+          send(Object.assign({type: 'result'}, result));
+          socket.end();
+        });
+  });
+}
+
+const server = net.createServer(handle_connection);
+
+function shutdown() {
+  server.close();
+  try {
+    fs.unlinkSync(socket_path);
+  }
+  catch (e) {}
+  process.exit(0);
+}
+
+process.on('SIGTERM', shutdown);
+process.on('SIGINT', shutdown);
+
+// a left-over socket, from a daemon that didn't exit cleanly
+try {
+  fs.unlinkSync(socket_path);
+}
+catch (e) {}
+
+server.listen(socket_path, () => {
+  // the parent waits for this, before detaching
+  console.log('listening on ' + socket_path);
+});
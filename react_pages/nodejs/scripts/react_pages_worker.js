@@ -0,0 +1,48 @@
+'use strict';
+
+// A worker process, compiling the pages sent to it by `react_pages.js`.
+// The compiler for each page is kept around, so re-builds (in watch mode) are warm.
+
+const {setup_env, create_compiler, rebuild_page} = require('./compile_page');
+
+let get_custom_config;
+
+// dest dir -> compiler
+const compilers = new Map();
+
+process.on('message', (msg) => {
+  if (msg.type === 'compile') {
+    const settings = msg.settings;
+    const page = settings['page name'];
+
+    if (!get_custom_config) {
+      get_custom_config = setup_env(settings['deploy']);
+    }
+
+    let compiler = compilers.get(settings['dest dir']);
+    if (!compiler) {
+      compiler = create_compiler(settings, get_custom_config);
+      compilers.set(settings['dest dir'], compiler);
+    }
+
+    let last_percent = -1;
+
+    compiler.reporter = {
+      start: () => process.send({type: 'start', page}),
+      progress: (percent) => {
+        // don't flood the parent with messages
+        if (percent === 1 || percent - last_percent >= 0.05) {
+          last_percent = percent;
+          process.send({type: 'progress', page, percent});
+        }
+      },
+      output: (text) => process.send({type: 'output', page, text}),
+      done: (result) => process.send(Object.assign({type: 'done', page}, result)),
+    };
+
+    rebuild_page(compiler, settings);
+  }
+  else if (msg.type === 'exit') {
+    process.disconnect();
+  }
+});
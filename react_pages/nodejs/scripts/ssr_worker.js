@@ -0,0 +1,76 @@
+'use strict';
+
+/*
+ * A server-side rendering worker, managed by "react_pages/ssr.py".
+ *
+ *   $ node ssr_worker.js
+ *
+ * Reads length-prefixed JSON requests from stdin -
+ *
+ *   <4 byte, big-endian length>{"bundle": "<path to a page's server bundle>", "context": {...}}
+ *
+ * and writes a length-prefixed JSON response to stdout, for each one -
+ *
+ *   {"html": "..."} or {"error": "..."}
+ *
+ * Exits when stdin is closed.
+ */
+
+const util = require('util');
+
+const HEADER_SIZE = 4;
+
+// stdout is for responses only, so the pages' logs go to stderr
+console.log = console.info = console.debug = (...args) => {
+  process.stderr.write(util.format(...args) + '\n');
+};
+
+// Bundles are only loaded once. (each build has its own path)
+const bundles = new Map();
+
+function render(request) {
+  let bundle = bundles.get(request.bundle);
+  if (!bundle) {
+    bundle = require(request.bundle);
+    bundles.set(request.bundle, bundle);
+  }
+
+  return bundle.render(request.context);
+}
+
+function respond(response) {
+  const body = Buffer.from(JSON.stringify(response));
+  const header = Buffer.alloc(HEADER_SIZE);
+  header.writeUInt32BE(body.length, 0);
+
+  process.stdout.write(Buffer.concat([header, body]));
+}
+
+function handle(body) {
+  let response;
+  try {
+    response = {html: render(JSON.parse(body.toString()))};
+  }
+  catch (e) {
+    response = {error: String(e.stack || e)};
+  }
+  respond(response);
+}
+
+let buffer = Buffer.alloc(0);
+
+process.stdin.on('data', (data) => {
+  buffer = Buffer.concat([buffer, data]);
+
+  while (buffer.length >= HEADER_SIZE) {
+    const length = buffer.readUInt32BE(0);
+    if (buffer.length < HEADER_SIZE + length) break;
+
+    const body = buffer.slice(HEADER_SIZE, HEADER_SIZE + length);
+    buffer = buffer.slice(HEADER_SIZE + length);
+
+    handle(body);
+  }
+});
+
+process.stdin.on('end', () => process.exit(0));
@@ -0,0 +1,92 @@
+'use strict';
+
+const path = require('path');
+const chokidar = require('chokidar');
+
+/*
+ * A single file watcher, shared by all the pages. (inotify, on linux)
+ *
+ * Changes are collected for `debounce` ms after the last one,
+ * and then reported together, to `on_change(files)`.
+ *
+ * node_modules, dot files (except the .env files), and the `ignored_dirs`
+ * (i.e. the build output) are never watched.
+ */
+class SharedWatcher {
+  constructor({roots, ignored_dirs, debounce, on_change}) {
+    this.ignored_dirs = ignored_dirs;
+    this.debounce = debounce;
+    this.on_change = on_change;
+
+    this.watched = new Set(roots);
+    this.changed = new Set();
+    this.timer = null;
+
+    this.watcher = chokidar.watch(roots, {
+      ignoreInitial: true,
+      ignored: (file) => this.is_ignored(file),
+    });
+
+    this.watcher.on('all', (event, file) => {
+      if (event === 'addDir' || event === 'unlinkDir') return;
+
+      this.changed.add(path.resolve(file));
+
+      clearTimeout(this.timer);
+      this.timer = setTimeout(() => this.flush(), this.debounce);
+    });
+  }
+
+  is_ignored(file) {
+    const parts = file.split(path.sep);
+
+    if (parts.includes('node_modules')) return true;
+    if (path.basename(file).startsWith('.') && !is_env_file(file)) return true;
+
+    return this.ignored_dirs.some(
+        (dir) => file === dir || file.startsWith(dir + path.sep)
+    );
+  }
+
+  /*
+   * Watch these files as well, if they're not already being watched.
+   * (e.g. dependencies from outside the project dir)
+   */
+  add(files) {
+    const new_files = files.filter(
+        (file) => !this.is_watched(file) && !this.is_ignored(file)
+    );
+
+    if (new_files.length) {
+      for (const file of new_files) this.watched.add(file);
+      this.watcher.add(new_files);
+    }
+  }
+
+  is_watched(file) {
+    for (const root of this.watched) {
+      if (file === root || file.startsWith(root + path.sep)) return true;
+    }
+    return false;
+  }
+
+  flush() {
+    const files = Array.from(this.changed);
+    this.changed = new Set();
+    this.on_change(files);
+  }
+
+  close() {
+    clearTimeout(this.timer);
+    this.watcher.close();
+  }
+}
+
+/*
+ * i.e. `.env`, `.env.local`, `.env.development`, ... (see "config/env.js")
+ */
+function is_env_file(file) {
+  return /^\.env(\..+)?$/.test(path.basename(file));
+}
+
+module.exports = {SharedWatcher, is_env_file};
@@ -0,0 +1,365 @@
+"""
+A single, packed file containing every built page,
+pre-split around the context injection point, along with its asset manifest.
+
+Built at deploy time (`react-pages pack`), and memory-mapped by every worker
+process; so that the pages are shared through the OS page cache,
+instead of being copied into each worker.
+
+Layout -
+
+    MAGIC (8 bytes) | index length (8 bytes, big endian) | index (JSON) | data
+
+The index holds the generation of pack, and for each page,
+the (offset, length) of its head, tail and manifest, in the data section,
+along with the build it was packed from (dir & generation).
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+
+from react_pages.page_store import (
+    GENERATIONS_FILENAME,
+    MANIFEST_FILENAME,
+    Generations,
+    PageEntry,
+    PageStore,
+    inline_css,
+    insert_chunk_tags,
+)
+from react_pages.renderer import PageRenderer
+
+MAGIC = b"RPPACK01"
+HEADER = struct.Struct(">8sQ")
+
+PACK_FILENAME = "pages.pack"
+
+
+def read_index(path: Path) -> dict:
+    with open(path, "rb") as f:
+        magic, index_len = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"React Pages: {path} is not a page pack.")
+        return json.loads(f.read(index_len))
+
+
+def write_pack(build_dir: Path, path: Path = None) -> dict:
+    """
+    Pack every page in build dir into a single file, and return its index.
+
+    The file is replaced atomically,
+    with a generation one more than the previous one.
+    """
+
+    build_dir = Path(build_dir)
+    path = Path(path or build_dir / PACK_FILENAME)
+
+    try:
+        generation = read_index(path)["generation"] + 1
+    except (FileNotFoundError, ValueError, KeyError):
+        generation = 1
+
+    generations = Generations(build_dir / GENERATIONS_FILENAME)
+    generations.refresh()
+
+    pages = {}
+    chunks = []
+    offset = 0
+
+    def add_chunk(data: bytes):
+        nonlocal offset
+        chunks.append(data)
+        span = (offset, len(data))
+        offset += len(data)
+        return span
+
+    for index_html_path in sorted(build_dir.glob("*/index.html")):
+        page_name = index_html_path.parent.name
+        # resolve the (symlinked) current version once, to read a single build
+        page_dir = index_html_path.parent.resolve()
+        index_html_path = page_dir / "index.html"
+        stat = index_html_path.stat()
+
+        renderer = PageRenderer.from_html(index_html_path.read_text(encoding="utf-8"))
+
+        page = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "head": add_chunk(renderer.head),
+            "tail": add_chunk(renderer.tail),
+            # for the files read at runtime (i.e. inlined CSS)
+            "dir": str(page_dir),
+            "generation": generations.pages.get(page_name),
+        }
+
+        manifest_path = page_dir / MANIFEST_FILENAME
+        if manifest_path.exists():
+            page["manifest"] = add_chunk(manifest_path.read_bytes())
+
+        pages[page_name] = page
+
+    index = {"generation": generation, "pages": pages}
+    index_bytes = json.dumps(index).encode()
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".pages.pack.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(index_bytes)))
+            f.write(index_bytes)
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return index
+
+
+class PackedPageEntry(PageEntry):
+    """
+    A page entry backed by (zero-copy) slices of the memory-mapped pack.
+
+    Post-processed like the entries of `PageStore`,
+    in which case it's no longer zero-copy.
+    """
+
+    __slots__ = ("_html", "_head", "_tail", "_zero_copy")
+
+    def __init__(
+        self,
+        page: dict,
+        data: memoryview,
+        checked_at: float,
+        chunk_url=None,
+        inline_css_max_size=None,
+    ):
+        self.mtime_ns = page["mtime_ns"]
+        self.size = page["size"]
+        self.checked_at = checked_at
+        self.inlined_css = False
+        self.preload_links = None
+        self.renderer = None
+        self.generation = page.get("generation")
+
+        self._head = data[slice(*_span(page["head"]))]
+        self._tail = data[slice(*_span(page["tail"]))]
+        self._html = None
+        self._zero_copy = True
+
+        if "manifest" in page:
+            self.manifest = json.loads(bytes(data[slice(*_span(page["manifest"]))]))
+        else:
+            self.manifest = None
+
+        if self.manifest is None:
+            return
+
+        if "chunks" in self.manifest and chunk_url is not None:
+            self._html = insert_chunk_tags(self.html, self.manifest, chunk_url)
+            self._zero_copy = False
+
+        # older packs don't record the page's dir
+        if inline_css_max_size is not None and "dir" in page:
+            html, self.inlined_css = inline_css(
+                self.html, Path(page["dir"]), self.manifest, inline_css_max_size
+            )
+            if self.inlined_css:
+                self._html = html
+                self._zero_copy = False
+
+    @property
+    def html(self) -> str:
+        # only needed by the template tag, so decoded lazily
+        if self._html is None:
+            self._html = (bytes(self._head) + bytes(self._tail)).decode()
+        return self._html
+
+    def make_renderer(self) -> PageRenderer:
+        if self._zero_copy:
+            return PageRenderer(self._head, self._tail)
+        return PageRenderer.from_html(self.html)
+
+
+def _span(offset_length):
+    offset, length = offset_length
+    return offset, offset + length
+
+
+class Pack:
+    __slots__ = ("stat", "generation", "pages", "data", "entries", "stale")
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, index_len = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"React Pages: {path} is not a page pack.")
+
+        data_start = HEADER.size + index_len
+        index = json.loads(buffer[HEADER.size : data_start])
+
+        self.generation = index["generation"]
+        self.pages = index["pages"]
+        self.data = memoryview(buffer)[data_start:]
+        self.entries = {}
+        # the pages re-built since they were packed
+        self.stale = set()
+
+
+class MmapPageStore:
+    """
+    A page store, backed by a memory-mapped page pack.
+    (see `write_pack()`)
+
+    A new pack (i.e. a new generation) is picked up atomically,
+    at most once every `check_interval` seconds.
+
+    Pages that aren't in the pack (or if there's no pack),
+    or that were re-built since they were packed (i.e. a `react-pages deploy`
+    without a `react-pages pack`), are served from a regular `PageStore`.
+    """
+
+    def __init__(self, path: Path, fallback: PageStore, *, check_interval=1.0):
+        self.path = Path(path)
+        self.fallback = fallback
+        self.check_interval = check_interval
+
+        self.hits = 0
+        self.remaps = 0
+
+        self._pack = None
+        self._checked_at = None
+        self._lock = Lock()
+
+    @property
+    def generation(self):
+        pack = self.get_pack()
+        return pack.generation if pack is not None else None
+
+    def get_pack(self):
+        now = monotonic()
+        pack = self._pack
+
+        if self._checked_at is not None and (
+            self.check_interval is None or now - self._checked_at < self.check_interval
+        ):
+            return pack
+
+        with self._lock:
+            self._checked_at = now
+
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._pack = None
+                return None
+
+            if (
+                pack is None
+                or pack.stat.st_ino != stat.st_ino
+                or pack.stat.st_mtime_ns != stat.st_mtime_ns
+            ):
+                # The old mapping is released once the last response using it is gone.
+                self._pack = pack = Pack(self.path)
+                self.remaps += 1
+
+            return pack
+
+    def get(self, page_name: str) -> str:
+        return self.get_entry(page_name).html
+
+    def get_entry(self, page_name: str) -> PageEntry:
+        pack = self.get_pack()
+
+        if pack is None or page_name not in pack.pages or page_name in pack.stale:
+            return self.fallback.get_entry(page_name)
+
+        page = pack.pages[page_name]
+        entry = pack.entries.get(page_name)
+        now = monotonic()
+
+        if (
+            entry is None
+            or self.check_interval is not None
+            and now - entry.checked_at >= self.check_interval
+        ):
+            if self.is_stale(page_name, page, now):
+                pack.stale.add(page_name)
+                pack.entries.pop(page_name, None)
+                return self.fallback.get_entry(page_name)
+
+            if entry is None:
+                entry = PackedPageEntry(
+                    page,
+                    pack.data,
+                    now,
+                    self.fallback.chunk_url,
+                    self.fallback.inline_css_max_size,
+                )
+                pack.entries[page_name] = entry
+            else:
+                entry.checked_at = now
+
+        self.hits += 1
+        return entry
+
+    def is_stale(self, page_name: str, page: dict, now: float = None) -> bool:
+        """
+        Whether the page was re-built since it was packed.
+
+        Checked against the generations file (like `PageStore`),
+        or else, the mtime of the page's `index.html`.
+        """
+
+        generation = self.fallback.page_generation(page_name, now)
+        if generation is not None:
+            return generation != page.get("generation")
+
+        try:
+            stat = os.stat(self.fallback.index_html_path(page_name))
+        except FileNotFoundError:
+            return False
+
+        return stat.st_mtime_ns != page["mtime_ns"] or stat.st_size != page["size"]
+
+    def __contains__(self, page_name: str) -> bool:
+        pack = self._pack
+        return (
+            pack is not None and page_name in pack.pages
+        ) or page_name in self.fallback
+
+    def __len__(self) -> int:
+        pack = self._pack
+        return (len(pack.pages) if pack is not None else 0) + len(self.fallback)
+
+    def invalidate(self, page_name: str = None):
+        self._checked_at = None
+
+        pack = self._pack
+        if pack is not None:
+            if page_name is None:
+                pack.entries.clear()
+            else:
+                pack.entries.pop(page_name, None)
+
+        self.fallback.invalidate(page_name)
+
+    def stats(self) -> dict:
+        pack = self._pack
+        return {
+            "pack": str(self.path),
+            "generation": pack.generation if pack is not None else None,
+            "packed pages": len(pack.pages) if pack is not None else 0,
+            "hits": self.hits,
+            "remaps": self.remaps,
+            "fallback": self.fallback.stats(),
+        }
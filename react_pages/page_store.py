@@ -0,0 +1,381 @@
+import json
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+
+from react_pages.renderer import PageRenderer
+
+MANIFEST_FILENAME = "asset-manifest.json"
+# Written by "scripts/publish.js", on every publish of a build.
+GENERATIONS_FILENAME = ".react-pages-generations.json"
+
+_HEAD_END_RE = re.compile(r"</head\s*>", re.IGNORECASE)
+_BODY_END_RE = re.compile(r"</body\s*>", re.IGNORECASE)
+
+
+class PageEntry:
+    __slots__ = (
+        "html",
+        "mtime_ns",
+        "size",
+        "checked_at",
+        "manifest",
+        "inlined_css",
+        "preload_links",
+        "renderer",
+        "generation",
+    )
+
+    def __init__(
+        self,
+        html: str,
+        mtime_ns: int,
+        size: int,
+        checked_at: float,
+        manifest: dict = None,
+        inlined_css: bool = False,
+        generation: int = None,
+    ):
+        self.html = html
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.checked_at = checked_at
+        # The webpack asset manifest (production builds only)
+        self.manifest = manifest
+        self.inlined_css = inlined_css
+        # The generation the page was published in, if known
+        self.generation = generation
+        # computed lazily, by the consumers of store
+        self.preload_links = None
+        self.renderer = None
+
+    @property
+    def version(self) -> str:
+        """Changes whenever the page is re-built."""
+        return f"{self.mtime_ns:x}-{self.size:x}"
+
+    @property
+    def mtime(self) -> int:
+        return self.mtime_ns // 1_000_000_000
+
+    def make_renderer(self) -> PageRenderer:
+        return PageRenderer.from_html(self.html)
+
+
+class Generations:
+    """
+    The generation no. of a build dir, and the generation each page was published in.
+
+    Re-read only when the file changes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.generation = None
+        self.pages = {}
+
+        self._stat = None
+        self._lock = Lock()
+
+    def refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            with self._lock:
+                self.generation, self.pages, self._stat = None, {}, None
+            return
+
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if key == self._stat:
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if "generation" in data:
+            generation, pages = data["generation"], data["pages"]
+        else:
+            # from an older version, with only the generation of each page
+            generation, pages = max(data.values(), default=0), data
+
+        with self._lock:
+            self.generation, self.pages, self._stat = generation, pages, key
+
+
+class PageStore:
+    """
+    A process-wide, bounded LRU store of built pages,
+    keyed by page name.
+
+    Entries are re-validated at most once every `check_interval` seconds.
+    (`0` means on every access, `None` means never re-validate)
+
+    Builds published by `react-pages` record a generation no. for each page,
+    so entries are re-validated against a single (shared) generations file.
+    Otherwise, against the mtime of each page's `index.html`.
+    """
+
+    def __init__(
+        self,
+        build_dir: Path,
+        *,
+        max_size=128,
+        check_interval=1.0,
+        inline_css_max_size=None,
+        chunk_url=None,
+    ):
+        self.build_dir = build_dir
+        self.max_size = max_size
+        self.check_interval = check_interval
+        # inline the page's CSS into the HTML, if its smaller than this (bytes)
+        self.inline_css_max_size = inline_css_max_size
+        # resolves the (build dir relative) paths of shared chunks to urls
+        self.chunk_url = chunk_url
+
+        self.hits = 0
+        self.misses = 0
+
+        self.generations = Generations(build_dir / GENERATIONS_FILENAME)
+        self._generations_checked_at = None
+
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def index_html_path(self, page_name: str) -> Path:
+        return self.build_dir / page_name / "index.html"
+
+    def get(self, page_name: str) -> str:
+        """Return the built HTML for page."""
+
+        return self.get_entry(page_name).html
+
+    def get_entry(self, page_name: str) -> PageEntry:
+        """
+        Return the built page.
+
+        Raises FileNotFoundError, if the page hasn't been built yet.
+        """
+
+        now = monotonic()
+
+        with self._lock:
+            entry = self._entries.get(page_name)
+
+            if entry is not None and (
+                self.check_interval is None
+                or now - entry.checked_at < self.check_interval
+            ):
+                self._entries.move_to_end(page_name)
+                self.hits += 1
+                return entry
+
+        generation = self.page_generation(page_name, now)
+
+        if generation is not None:
+            if entry is not None and entry.generation == generation:
+                return self._revalidated(page_name, entry, now)
+        else:
+            stat = os.stat(self.index_html_path(page_name))
+
+            if (
+                entry is not None
+                and entry.mtime_ns == stat.st_mtime_ns
+                and entry.size == stat.st_size
+            ):
+                return self._revalidated(page_name, entry, now)
+
+        return self._load(page_name, now, generation)
+
+    def page_generation(self, page_name: str, now: float = None):
+        """
+        The generation page was last published in, or None.
+
+        The generations file is checked at most once every `check_interval` seconds,
+        for all the pages.
+        """
+
+        if now is None:
+            now = monotonic()
+
+        checked_at = self._generations_checked_at
+        if (
+            checked_at is None
+            or self.check_interval is None
+            or now - checked_at >= self.check_interval
+        ):
+            self.generations.refresh()
+            self._generations_checked_at = now
+
+        return self.generations.pages.get(page_name)
+
+    def _revalidated(self, page_name: str, entry: PageEntry, now: float) -> PageEntry:
+        with self._lock:
+            entry.checked_at = now
+            self._entries[page_name] = entry
+            self._entries.move_to_end(page_name)
+            self.hits += 1
+        return entry
+
+    def _load(self, page_name: str, now: float, generation: int = None) -> PageEntry:
+        # The page's dir is a symlink to its current version (see "scripts/publish.js"),
+        # which is resolved once, so that all of its files are from the same build.
+        path = self.index_html_path(page_name).parent.resolve() / "index.html"
+
+        with open(path, "r", encoding="utf-8") as f:
+            stat = os.fstat(f.fileno())
+            html = f.read()
+
+        manifest = load_manifest(path.parent)
+
+        if manifest is not None and "chunks" in manifest and self.chunk_url is not None:
+            html = insert_chunk_tags(html, manifest, self.chunk_url)
+
+        inlined_css = False
+        if manifest is not None and self.inline_css_max_size is not None:
+            html, inlined_css = inline_css(
+                html, path.parent, manifest, self.inline_css_max_size
+            )
+
+        entry = PageEntry(
+            html, stat.st_mtime_ns, stat.st_size, now, manifest, inlined_css, generation
+        )
+
+        with self._lock:
+            self.misses += 1
+            self._entries[page_name] = entry
+            self._entries.move_to_end(page_name)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def __contains__(self, page_name: str) -> bool:
+        return page_name in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def invalidate(self, page_name: str = None):
+        """Drop a single page, or every page if `page_name` is None."""
+
+        with self._lock:
+            if page_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(page_name, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pages": len(self._entries),
+                "max size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "generation": self.generations.generation,
+            }
+
+
+def load_manifest(page_build_dir: Path):
+    try:
+        with open(page_build_dir / MANIFEST_FILENAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def manifest_path_to_relative(path: str) -> str:
+    """
+    Convert a path from the manifest, to one relative to the page's build dir.
+
+    The manifest paths may be prefixed by the "public url" of the build.
+    (e.g. "./css/main.1234abcd.css", or "/static/my_page/css/main.1234abcd.css")
+    """
+
+    # on a path segment boundary (since a page may be named e.g. "abcss"),
+    # and the last one (since a page may be named e.g. "js")
+    start = max(
+        ("/" + path).rfind("/" + prefix) for prefix in ("css/", "js/", "media/")
+    )
+    if start >= 0:
+        return path[start:]
+
+    if path.startswith("./"):
+        return path[2:]
+    return path
+
+
+def insert_chunk_tags(html: str, manifest: dict, chunk_url) -> str:
+    """
+    Add the tags for the page's chunks (built with shared chunks), in load order.
+
+    The stylesheets go before "</head>", and the scripts before "</body>".
+    """
+
+    chunks = manifest["chunks"]
+
+    css_tags = "".join(
+        f'<link href="{chunk_url(manifest, path)}" rel="stylesheet">'
+        for path in chunks.get("css", ())
+    )
+    js_tags = "".join(
+        f'<script type="text/javascript" src="{chunk_url(manifest, path)}"></script>'
+        for path in chunks.get("js", ())
+    )
+
+    head_end = _HEAD_END_RE.search(html)
+    if head_end:
+        html = html[: head_end.start()] + css_tags + html[head_end.start() :]
+    else:
+        js_tags = css_tags + js_tags
+
+    body_end = None
+    for body_end in _BODY_END_RE.finditer(html):
+        pass
+    if body_end:
+        return html[: body_end.start()] + js_tags + html[body_end.start() :]
+    return html + js_tags
+
+
+def chunk_path(page_build_dir: Path, manifest: dict, path: str) -> Path:
+    """The file for a path from the manifest."""
+
+    if "chunks" in manifest:
+        # shared chunks are relative to the build dir
+        return page_build_dir.parent / path
+    return page_build_dir / manifest_path_to_relative(path)
+
+
+def inline_css(html: str, page_build_dir: Path, manifest: dict, max_size: int):
+    """Replace the page's stylesheet <link> with an inline <style>, if its small."""
+
+    css_path = manifest.get("main.css")
+    if css_path is None:
+        return html, False
+
+    css_file = chunk_path(page_build_dir, manifest, css_path)
+    try:
+        if css_file.stat().st_size > max_size:
+            return html, False
+        css = css_file.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return html, False
+
+    if "</style" in css.lower():
+        return html, False
+
+    # source map comments are meaningless, once inlined
+    css = re.sub(r"/\*# sourceMappingURL=.*?\*/", "", css).strip()
+
+    link_re = re.compile(
+        r"<link[^>]*href=[\"']?[^\"'>]*" + re.escape(css_file.name) + r"[^>]*>"
+    )
+    html, count = link_re.subn(lambda m: f"<style>{css}</style>", html, count=1)
+
+    return html, bool(count)
@@ -0,0 +1,125 @@
+import re
+
+_BODY_RE = re.compile(r"<body[^>]*>", re.IGNORECASE)
+_SCRIPT_RE = re.compile(r"<script[\s>]", re.IGNORECASE)
+_BODY_END_RE = re.compile(r"</body\s*>", re.IGNORECASE)
+# The (empty) element the page is rendered into, i.e. `<div id="root"></div>`
+_ROOT_RE = re.compile(rb"""<div\s+id=["']?root["']?\s*>(?=\s*</div>)""", re.IGNORECASE)
+
+# These only ever appear inside JSON strings,
+# where they may be safely replaced with unicode escapes.
+_UNSAFE_JSON_BYTES = (
+    (b"<", b"\\u003C"),
+    (b">", b"\\u003E"),
+    (b"&", b"\\u0026"),
+    ("\u2028".encode(), b"\\u2028"),
+    ("\u2029".encode(), b"\\u2029"),
+)
+
+
+def escape_json_for_script(data: bytes) -> bytes:
+    """
+    Make JSON safe to embed inside a <script> tag.
+
+    (e.g. A "</script>" inside a JSON string would otherwise end the script)
+    """
+
+    for unsafe, escaped in _UNSAFE_JSON_BYTES:
+        if unsafe in data:
+            data = data.replace(unsafe, escaped)
+
+    return data
+
+
+def find_injection_point(html: str) -> int:
+    """
+    Where the context <script> goes in the built page.
+
+    Right before the first <script> in the body (the webpack bundles),
+    or else, before "</body>", or else, at the very end.
+    """
+
+    body = _BODY_RE.search(html)
+    body_start = body.end() if body else 0
+
+    script = _SCRIPT_RE.search(html, body_start)
+    if script:
+        return script.start()
+
+    body_end = _BODY_END_RE.search(html, body_start)
+    if body_end:
+        return body_end.start()
+
+    return len(html)
+
+
+class PageRenderer:
+    """
+    A built page, pre-split into static byte segments,
+    around the point where the js context is injected.
+
+    Renders the page with a single `bytes.join()`,
+    without going through the django template engine.
+    """
+
+    __slots__ = ("head", "tail", "_root_index")
+
+    def __init__(self, head: bytes, tail: bytes):
+        self.head = head
+        self.tail = tail
+        self._root_index = None
+
+    @classmethod
+    def from_html(cls, html: str):
+        i = find_injection_point(html)
+        return cls(html[:i].encode(), html[i:].encode())
+
+    def render_context(self, js_vars: dict, preload=()) -> bytes:
+        """
+        Render the context <script> (and the preload links, if any).
+
+        `js_vars` maps variable names to their (JS) values, as bytes.
+        """
+
+        parts = []
+
+        for url in preload:
+            parts += (
+                b'<link rel="preload" href="',
+                url.encode(),
+                b'" as="fetch" crossorigin="anonymous">',
+            )
+
+        parts.append(b"<script>")
+        for name, value in js_vars.items():
+            if not name.isidentifier():
+                raise ValueError(
+                    f"React Pages: {repr(name)} is not a valid variable name."
+                )
+            parts += (b"const ", name.encode(), b" = ", value, b";")
+        parts.append(b"</script>")
+
+        return b"".join(parts)
+
+    def root_index(self) -> int:
+        """Where server-rendered HTML goes in the head (inside the root element), or -1."""
+
+        if self._root_index is None:
+            root = _ROOT_RE.search(bytes(self.head))
+            self._root_index = root.end() if root else -1
+
+        return self._root_index
+
+    def render(self, js_vars: dict, preload=(), root_html: bytes = None) -> bytes:
+        """Render the page, with server-rendered HTML for its root element, if any."""
+
+        context = self.render_context(js_vars, preload)
+
+        if root_html is not None:
+            i = self.root_index()
+            if i >= 0:
+                return b"".join(
+                    (self.head[:i], root_html, self.head[i:], context, self.tail)
+                )
+
+        return b"".join((self.head, context, self.tail))
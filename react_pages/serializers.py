@@ -0,0 +1,248 @@
+import datetime
+import decimal
+import json
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.duration import duration_iso_string
+from django.utils.functional import Promise
+from django.utils.timezone import is_aware
+
+
+class RawJSON:
+    """
+    Marks a value as already JSON serialized.
+
+    It is emitted as-is, without being parsed or re-serialized.
+
+        render_react_page("my_page", data=RawJSON(cached_json_str))
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        elif not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError(
+                f"React Pages: RawJSON expects str or bytes, not {type(data)}."
+            )
+
+        self.data = bytes(data)
+
+    def __bytes__(self):
+        return self.data
+
+    def __str__(self):
+        return self.data.decode()
+
+    def __repr__(self):
+        return f"RawJSON({self.data[:50]!r}{'...' if len(self.data) > 50 else ''})"
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and self.data == other.data
+
+    def __hash__(self):
+        return hash(self.data)
+
+
+# An alias, for those who prefer it
+Serialized = RawJSON
+
+
+def default(obj):
+    """
+    Encode the types that JSON doesn't know about.
+
+    Mirrors `django.core.serializers.json.DjangoJSONEncoder`,
+    so that every backend produces the same output.
+    """
+
+    if isinstance(obj, datetime.datetime):
+        r = obj.isoformat()
+        if obj.microsecond:
+            r = r[:23] + r[26:]
+        if r.endswith("+00:00"):
+            r = r[:-6] + "Z"
+        return r
+    elif isinstance(obj, datetime.date):
+        return obj.isoformat()
+    elif isinstance(obj, datetime.time):
+        if is_aware(obj):
+            raise ValueError("JSON can't represent timezone-aware times.")
+        r = obj.isoformat()
+        if obj.microsecond:
+            r = r[:12]
+        return r
+    elif isinstance(obj, datetime.timedelta):
+        return duration_iso_string(obj)
+    elif isinstance(obj, (decimal.Decimal, uuid.UUID, Promise)):
+        return str(obj)
+    elif isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONBackend:
+    """Serialize python objects to JSON bytes."""
+
+    name = None
+
+    def dumps(self, obj) -> bytes:
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.name!r}>"
+
+
+class StdlibBackend(JSONBackend):
+    name = "json"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(
+            ensure_ascii=False, separators=(",", ":"), default=default
+        )
+
+    def dumps(self, obj) -> bytes:
+        return self._encoder.encode(obj).encode()
+
+
+class OrjsonBackend(JSONBackend):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        # pass datetimes through `default()`, to match the other backends
+        self._option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj) -> bytes:
+        return self._orjson.dumps(obj, default=default, option=self._option)
+
+
+BACKENDS = {
+    OrjsonBackend.name: OrjsonBackend,
+    StdlibBackend.name: StdlibBackend,
+}
+
+
+def get_backend(name="auto") -> JSONBackend:
+    """
+    Get a backend by name.
+
+    "auto" picks the fastest one available (orjson > json).
+    """
+
+    if name == "auto":
+        for backend_cls in BACKENDS.values():
+            try:
+                return backend_cls()
+            except ImportError:
+                continue
+
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"React Pages: Unknown JSON backend {repr(name)}. "
+            f"Choose one of {['auto', *BACKENDS]}."
+        )
+
+    return backend_cls()
+
+
+@lru_cache(maxsize=None)
+def get_default_backend() -> JSONBackend:
+    """The backend chosen by `settings.REACT_PAGES_JSON_BACKEND`."""
+
+    return get_backend(getattr(settings, "REACT_PAGES_JSON_BACKEND", "auto"))
+
+
+def dumps(obj) -> bytes:
+    if isinstance(obj, RawJSON):
+        return obj.data
+
+    return get_default_backend().dumps(obj)
+
+
+class QuerySetValues:
+    """
+    Serialize a QuerySet straight from `.values()` / `.values_list()`,
+    without building model instances.
+
+    Rows are fetched with `.iterator(chunk_size=...)`,
+    and encoded chunk-by-chunk into a single buffer.
+
+        render_react_page("my_page", books=QuerySetValues(books, ["id", "title"]))
+
+    By default, this produces a list of objects -
+
+        [{"id": 1, "title": "..."}, ...]
+
+    With `columnar=True`, it produces a more compact -
+
+        {"fields": ["id", "title"], "rows": [[1, "..."], ...]}
+    """
+
+    def __init__(self, queryset, fields=(), *, columnar=False, chunk_size=2000):
+        self.queryset = queryset
+        self.fields = tuple(fields)
+        self.columnar = columnar
+        self.chunk_size = chunk_size
+
+    def serialize(self, backend: JSONBackend = None) -> bytes:
+        backend = backend or get_default_backend()
+
+        if self.columnar:
+            rows_qs = self.queryset.values_list(*self.fields)
+            if self.fields:
+                # the rows follow the order the fields were asked for
+                field_names = list(self.fields)
+            else:
+                query = rows_qs.query
+                field_names = [
+                    *query.extra_select,
+                    *query.values_select,
+                    *query.annotation_select,
+                ]
+
+            buffer = bytearray(b'{"fields":')
+            buffer += backend.dumps(field_names)
+            buffer += b',"rows":'
+            self._write_rows(buffer, backend, rows_qs, convert=list)
+            buffer += b"}"
+        else:
+            rows_qs = self.queryset.values(*self.fields)
+
+            buffer = bytearray()
+            self._write_rows(buffer, backend, rows_qs)
+
+        return bytes(buffer)
+
+    def _write_rows(self, buffer, backend, rows_qs, convert=None):
+        buffer += b"["
+        chunk = []
+        first = True
+
+        for row in rows_qs.iterator(chunk_size=self.chunk_size):
+            chunk.append(convert(row) if convert else row)
+
+            if len(chunk) >= self.chunk_size:
+                first = self._write_chunk(buffer, backend, chunk, first)
+                chunk.clear()
+
+        if chunk:
+            self._write_chunk(buffer, backend, chunk, first)
+
+        buffer += b"]"
+
+    @staticmethod
+    def _write_chunk(buffer, backend, chunk, first):
+        if not first:
+            buffer += b","
+        # strip the enclosing "[" and "]"
+        buffer += memoryview(backend.dumps(chunk))[1:-1]
+        return False
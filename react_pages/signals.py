@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent after a react page is rendered by a view.
+#
+# sender - the view class
+# request - the request
+# page_name - the name of page
+# timings - a `react_pages.timing.RenderTimings`,
+#   with per-phase `durations` (milliseconds) and payload `sizes` (bytes)
+page_rendered = Signal()
@@ -0,0 +1,381 @@
+"""
+Optional server-side rendering, with a pool of Node.js workers.
+
+Pages that have a `server.js` (exporting their root component)
+get a server bundle alongside their build. (see "config/webpack.config.server.js")
+With `REACT_PAGES_SSR = True`, that bundle renders the page's root element,
+so the browser gets the HTML right away, and only has to hydrate it.
+
+Each worker is a long-lived `node scripts/ssr_worker.js` process,
+talking length-prefixed JSON over its stdin / stdout.
+Renders that fail, or take longer than `REACT_PAGES_SSR_TIMEOUT`,
+fall back to (the usual) client-side rendering.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import select
+import struct
+import subprocess
+from collections import OrderedDict
+from pathlib import Path
+from queue import Empty, LifoQueue
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from react_pages.conf import get_build_dir
+from react_pages.data_store import DeferredPromise
+
+logger = logging.getLogger("react_pages")
+
+WORKER_SCRIPT = Path(__file__).parent / "nodejs" / "scripts" / "ssr_worker.js"
+# Relative to the page's build dir. (see "config/webpack.config.server.js")
+SERVER_BUNDLE = Path(".ssr") / "server.js"
+
+_HEADER = struct.Struct(">I")
+# The (empty) element the page is rendered into, i.e. `<div id="root"></div>`
+_ROOT_RE = re.compile(r"""<div\s+id=["']?root["']?\s*>(?=\s*</div>)""", re.IGNORECASE)
+
+
+class SSRError(Exception):
+    pass
+
+
+class SSRTimeout(SSRError):
+    pass
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "REACT_PAGES_SSR", False)
+
+
+class NodeRenderer:
+    """A single `ssr_worker.js` process."""
+
+    def __init__(self):
+        node = getattr(settings, "REACT_PAGES_NODE", "node")
+
+        try:
+            self.process = subprocess.Popen(
+                [node, str(WORKER_SCRIPT)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                # the pages' logs
+                stderr=None,
+            )
+        except OSError as e:
+            # e.g. node isn't installed, or too many open files
+            raise SSRError(
+                f"React Pages: Couldn't start the SSR worker ({node!r}) - {e!r}"
+            )
+        # so that writing to a stuck worker can time out as well
+        os.set_blocking(self.process.stdin.fileno(), False)
+        self.renders = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def render(self, payload: bytes, timeout: float) -> str:
+        """
+        Render a (JSON) request, returning the HTML.
+
+        The worker is killed on failure / timeout, since its replies would be out-of-sync.
+        """
+
+        deadline = monotonic() + timeout
+        self.renders += 1
+
+        try:
+            self._write(_HEADER.pack(len(payload)) + payload, deadline)
+
+            (length,) = _HEADER.unpack(self._read(_HEADER.size, deadline))
+            response = json.loads(self._read(length, deadline))
+        except (OSError, ValueError) as e:
+            self.kill()
+            raise SSRError(f"React Pages: The SSR worker failed - {e!r}")
+        except SSRTimeout:
+            self.kill()
+            raise
+
+        if "error" in response:
+            raise SSRError(response["error"])
+
+        return response["html"]
+
+    def _write(self, data: bytes, deadline: float):
+        fd = self.process.stdin.fileno()
+        data = memoryview(data)
+
+        while data:
+            remaining = deadline - monotonic()
+            if remaining <= 0 or not select.select([], [fd], [], remaining)[1]:
+                raise SSRTimeout("React Pages: Server-side rendering timed out.")
+
+            try:
+                data = data[os.write(fd, data) :]
+            except BlockingIOError:
+                continue
+
+    def _read(self, size: int, deadline: float) -> bytes:
+        fd = self.process.stdout.fileno()
+        chunks = []
+
+        while size > 0:
+            remaining = deadline - monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise SSRTimeout("React Pages: Server-side rendering timed out.")
+
+            chunk = os.read(fd, size)
+            if not chunk:
+                raise OSError("The SSR worker exited.")
+
+            chunks.append(chunk)
+            size -= len(chunk)
+
+        return b"".join(chunks)
+
+    def close(self):
+        if self.process.poll() is not None:
+            return
+
+        try:
+            # the worker exits, when its stdin is closed
+            self.process.stdin.close()
+            self.process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+
+class SSRPool:
+    """
+    A bounded pool of Node workers, started on demand.
+
+    Workers are recycled after `max_renders` renders (to bound leaks in page code),
+    and replaced if they crash or time out.
+    """
+
+    def __init__(self, size=2, *, timeout=1.0, max_renders=1000):
+        self.size = size
+        self.timeout = timeout
+        self.max_renders = max_renders
+
+        self._idle = LifoQueue()
+        self._slots = BoundedSemaphore(size)
+
+    def render(self, payload: bytes) -> str:
+        # waiting for a busy worker counts against the timeout, too
+        deadline = monotonic() + self.timeout
+        if not self._slots.acquire(timeout=self.timeout):
+            raise SSRTimeout("React Pages: All the SSR workers are busy.")
+
+        try:
+            worker = self._get_worker()
+            try:
+                return worker.render(payload, max(deadline - monotonic(), 0))
+            finally:
+                self._put_worker(worker)
+        finally:
+            self._slots.release()
+
+    def _get_worker(self) -> NodeRenderer:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except Empty:
+                return NodeRenderer()
+
+            if worker.alive:
+                return worker
+
+    def _put_worker(self, worker: NodeRenderer):
+        if not worker.alive:
+            return
+
+        if self.max_renders is not None and worker.renders >= self.max_renders:
+            worker.close()
+        else:
+            self._idle.put(worker)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+
+
+class RenderCache:
+    """
+    A bounded LRU cache of rendered HTML,
+    keyed by the page's build and (a hash of) its js context.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+            return html
+
+    def set(self, key, html: bytes):
+        if not self.max_size:
+            return
+
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_pool = None
+_cache = None
+# page name -> (build, server bundle)
+_bundles = {}
+_lock = Lock()
+
+
+def get_pool() -> SSRPool:
+    global _pool
+
+    with _lock:
+        if _pool is None:
+            _pool = SSRPool(
+                getattr(settings, "REACT_PAGES_SSR_WORKERS", 2),
+                timeout=getattr(settings, "REACT_PAGES_SSR_TIMEOUT", 1.0),
+                max_renders=getattr(settings, "REACT_PAGES_SSR_MAX_RENDERS", 1000),
+            )
+        return _pool
+
+
+def get_cache() -> RenderCache:
+    global _cache
+
+    with _lock:
+        if _cache is None:
+            _cache = RenderCache(getattr(settings, "REACT_PAGES_SSR_CACHE_SIZE", 256))
+        return _cache
+
+
+def get_bundle_path(page_name: str, build):
+    """
+    The server bundle of the page's current build, or None.
+
+    Looked up once per `build` of the page (its generation / version),
+    rather than on every render.
+    """
+
+    cached = _bundles.get(page_name)
+    if cached is not None and cached[0] == build:
+        return cached[1]
+
+    # resolved, so that a later build (at a new path) is loaded afresh
+    bundle = (get_build_dir() / page_name).resolve() / SERVER_BUNDLE
+    if not bundle.is_file():
+        bundle = None
+
+    _bundles[page_name] = (build, bundle)
+    return bundle
+
+
+def make_payload(bundle: Path, js_vars: dict) -> bytes:
+    """The request for a worker, from the (already serialized) js vars."""
+
+    context = b",".join(
+        json.dumps(key).encode() + b":" + value
+        for key, value in js_vars.items()
+        # only Promises in the browser
+        if not isinstance(value, DeferredPromise)
+    )
+    return b'{"bundle":%s,"context":{%s}}' % (json.dumps(str(bundle)).encode(), context)
+
+
+def render_root(page_name: str, entry, js_vars: dict):
+    """
+    Render the page's root element (bytes),
+    or None, to fall back to client-side rendering.
+    """
+
+    build = entry.generation if entry.generation is not None else entry.version
+    context_hash = hashlib.sha1(
+        b"\0".join(key.encode() + b"=" + value for key, value in js_vars.items())
+    ).digest()
+    key = (page_name, build, context_hash)
+
+    cache = get_cache()
+    html = cache.get(key)
+    if html is not None:
+        return html
+
+    bundle = get_bundle_path(page_name, build)
+    if bundle is None:
+        return None
+
+    try:
+        html = get_pool().render(make_payload(bundle, js_vars)).encode()
+    except SSRError as e:
+        logger.warning(
+            "React Pages: Server-side rendering of %r failed, "
+            "falling back to client-side rendering - %s",
+            page_name,
+            e,
+        )
+        return None
+
+    cache.set(key, html)
+    return html
+
+
+def insert_root_html(html: str, root_html: bytes) -> str:
+    """Insert server-rendered HTML into the page's root element, if any."""
+
+    root = _ROOT_RE.search(html)
+    if root is None:
+        return html
+
+    return html[: root.end()] + root_html.decode() + html[root.end() :]
+
+
+def close():
+    """Stop the workers, and drop the rendered pages."""
+
+    global _pool, _cache
+
+    with _lock:
+        pool, _pool, _cache = _pool, None, None
+        _bundles.clear()
+
+    if pool is not None:
+        pool.close()
+
+
+atexit.register(close)
+
+
+@receiver(setting_changed)
+def reset(setting, **kwargs):
+    if setting.startswith("REACT_PAGES_"):
+        close()
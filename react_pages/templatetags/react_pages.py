@@ -1,77 +1,253 @@
-from pathlib import Path
+import json
 
 from django import template
 from django.conf import settings
 from django.core import serializers
-from django.core.exceptions import ImproperlyConfigured
 from django.core.serializers import serialize
 from django.db.models import Model, QuerySet
+from django.templatetags.static import static
 
-try:
-    import ujson as json
-except ImportError:
-    import json
+from react_pages import (
+    checks,
+    data_store,
+    live_reload,
+    serializers as rp_serializers,
+    ssr,
+    timing,
+)
+from react_pages.conf import (
+    get_build_dir,
+    get_chunk_url,
+    get_page_store,
+    get_project_dir,
+)
+from react_pages.data_store import Deferred, DeferredPromise
+from react_pages.page_store import PageEntry, manifest_path_to_relative
+from react_pages.renderer import PageRenderer, escape_json_for_script
+from react_pages.serializers import RawJSON, QuerySetValues
 
 register = template.Library()
 
-try:
-    project_dir = Path(settings.REACT_PAGES_PROJECT_DIR).resolve()
-except AttributeError:
-    raise ImproperlyConfigured(
-        'React Pages: Please specify "REACT_PAGES_PROJECT_DIR" ' "in your settings.py!"
+
+def page_not_found(page_name):
+    return ValueError(
+        f"React Pages: The page {repr(page_name)} "
+        f"doesn't exist! "
+        f"Run react-pages page {repr(page_name)} "
+        f"from {repr(get_project_dir())} to create this page"
     )
 
 
+def get_page(page_name) -> PageEntry:
+    """
+    Return the built page, from the page store.
+
+    The (slower) existence check for the page is only done
+    when the page isn't already in the store.
+    """
+
+    page_store = get_page_store()
+
+    if page_name not in page_store and not (get_project_dir() / page_name).exists():
+        raise page_not_found(page_name)
+
+    try:
+        return page_store.get_entry(page_name)
+    except FileNotFoundError:
+        raise ValueError(
+            f"React Pages: The page {repr(page_name)} hasn't been built yet! "
+            f"Run react-pages develop "
+            f"from {repr(get_project_dir())} to build this page"
+        )
+
+
+def get_page_html(page_name):
+    if not live_reload.is_enabled():
+        return get_page(page_name).html
+
+    generation = live_reload.sync_generation(page_name)
+    html = get_page(page_name).html
+
+    return live_reload.insert_script(html, page_name, generation)
+
+
+def warm_pages():
+    """
+    Load (and pre-split) every page found in the build dir.
+
+    Returns the no. of pages, and their total size in bytes.
+    """
+
+    page_store = get_page_store()
+    count = size = 0
+
+    for index_html_path in sorted(get_build_dir().glob("*/index.html")):
+        page_name = index_html_path.parent.name
+        entry = page_store.get_entry(page_name)
+        get_page_renderer(page_name)
+
+        count += 1
+        size += entry.size
+
+    return count, size
+
+
+def get_asset_url(page_name, manifest_path):
+    if manifest_path.startswith(("/", "http://", "https://")):
+        return manifest_path
+
+    return static(f"{page_name}/{manifest_path_to_relative(manifest_path)}")
+
+
+def get_preload_links(page_name):
+    """
+    Return the `Link` header values, that preload the page's entry JS & CSS.
+
+    Uses the webpack asset manifest (production builds only).
+    """
+
+    entry = get_page(page_name)
+
+    if entry.preload_links is None:
+        preload_links = []
+        manifest = entry.manifest or {}
+
+        if "chunks" in manifest:
+            # built with shared chunks, so preload all of them, in load order
+            chunks = manifest["chunks"]
+            if not entry.inlined_css:
+                for path in chunks.get("css", ()):
+                    url = get_chunk_url(manifest, path)
+                    preload_links.append(f"<{url}>; rel=preload; as=style")
+            for path in chunks.get("js", ()):
+                url = get_chunk_url(manifest, path)
+                preload_links.append(f"<{url}>; rel=preload; as=script")
+        else:
+            if "main.css" in manifest and not entry.inlined_css:
+                url = get_asset_url(page_name, manifest["main.css"])
+                preload_links.append(f"<{url}>; rel=preload; as=style")
+            if "main.js" in manifest:
+                url = get_asset_url(page_name, manifest["main.js"])
+                preload_links.append(f"<{url}>; rel=preload; as=script")
+
+        entry.preload_links = preload_links
+
+    return entry.preload_links
+
+
 def serialize_django_model_instance(obj):
     return serialize("json", [obj], ensure_ascii=False)[1:-1]
 
 
+def serialize_js_value(page_name, key, val) -> bytes:
+    # Already JSON serialized, we don't bother.
+    if isinstance(val, RawJSON):
+        return val.data
+    if isinstance(val, QuerySetValues):
+        return val.serialize()
+    # If its a django model / QuerySet, we know how to serialize that.
+    if isinstance(val, QuerySet):
+        return serializers.serialize("json", val).encode()
+    if isinstance(val, Model):
+        return serialize_django_model_instance(val).encode()
+    # Legacy behaviour, strings that parse as JSON are emitted as-is.
+    if isinstance(val, str) and getattr(
+        settings, "REACT_PAGES_DETECT_SERIALIZED_JSON", False
+    ):
+        try:
+            json.loads(val)
+        except ValueError:
+            pass
+        else:
+            return val.encode()
+
+    try:
+        return rp_serializers.dumps(val)
+    except (TypeError, ValueError) as e:
+        raise TypeError(
+            f"React Pages: Couldn't serialize the kwarg "
+            f"{repr(key)}, having value {repr(val)}.\n"
+            f"Either manually serialize it (and wrap it in `RawJSON`), "
+            f"or provide a JSON serializable value.\n"
+            f"While rendering page "
+            f"{repr(page_name)} - {repr(e)}"
+        )
+
+
+def serialize_js_context(page_name, js_context):
+    """
+    Serialize js context into JS values (bytes), safe to embed in a <script>.
+
+    Also returns the urls of the values delivered out-of-band, for preloading.
+    """
+
+    threshold = data_store.get_threshold()
+    js_vars = {}
+    preload = []
+
+    for key, val in js_context.items():
+        deferred = isinstance(val, Deferred)
+        if deferred:
+            checks.warn_deferred_data_cache()
+            val = val.value
+
+        with timing.phase(f"json.{key}"):
+            data = serialize_js_value(page_name, key, val)
+        timing.add_size(f"json.{key}", len(data))
+
+        if deferred or (threshold is not None and len(data) > threshold):
+            url = data_store.get_url(data_store.store(data))
+            preload.append(url)
+            js_vars[key] = DeferredPromise(
+                (
+                    f"fetch({json.dumps(url)})"
+                    ".then(function (response) { return response.json(); })"
+                ).encode()
+            )
+        else:
+            js_vars[key] = escape_json_for_script(data)
+
+    return js_vars, preload
+
+
+def get_page_renderer(page_name) -> PageRenderer:
+    generation = None
+    if live_reload.is_enabled():
+        generation = live_reload.sync_generation(page_name)
+
+    entry = get_page(page_name)
+
+    if entry.renderer is None:
+        if generation is not None:
+            html = live_reload.insert_script(entry.html, page_name, generation)
+            entry.renderer = PageRenderer.from_html(html)
+        else:
+            entry.renderer = entry.make_renderer()
+
+    return entry.renderer
+
+
 @register.inclusion_tag("react_pages_include_tag.html")
 def render_react_page(page_name, **js_context):
     # https://stackoverflow.com/questions/38473545/how-to-get-string-from-a-django-utils-safestring-safetext
     page_name += ""
 
-    page_dir = project_dir / page_name
-
     if not page_name:
         raise ValueError("React Pages: Page name cant't be empty!")
 
-    if page_dir.exists():
-        index_html_path = project_dir / "build" / page_name / "index.html"
-
-        with open(index_html_path, "r") as f:
-            html_str = f.read()
-
-        for key, val in js_context.items():
-            # If already JSON serialized, we don't bother.
-            try:
-                json.loads(val)
-            except (ValueError, TypeError):
-                # If its a django model / QuerySet, we know how to serialize that.
-                if isinstance(val, QuerySet):
-                    js_context[key] = serializers.serialize("json", val)
-                elif isinstance(val, Model):
-                    js_context[key] = serialize_django_model_instance(val)
-                else:  # fallback to json.dumps()
-                    try:
-                        js_context[key] = json.dumps(val)
-                    except TypeError as e:
-                        raise TypeError(
-                            f"React Pages: Couldn't serialize the kwarg "
-                            f"{repr(key)}, having value {repr(js_context[key])}.\n"
-                            f"Either manually serialize it, "
-                            f"or provide a JSON serializable value.\n"
-                            f"While rendering page "
-                            f"{repr(page_name)} - {repr(e)}"
-                        )
-            else:
-                pass
-
-        return {"html": html_str, "vars": js_context}
-    else:
-        raise ValueError(
-            f"React Pages: The page {repr(page_name)} "
-            f"doesn't exist! "
-            f"Run react-pages page {repr(page_name)} "
-            f"from {repr(project_dir)} to create this page"
-        )
+    with timing.phase("page"):
+        html_str = get_page_html(page_name)
+
+    js_vars, preload = serialize_js_context(page_name, js_context)
+
+    if ssr.is_enabled():
+        with timing.phase("ssr"):
+            root_html = ssr.render_root(page_name, get_page(page_name), js_vars)
+        if root_html is not None:
+            html_str = ssr.insert_root_html(html_str, root_html)
+
+    return {
+        "html": html_str,
+        "vars": {key: value.decode() for key, value in js_vars.items()},
+        "preload": preload,
+    }
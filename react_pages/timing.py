@@ -0,0 +1,110 @@
+import cProfile
+import io
+import pstats
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+# The timings of the page currently being rendered, if any.
+current_timings = ContextVar("react_pages_timings", default=None)
+
+
+class RenderTimings:
+    """
+    Per-phase durations (milliseconds) and payload sizes (bytes),
+    for the rendering of a single page.
+
+    Phases -
+        "context" - gathering the js context (incl. context providers)
+        "form" - form serialization
+        "json.<key>" - JSON encoding of a single js context variable
+        "page" - loading the built page HTML
+        "ssr" - server-side rendering of the page (see `react_pages.ssr`)
+        "template" - rendering the template
+        "total" - all of the above
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.sizes = {}
+        self.profiler = None
+
+        self._start = perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        s = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_duration(name, (perf_counter() - s) * 1000)
+
+    def add_duration(self, name, ms):
+        self.durations[name] = self.durations.get(name, 0) + ms
+
+    def add_size(self, name, size):
+        self.sizes[name] = self.sizes.get(name, 0) + size
+
+    def finish(self):
+        self.durations["total"] = (perf_counter() - self._start) * 1000
+
+    def as_server_timing(self) -> str:
+        """Format as the value of a `Server-Timing` header."""
+
+        metrics = []
+        for name, ms in self.durations.items():
+            metric = f"{name};dur={ms:.3f}"
+            if name in self.sizes:
+                metric += f';desc="{self.sizes[name]} B"'
+            metrics.append(metric)
+
+        for name, size in self.sizes.items():
+            if name not in self.durations:
+                metrics.append(f'{name};desc="{size} B"')
+
+        return ", ".join(metrics)
+
+    def start_profiler(self):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop_profiler(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def profiler_stats(self, sort_by="cumulative", limit=50) -> str:
+        f = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=f)
+        stats.sort_stats(sort_by).print_stats(limit)
+        return f.getvalue()
+
+    def __repr__(self):
+        return f"<RenderTimings {self.as_server_timing()}>"
+
+
+@contextmanager
+def track_timings(timings: RenderTimings):
+    token = current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        current_timings.reset(token)
+        timings.finish()
+
+
+@contextmanager
+def phase(name):
+    """Time a phase of the page currently being rendered, if any."""
+
+    timings = current_timings.get()
+    if timings is None:
+        yield
+    else:
+        with timings.phase(name):
+            yield
+
+
+def add_size(name, size):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add_size(name, size)
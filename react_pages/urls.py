@@ -0,0 +1,11 @@
+from django.urls import path
+
+from react_pages.live_reload import live_reload_view
+from react_pages.views import data_view
+
+app_name = "react_pages"
+
+urlpatterns = [
+    path("data/<slug:digest>.json", data_view, name="data"),
+    path("live-reload/", live_reload_view, name="live_reload"),
+]
@@ -1,123 +1,740 @@
-from time import time
-
-from django.forms import Form
+import hashlib
+import weakref
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.forms import BoundField, Form
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.middleware import csrf
 from django.shortcuts import render
 from django.template.defaulttags import CsrfTokenNode
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils import translation
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
 from django.views.generic import View, FormView
 
-from react_pages.templatetags.react_pages import render_react_page, project_dir
+from react_pages import data_store, ssr, timing
+from react_pages.asgi import SEND_EARLY_HINTS
+from react_pages.context_providers import agather_context, gather_context
+from react_pages.signals import page_rendered
+from react_pages.templatetags.react_pages import (
+    get_page,
+    get_page_renderer,
+    get_preload_links,
+    render_react_page,
+    serialize_js_context,
+)
+from react_pages.timing import RenderTimings, track_timings
 
 
 class ReactPageView(View):
     page_name = None
     extra_js_context = {}
 
+    # The default timeout (seconds) for context providers.
+    # See `react_pages.context_providers.context_provider()`
+    context_provider_timeout = None
+
+    # Respond with a "304 Not Modified", if the page is unchanged.
+    # The ETag is derived from `get_etag()` / `get_last_modified()` if defined
+    # (which skips building the js context altogether),
+    # or else, from the serialized js context.
+    conditional_response = False
+
+    # Send `Link: rel=preload` headers for the page's JS and CSS,
+    # (and "103 Early Hints", on ASGI servers that support it)
+    # using the webpack asset manifest.
+    preload_assets = True
+
+    # Render the page through this django template, instead of the
+    # (much faster) pre-compiled renderer. e.g. "react_pages_include_tag.html"
+    page_template_name = None
+
+    # Stream the page, flushing its head (with the CSS / JS links)
+    # to the browser, before gathering the js context.
+    # (always rendered client-side, even with `REACT_PAGES_SSR`)
+    streaming = False
+
+    _etag = None
+    _last_modified = None
+
     def get_js_context(self):
         return {}
 
-    def get(self, *args, **kwargs):
+    def get_etag(self):
+        """A cheap, user-supplied ETag for the js context (str), or None."""
+        return None
+
+    def get_last_modified(self):
+        """A cheap, user-supplied last modified datetime for the js context, or None."""
+        return None
+
+    def get_preload_links(self):
+        if not self.preload_assets:
+            return []
+        return get_preload_links(self.page_name)
+
+    def make_etag(self, *parts):
+        """A strong ETag, derived from the build version of page, and parts."""
+
+        h = hashlib.sha1(get_page(self.page_name).version.encode())
+        for part in parts:
+            h.update(b"\0")
+            h.update(part.encode() if isinstance(part, str) else part)
+
+        return quote_etag(h.hexdigest())
+
+    def check_conditional_response(self):
+        """
+        Return a "304 Not Modified" (or "412 Precondition Failed") response,
+        using the user-supplied ETag / last modified time, if any.
+        """
+
+        self._etag = self._last_modified = None
+
+        if not self.conditional_response:
+            return None
+
+        etag = self.get_etag()
+        if etag is not None:
+            self._etag = self.make_etag(str(etag))
+
+        last_modified = self.get_last_modified()
+        if last_modified is not None:
+            self._last_modified = max(
+                int(last_modified.timestamp()), get_page(self.page_name).mtime
+            )
+
+        if self._etag is None and self._last_modified is None:
+            return None
+
+        return get_conditional_response(
+            self.request, etag=self._etag, last_modified=self._last_modified
+        )
+
+    def check_page_name(self):
         if not self.page_name:
             raise ValueError(
                 "React Pages: "
                 f'Did you forget to specify a "page_name" '
                 f"in {self.__class__}?"
             )
-        else:
-            page_dir = project_dir / self.page_name
 
-            if page_dir.exists():
-                js_context = self.get_js_context()
+    def merge_js_context(self, js_context, provided_js_context):
+        if type(js_context) != dict:
+            raise ValueError('"get_js_context()" must return a dict!')
+
+        js_context.update(provided_js_context)
+        js_context.update(self.extra_js_context)
 
-                if type(js_context) != dict:
-                    raise ValueError('"get_js_context()" must return a dict!')
+        return js_context
 
-                js_context.update(self.extra_js_context)
+    def render_page(self, js_context):
+        if self.page_template_name is not None:
+            return self.render_page_template(js_context)
 
-                s = time()
-                context = render_react_page(page_name=self.page_name, **js_context)
-                print((time() - s) * 1000)
+        with timing.phase("page"):
+            renderer = get_page_renderer(self.page_name)
 
-                return render(
-                    template_name="react_pages_include_tag.html",
-                    context=context,
-                    request=self.request,
+        js_vars, preload = serialize_js_context(self.page_name, js_context)
+
+        response = self.check_context_conditional_response(js_vars)
+        if response is not None:
+            return response
+
+        root_html = None
+        if ssr.is_enabled():
+            with timing.phase("ssr"):
+                root_html = ssr.render_root(
+                    self.page_name, get_page(self.page_name), js_vars
                 )
-            else:
-                raise ValueError(
-                    f"React Pages: The page {repr(self.page_name)} "
-                    f"doesn't exist! "
-                    f"Run react-pages page {repr(self.page_name)} "
-                    f"from {repr(project_dir)} to create this page"
+
+        with timing.phase("template"):
+            response = HttpResponse(renderer.render(js_vars, preload, root_html))
+
+        return self.set_conditional_headers(response)
+
+    def render_page_template(self, js_context):
+        """Render the page through the django template `page_template_name`."""
+
+        context = render_react_page(page_name=self.page_name, **js_context)
+
+        response = self.check_context_conditional_response(
+            {key: value.encode() for key, value in context["vars"].items()}
+        )
+        if response is not None:
+            return response
+
+        with timing.phase("template"):
+            response = render(
+                template_name=self.page_template_name,
+                context=context,
+                request=self.request,
+            )
+
+        return self.set_conditional_headers(response)
+
+    def check_context_conditional_response(self, js_vars):
+        """
+        Return a "304 Not Modified" response, using an ETag derived from the js vars,
+        if there's no user-supplied ETag / last modified time.
+        """
+
+        if (
+            not self.conditional_response
+            or self._etag is not None
+            or self._last_modified is not None
+        ):
+            return None
+
+        self._etag = self.make_etag(
+            *(key.encode() + b"=" + value for key, value in js_vars.items())
+        )
+        return get_conditional_response(self.request, etag=self._etag)
+
+    def set_conditional_headers(self, response):
+        if self._etag is not None:
+            response["ETag"] = self._etag
+        if self._last_modified is not None:
+            response["Last-Modified"] = http_date(self._last_modified)
+
+        return response
+
+    def should_profile(self):
+        param = getattr(settings, "REACT_PAGES_PROFILER_PARAM", None)
+        if not param or param not in self.request.GET:
+            return False
+
+        user = getattr(self.request, "user", None)
+        return settings.DEBUG or getattr(user, "is_staff", False)
+
+    @contextmanager
+    def instrument(self):
+        timings = RenderTimings()
+
+        if self.should_profile():
+            timings.start_profiler()
+
+        try:
+            with track_timings(timings):
+                yield timings
+        finally:
+            timings.stop_profiler()
+
+    def send_page_rendered(self, timings):
+        page_rendered.send(
+            sender=self.__class__,
+            request=self.request,
+            page_name=self.page_name,
+            timings=timings,
+        )
+
+    def add_preload_headers(self, response):
+        links = self.get_preload_links()
+        if links:
+            if response.has_header("Link"):
+                links = [response["Link"], *links]
+            response["Link"] = ", ".join(links)
+
+    def finish_response(self, response, timings):
+        timings.add_size("html", len(response.content))
+
+        self.send_page_rendered(timings)
+
+        if timings.profiler is not None:
+            return HttpResponse(
+                timings.profiler_stats(), content_type="text/plain; charset=utf-8"
+            )
+
+        self.add_preload_headers(response)
+
+        if getattr(settings, "REACT_PAGES_SERVER_TIMING", settings.DEBUG):
+            response["Server-Timing"] = timings.as_server_timing()
+
+        return response
+
+    def should_stream(self):
+        # profiling needs the whole page rendered, before responding
+        return self.streaming and not self.should_profile()
+
+    def start_streaming_response(self, stream):
+        response = StreamingHttpResponse(stream)
+        self.add_preload_headers(response)
+        return self.set_conditional_headers(response)
+
+    def stream_page(self):
+        """
+        Stream the page, flushing its head before gathering any context.
+
+        Since the headers are sent right away, conditional responses only
+        work with a user-supplied `get_etag()` / `get_last_modified()`,
+        and the timings are only available to the `page_rendered` signal.
+        """
+
+        response = self.check_conditional_response()
+        if response is not None:
+            return response
+
+        renderer = get_page_renderer(self.page_name)
+        timings = RenderTimings()
+
+        def stream():
+            yield renderer.head
+
+            with track_timings(timings):
+                with timings.phase("context"):
+                    js_context = self.merge_js_context(
+                        *gather_context(self, self.get_js_context)
+                    )
+                chunk = self.render_streamed_context(renderer, js_context)
+
+            yield chunk
+
+            timings.add_size("html", len(renderer.head) + len(chunk))
+            self.send_page_rendered(timings)
+
+        return self.start_streaming_response(stream())
+
+    def render_streamed_context(self, renderer, js_context):
+        js_vars, preload = serialize_js_context(self.page_name, js_context)
+
+        with timing.phase("template"):
+            return renderer.render_context(js_vars, preload) + renderer.tail
+
+    def get(self, *args, **kwargs):
+        self.check_page_name()
+
+        if self.should_stream():
+            return self.stream_page()
+
+        with self.instrument() as timings:
+            response = self.check_conditional_response()
+            if response is None:
+                with timings.phase("context"):
+                    js_context = self.merge_js_context(
+                        *gather_context(self, self.get_js_context)
+                    )
+
+                response = self.render_page(js_context)
+
+        return self.finish_response(response, timings)
+
+
+class AsyncReactPageView(ReactPageView):
+    """
+    An async version of `ReactPageView`, for use under ASGI.
+
+    `get_js_context()` must be an async function,
+    and the context providers run concurrently on the event loop.
+    The blocking work (reading, serializing & rendering the page) runs in a thread.
+    """
+
+    _should_profile = False
+
+    async def get_js_context(self):
+        return {}
+
+    def should_profile(self):
+        # resolved up-front by `get()`, since the (lazy) user can't be loaded
+        # from inside the event loop
+        return self._should_profile
+
+    async def run_sync(self, func, *args):
+        """
+        Run blocking work (reading the page, serializing, rendering, ...)
+        outside of the event loop.
+
+        Inline when profiling, so that it shows up in the profile.
+        """
+
+        if self._should_profile:
+            return func(*args)
+        return await sync_to_async(func)(*args)
+
+    async def send_early_hints(self):
+        scope = getattr(self.request, "scope", {})
+        send_early_hints = scope.get(SEND_EARLY_HINTS)
+
+        if send_early_hints is not None:
+            links = await self.run_sync(self.get_preload_links)
+            if links:
+                await send_early_hints(links)
+
+    def stream_page(self):
+        """
+        Stream the page, flushing its head before gathering any context.
+
+        (requires django >= 4.2, for async streaming)
+        """
+
+        response = self.check_conditional_response()
+        if response is not None:
+            return response
+
+        renderer = get_page_renderer(self.page_name)
+        timings = RenderTimings()
+
+        async def stream():
+            yield renderer.head
+
+            with track_timings(timings):
+                with timings.phase("context"):
+                    js_context = self.merge_js_context(
+                        *await agather_context(self, self.get_js_context)
+                    )
+                chunk = await self.run_sync(
+                    self.render_streamed_context, renderer, js_context
                 )
 
+            yield chunk
+
+            timings.add_size("html", len(renderer.head) + len(chunk))
+            await self.run_sync(self.send_page_rendered, timings)
+
+        return self.start_streaming_response(stream())
+
+    async def get(self, *args, **kwargs):
+        self.check_page_name()
+        self._should_profile = await sync_to_async(super().should_profile)()
+        await self.send_early_hints()
+
+        if self.should_stream():
+            return await self.run_sync(self.stream_page)
+
+        with self.instrument() as timings:
+            response = await self.run_sync(self.check_conditional_response)
+            if response is None:
+                with timings.phase("context"):
+                    js_context = self.merge_js_context(
+                        *await agather_context(self, self.get_js_context)
+                    )
+
+                response = await self.run_sync(self.render_page, js_context)
+
+        return await self.run_sync(self.finish_response, response, timings)
+
+
+def data_view(request, digest):
+    """Serve the (out-of-band) data stored by `react_pages.data_store`."""
+
+    data = data_store.load(digest)
+    if data is None:
+        raise Http404("React Pages: No such data.")
+
+    response = HttpResponse(data, content_type="application/json")
+    response["Cache-Control"] = data_store.get_cache_control()
+    response["ETag"] = quote_etag(digest)
+
+    return response
+
 
 ########
 # Forms
 ########
 
+# The attributes of every field
+# (cached per form class, unless the instance customized its fields)
 FORM_FIELD_ATTRS = {
     "label",
     "id_for_label",
     "html_name",
     "help_text",
-    "errors",
     "is_hidden",
-    "data",
     "auto_id",  # not sure whether this is relevant
 }
 
-FORM_FIELD_METHODS = {"value", "label_tag", "css_classes", "as_widget", "as_hidden"}
+# dynamic, per form instance (alongside "errors" and "data")
+FORM_FIELD_METHODS = {"value", "css_classes"}
+
+# expensive, rendered through the template engine
+FORM_FIELD_HTML_METHODS = {"label_tag", "as_widget", "as_hidden"}
+
+FORM_HTML_METHODS = {"as_p", "as_table", "as_ul"}
+
+# The HTML representations that can be requested from `serialize_form()`
+#   "as_html" - str(form)
+#   "as_p", "as_table", "as_ul" - the respective form methods
+#   "fields" - per field "as_html", "label_tag", "as_widget", "as_hidden"
+FORM_REPRESENTATIONS = frozenset({"as_html", *FORM_HTML_METHODS, "fields"})
+
+# The constraints sent in the schema, if set on a form field
+FORM_FIELD_CONSTRAINTS = (
+    "required",
+    "disabled",
+    "max_length",
+    "min_length",
+    "max_value",
+    "min_value",
+    "max_digits",
+    "decimal_places",
+)
+
+
+def evaluate_lazy(value):
+    return force_str(value) if isinstance(value, Promise) else value
+
+
+# form class -> {(prefix, auto_id, language): metadata}
+# (weak, since e.g. `ModelFormMixin` creates a new form class per request)
+_form_metadata_cache = weakref.WeakKeyDictionary()
+
+
+def has_base_fields(form: Form):
+    """
+    Whether the fields of form are the same as its class' `base_fields`.
+
+    Forms can customize their fields per instance
+    (e.g. labels, widgets or `required`, in `__init__()`).
+    """
+
+    base_fields = type(form).base_fields
+    if list(form.fields) != list(base_fields):
+        return False
+
+    for name, field in form.fields.items():
+        base_field = base_fields[name]
+        if (
+            type(field) is not type(base_field)
+            or field.label != base_field.label
+            or field.help_text != base_field.help_text
+            or type(field.widget) is not type(base_field.widget)
+            or field.widget.is_hidden != base_field.widget.is_hidden
+            or field.widget.attrs != base_field.widget.attrs
+        ):
+            return False
+
+    return True
+
+
+def get_form_metadata(form: Form):
+    """
+    Return the metadata of all fields in form.
+
+    Cached per form class, prefix, auto_id and active language;
+    unless the instance has changed its fields (see `has_base_fields()`).
+    """
+
+    if not has_base_fields(form):
+        return read_form_metadata(form)
 
-FORM_METHODS = {"as_p", "as_table", "as_ul", "non_field_errors"}
+    class_cache = _form_metadata_cache.setdefault(type(form), {})
+    key = (form.prefix, form.auto_id, translation.get_language())
 
+    try:
+        return class_cache[key]
+    except KeyError:
+        pass
 
-def serialize_form(form: Form):
-    form_json = dict(as_html=str(form))
+    metadata = class_cache[key] = read_form_metadata(form)
+    return metadata
 
-    for i in ("hidden_fields", "visible_fields"):
-        fields = getattr(form, i)()
-        form_json.update({i: [field.name for field in fields]})
+
+def read_form_metadata(form: Form):
+    """Read the metadata of all fields in form, without the cache."""
+
+    hidden_fields, visible_fields = [], []
+    fields = {}
+
+    for field in form:
+        if field.is_hidden:
+            hidden_fields.append(field.name)
+        else:
+            visible_fields.append(field.name)
+
+        # evaluate lazy translations (e.g. labels) right away
+        fields[field.name] = {
+            attr_name: evaluate_lazy(getattr(field, attr_name))
+            for attr_name in FORM_FIELD_ATTRS
+        }
+
+    return {
+        "hidden_fields": hidden_fields,
+        "visible_fields": visible_fields,
+        "fields": fields,
+    }
+
+
+def get_field_schema(field: BoundField):
+    """
+    The schema of a field, without its value & errors.
+
+    Read from the field's current `field` and `widget`,
+    since forms can customize them per instance (e.g. choices, in `__init__()`).
+    """
+
+    widget = field.field.widget
+
+    field_schema = {
+        "name": field.name,
+        "type": type(field.field).__name__,
+        "label": evaluate_lazy(field.label),
+        "html_name": field.html_name,
+        "id_for_label": field.id_for_label,
+        "widget": {
+            "type": type(widget).__name__,
+            "input_type": getattr(widget, "input_type", None),
+            # the "required" / "disabled" attrs are sent as constraints
+            "attrs": dict(widget.attrs),
+            "is_hidden": widget.is_hidden,
+            "allow_multiple_selected": getattr(
+                widget, "allow_multiple_selected", False
+            ),
+        },
+    }
+
+    if field.help_text:
+        field_schema["help_text"] = evaluate_lazy(field.help_text)
+
+    for constraint in FORM_FIELD_CONSTRAINTS:
+        value = getattr(field.field, constraint, None)
+        if value is not None:
+            field_schema[constraint] = value
+
+    return field_schema
+
+
+def serialize_choices(choices):
+    serialized = []
+
+    for value, label in choices:
+        if isinstance(label, (list, tuple)):
+            # an optgroup
+            serialized.append(
+                {"label": force_str(value), "choices": serialize_choices(label)}
+            )
+        else:
+            serialized.append([force_str(value), force_str(label)])
+
+    return serialized
+
+
+def serialize_form_schema(form: Form):
+    """
+    Serialize form as a compact JSON schema, instead of HTML.
+
+    Each field carries its type, widget attrs, choices,
+    (initial / bound) value, errors and constraints;
+    leaving the rendering of controls to JS.
+    """
+
+    form_json = {
+        "prefix": form.prefix,
+        "is_bound": form.is_bound,
+        "is_multipart": form.is_multipart(),
+        "non_field_errors": list(form.non_field_errors()),
+        "fields": [],
+    }
+
+    for field in form:
+        field_json = get_field_schema(field)
+
+        if hasattr(field.field, "choices"):
+            field_json["choices"] = serialize_choices(field.field.choices)
+
+        field_json["value"] = field.value()
+
+        if field.errors:
+            field_json["errors"] = list(field.errors)
+
+        form_json["fields"].append(field_json)
+
+    return form_json
+
+
+def serialize_form(form: Form, representations=()):
+    representations = set(representations)
+    unknown = representations - FORM_REPRESENTATIONS
+    if unknown:
+        raise ValueError(
+            f"React Pages: Unknown form representations {unknown}. "
+            f"Choose from {set(FORM_REPRESENTATIONS)}."
+        )
+
+    metadata = get_form_metadata(form)
+
+    form_json = {
+        "hidden_fields": list(metadata["hidden_fields"]),
+        "visible_fields": list(metadata["visible_fields"]),
+        "fields": [],
+        "non_field_errors": list(form.non_field_errors()),
+    }
+
+    if "as_html" in representations:
+        form_json["as_html"] = str(form)
 
     # serialize form fields
-    form_json["fields"] = []
     for field in form:
         name = field.name
 
         # form field attributes
-        form_json[name] = {
-            attr_name: getattr(field, attr_name) for attr_name in FORM_FIELD_ATTRS
-        }
+        field_json = dict(metadata["fields"][name])
+        field_json["errors"] = list(field.errors)
+        field_json["data"] = field.data
+
         # form field methods
-        form_json[name].update(
+        field_json.update(
             {
                 method_name: getattr(field, method_name)()
                 for method_name in FORM_FIELD_METHODS
             }
         )
 
-        form_json[name]["as_html"] = str(field)
+        if "fields" in representations:
+            field_json.update(
+                {
+                    method_name: getattr(field, method_name)()
+                    for method_name in FORM_FIELD_HTML_METHODS
+                }
+            )
+            field_json["as_html"] = str(field)
 
-        form_json["fields"].append(form_json[name])
+        form_json[name] = field_json
+        form_json["fields"].append(field_json)
 
     form_json.update(
-        {method_name: getattr(form, method_name)() for method_name in FORM_METHODS}
+        {
+            method_name: getattr(form, method_name)()
+            for method_name in FORM_HTML_METHODS & representations
+        }
     )
 
     return form_json
 
 
 class ReactPagesFormView(ReactPageView, FormView):
+    # "html" - see `serialize_form()`
+    # "schema" - see `serialize_form_schema()`
+    form_serialization = "html"
+
+    # The (expensive) HTML representations of the form, sent to JS.
+    # See `FORM_REPRESENTATIONS`. (none of them, by default)
+    # The HTML is rendered through the template engine,
+    # so only opt-in to the ones you need.
+    form_representations = frozenset()
+
+    def serialize_form(self, form):
+        if self.form_serialization == "schema":
+            return serialize_form_schema(form)
+        elif self.form_serialization == "html":
+            return serialize_form(form, representations=self.form_representations)
+        else:
+            raise ValueError(
+                f"React Pages: Unknown form_serialization "
+                f"{repr(self.form_serialization)} in {self.__class__}. "
+                f'Choose one of "html", "schema".'
+            )
+
     def get_js_context(self):
         js_ctx = super().get_js_context()
 
         ctx = super().get_context_data()
         ctx["csrf_token"] = csrf.get_token(self.request)
 
-        s = time()
-        js_ctx["form"] = serialize_form(ctx["form"])
-
-        print((time() - s) * 1000)
+        with timing.phase("form"):
+            js_ctx["form"] = self.serialize_form(ctx["form"])
 
         js_ctx["csrf_token"] = {
             "as_html": CsrfTokenNode().render(context=ctx),
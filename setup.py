@@ -6,7 +6,6 @@
 
 import io
 import os
-import subprocess
 import sys
 from shutil import rmtree
 
@@ -14,7 +13,7 @@ from setuptools import find_packages, setup, Command
 from setuptools.command.develop import develop
 from setuptools.command.install import install
 
-from react_pages.core import overwrite_cache_files
+from react_pages.core import sync_cache_files, install_node_modules
 
 # Package meta-data.
 NAME = "react-pages"
@@ -22,14 +21,14 @@ DESCRIPTION = "A zero-fuss way to create non-node apps with react."
 URL = "https://github.com/pycampers/react-pages"
 EMAIL = "devxpy@gmail.com"
 AUTHOR = "devxpy"
-REQUIRES_PYTHON = ">=3.6.0"
+REQUIRES_PYTHON = ">=3.7.0"
 VERSION = "0.3.2"
 
 # What packages are required for this module to be executed?
 REQUIRED = ["click", "crayons", "halo", "python-dotenv"]
 
 # What packages are optional?
-EXTRA = {"django integration": ["django"], "faster json": ["ujson"]}
+EXTRA = {"django integration": ["django>=3.1"], "faster json": ["orjson"]}
 
 # The rest you shouldn't have to touch too much :)
 # ------------------------------------------------
@@ -90,8 +89,8 @@ class UploadCommand(Command):
 
 
 def post_setup():
-    cache_dir = overwrite_cache_files()
-    subprocess.run(["/usr/bin/env", "npm", "install"], cwd=cache_dir)
+    sync_cache_files()
+    install_node_modules()
 
 
 class PostDevelopCommand(develop):
@@ -133,9 +132,12 @@ setup(
         # Trove classifiers
         # Full list: https://pypi.python.org/pypi?%3Aaction=list_classifiers
         "License :: OSI Approved :: MIT License",
+        "Framework :: Django",
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: Implementation :: CPython",
         "Programming Language :: Python :: Implementation :: PyPy",
     ],
@@ -0,0 +1,53 @@
+import django
+import pytest
+from django.conf import settings
+from django.test import override_settings
+
+
+def pytest_configure():
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY="react-pages-tests",
+        INSTALLED_APPS=[
+            "django.contrib.auth",
+            "django.contrib.contenttypes",
+            "django.contrib.sessions",
+            "react_pages",
+        ],
+        DATABASES={
+            "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+        },
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        },
+        TEMPLATES=[
+            {
+                "BACKEND": "django.template.backends.django.DjangoTemplates",
+                "APP_DIRS": True,
+            }
+        ],
+        ROOT_URLCONF="tests.urls",
+        STATIC_URL="/static/",
+        REACT_PAGES_PROJECT_DIR="/nonexistent",
+    )
+    django.setup()
+
+
+PAGE_HTML = (
+    '<html><head><link href="/static/my_page/css/main.css" rel="stylesheet"></head>'
+    '<body><div id="root"></div><script src="/static/my_page/main.js"></script>'
+    "</body></html>"
+)
+
+
+@pytest.fixture
+def project_dir(tmp_path):
+    """A project, with a single (built) page - "my_page"."""
+
+    (tmp_path / "my_page").mkdir()
+    page_build_dir = tmp_path / "build" / "my_page"
+    page_build_dir.mkdir(parents=True)
+    (page_build_dir / "index.html").write_text(PAGE_HTML)
+
+    with override_settings(REACT_PAGES_PROJECT_DIR=str(tmp_path)):
+        yield tmp_path
@@ -0,0 +1,41 @@
+from react_pages.build_manifest import (
+    BuildManifest,
+    get_page_fingerprint,
+    get_toolchain_fingerprint,
+)
+
+
+def test_env_changes_force_a_rebuild(tmp_path, monkeypatch):
+    npm_prefix = tmp_path / "project"
+    cache_dir = tmp_path / "cache"
+    dest_dir = npm_prefix / "build" / "my_page"
+    (npm_prefix / "my_page").mkdir(parents=True)
+    (npm_prefix / "my_page" / "App.js").write_text("export default 1;\n")
+    (npm_prefix / ".env").write_text("NODE_PATH=.\n")
+    dest_dir.mkdir(parents=True)
+    (dest_dir / "index.html").write_text("<html></html>")
+    cache_dir.mkdir()
+    monkeypatch.delenv("REACT_APP_API_URL", raising=False)
+
+    settings = {
+        "deploy": True,
+        "public url": "/static/my_page/",
+        "src path": str(npm_prefix / "my_page" / "App.js"),
+        "html template": str(cache_dir / "public" / "index.html"),
+        "dest dir": str(dest_dir),
+    }
+
+    def fingerprint():
+        toolchain = get_toolchain_fingerprint(npm_prefix, cache_dir)
+        return get_page_fingerprint(settings, toolchain)
+
+    manifest = BuildManifest(npm_prefix / "build" / ".react-pages-build.json")
+    manifest.record(dest_dir, fingerprint())
+    assert manifest.is_unchanged(dest_dir, fingerprint())
+
+    (npm_prefix / ".env.production").write_text("REACT_APP_API_URL=/api\n")
+    assert not manifest.is_unchanged(dest_dir, fingerprint())
+    manifest.record(dest_dir, fingerprint())
+
+    monkeypatch.setenv("REACT_APP_API_URL", "/v2")
+    assert not manifest.is_unchanged(dest_dir, fingerprint())
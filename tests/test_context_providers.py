@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from django.utils import translation
+
+from react_pages.context_providers import (
+    agather_context,
+    context_provider,
+    gather_context,
+)
+
+
+class View:
+    context_provider_timeout = None
+
+    def __init__(self):
+        self.cancelled = False
+        self.released = threading.Event()
+
+    @context_provider()
+    def slow(self):
+        self.released.wait(1)
+        return "slow"
+
+    @context_provider(timeout=0.05, default="default")
+    def slower(self):
+        time.sleep(0.2)
+        return "slower"
+
+
+class FailingView(View):
+    @context_provider()
+    async def failing(self):
+        raise ValueError("boom")
+
+    @context_provider()
+    async def pending(self):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def test_get_js_context_runs_alongside_providers():
+    view = View()
+
+    def get_js_context():
+        # only returns once the provider is running
+        view.released.set()
+        return {"a": 1}
+
+    js_context, provided = gather_context(view, get_js_context)
+
+    assert js_context == {"a": 1}
+    assert provided == {"slow": "slow", "slower": "default"}
+
+
+def test_async_get_js_context_runs_alongside_providers():
+    view = View()
+
+    async def get_js_context():
+        view.released.set()
+        return {"a": 1}
+
+    js_context, provided = asyncio.run(agather_context(view, get_js_context))
+
+    assert js_context == {"a": 1}
+    assert provided == {"slow": "slow", "slower": "default"}
+
+
+def test_async_failure_cancels_the_rest():
+    view = FailingView()
+    view.released.set()
+
+    async def get_js_context():
+        return {}
+
+    with pytest.raises(ValueError):
+        asyncio.run(agather_context(view, get_js_context))
+
+    assert view.cancelled
+
+
+class TranslatedView(View):
+    @context_provider()
+    def language(self):
+        return translation.get_language()
+
+
+def test_providers_use_the_request_language():
+    view = TranslatedView()
+    view.released.set()
+
+    with translation.override("fr"):
+        js_context, provided = gather_context(view, dict)
+
+    assert provided["language"] == "fr"
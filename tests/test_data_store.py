@@ -0,0 +1,80 @@
+from unittest import mock
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+
+from react_pages import data_store
+from react_pages.data_store import Deferred
+from react_pages.checks import check_data_cache, warn_deferred_data_cache
+from react_pages.templatetags.react_pages import serialize_js_context
+from react_pages.views import data_view
+
+# for `test_url_without_react_pages_urls()`
+urlpatterns = []
+
+DUMMY_CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+def test_store_reuses_cached_data():
+    data = b'{"big": "data"}'
+    cache = data_store.get_cache()
+
+    digest = data_store.store(data)
+    with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+        assert data_store.store(data) == digest
+
+    # only touched, not re-sent
+    cache_set.assert_not_called()
+    assert data_store.load(digest) == data
+
+
+def test_deferred_over_threshold():
+    with override_settings(REACT_PAGES_DEFER_THRESHOLD=10):
+        js_vars, preload = serialize_js_context(
+            "my_page", {"small": 1, "big": "x" * 100}
+        )
+
+    assert js_vars["small"] == b"1"
+    assert js_vars["big"].startswith(b"fetch(")
+    assert len(preload) == 1
+
+    digest = preload[0].rsplit("/", 1)[1].split(".")[0]
+    response = data_view(None, digest)
+    assert response.content == b'"' + b"x" * 100 + b'"'
+
+
+def test_url_without_react_pages_urls():
+    with override_settings(ROOT_URLCONF=__name__):
+        with pytest.raises(ImproperlyConfigured):
+            data_store.get_url("abcd")
+
+
+def test_checks():
+    assert check_data_cache(None) == []
+
+    with override_settings(REACT_PAGES_DEFER_THRESHOLD=1024):
+        assert [e.id for e in check_data_cache(None)] == ["react_pages.W001"]
+
+        with override_settings(CACHES=DUMMY_CACHES):
+            assert [e.id for e in check_data_cache(None)] == ["react_pages.E002"]
+
+        with override_settings(REACT_PAGES_DATA_CACHE="nope"):
+            assert [e.id for e in check_data_cache(None)] == ["react_pages.E001"]
+
+
+def test_data_is_cached_privately():
+    digest = data_store.store(b"{}")
+    assert data_view(None, digest)["Cache-Control"].startswith("private")
+
+    with override_settings(REACT_PAGES_DATA_CACHE_CONTROL="public, max-age=60"):
+        assert data_view(None, digest)["Cache-Control"] == "public, max-age=60"
+
+
+def test_explicit_deferred_warns_about_the_cache(caplog):
+    warn_deferred_data_cache.cache_clear()
+
+    serialize_js_context("my_page", {"a": Deferred(1)})
+    serialize_js_context("my_page", {"b": Deferred(2)})
+
+    assert [r.getMessage().count("W001") for r in caplog.records] == [1]
@@ -0,0 +1,102 @@
+import gc
+
+from django import forms
+
+from react_pages.views import (
+    FORM_REPRESENTATIONS,
+    ReactPagesFormView,
+    _form_metadata_cache,
+    get_form_metadata,
+    serialize_form,
+    serialize_form_schema,
+)
+
+
+class GreetingForm(forms.Form):
+    name = forms.CharField()
+    secret = forms.CharField()
+
+    def __init__(self, user, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.fields["name"].label = f"Hello {user}"
+        self.fields["name"].help_text = f"secret for {user}"
+
+        if user == "bob":
+            self.fields["secret"].required = False
+            self.fields["secret"].widget = forms.HiddenInput()
+
+
+def test_metadata_is_per_instance():
+    alice = serialize_form(GreetingForm("alice"), representations=())
+    bob = serialize_form(GreetingForm("bob"), representations=())
+
+    assert alice["name"]["label"] == "Hello alice"
+    assert bob["name"]["label"] == "Hello bob"
+    assert bob["name"]["help_text"] == "secret for bob"
+
+    assert alice["hidden_fields"] == []
+    assert bob["hidden_fields"] == ["secret"]
+    assert bob["secret"]["is_hidden"]
+
+
+def test_metadata_is_cached_per_class():
+    class PlainForm(forms.Form):
+        name = forms.CharField(label="Name")
+
+    first = get_form_metadata(PlainForm())
+    assert get_form_metadata(PlainForm()) is first
+    assert get_form_metadata(PlainForm(prefix="other")) is not first
+
+    # customized fields bypass the cache
+    assert get_form_metadata(GreetingForm("alice")) is not get_form_metadata(
+        GreetingForm("alice")
+    )
+
+
+def test_html_representations_are_opt_in():
+    assert not ReactPagesFormView.form_representations
+
+    form_json = serialize_form(GreetingForm("alice"))
+    for method_name in ("as_html", "as_p", "as_table", "as_ul"):
+        assert method_name not in form_json
+    assert "as_widget" not in form_json["name"]
+
+    form_json = serialize_form(GreetingForm("alice"), FORM_REPRESENTATIONS)
+    for method_name in ("as_html", "as_p", "as_table", "as_ul"):
+        assert "Hello alice" in form_json[method_name]
+    assert "as_widget" in form_json["name"]
+
+
+class ChoiceForm(forms.Form):
+    color = forms.ChoiceField(choices=[("red", "Red")])
+    nickname = forms.CharField(max_length=10)
+
+    def __init__(self, colors, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.fields["color"].choices = colors
+        self.fields["nickname"].max_length = len(colors)
+        self.fields["nickname"].widget.attrs["placeholder"] = colors[0][1]
+
+
+def test_schema_is_per_instance():
+    for colors in ([("red", "Red")], [("blue", "Blue"), ("green", "Green")]):
+        schema = serialize_form_schema(ChoiceForm(colors))
+        color, nickname = schema["fields"]
+
+        assert color["choices"] == [list(choice) for choice in colors]
+        assert nickname["max_length"] == len(colors)
+        assert nickname["widget"]["attrs"]["placeholder"] == colors[0][1]
+
+
+def test_metadata_cache_doesnt_keep_form_classes_alive():
+    from django.contrib.auth.models import Group
+
+    for _ in range(50):
+        get_form_metadata(forms.modelform_factory(Group, fields=["name"])())
+    gc.collect()
+
+    assert not any(
+        form_class.__name__ == "GroupForm" for form_class in _form_metadata_cache
+    )
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from react_pages.live_reload import live_reload_view
+
+LIVE_RELOAD_SETTINGS = {
+    "REACT_PAGES_LIVE_RELOAD": True,
+    "REACT_PAGES_LIVE_RELOAD_INTERVAL": 0.01,
+}
+
+
+def publish(project_dir, generation):
+    (project_dir / "build" / ".react-pages-generations.json").write_text(
+        json.dumps({"generation": generation, "pages": {"my_page": generation}})
+    )
+
+
+def test_events(project_dir):
+    publish(project_dir, 2)
+
+    with override_settings(**LIVE_RELOAD_SETTINGS):
+        response = live_reload_view(
+            RequestFactory().get("/", {"page": "my_page", "generation": 1})
+        )
+        events = iter(response.streaming_content)
+
+        assert not response.is_async
+        assert next(events).startswith(b"retry:")
+        assert b"event: build" in next(events)
+
+
+def test_async_events_under_asgi(project_dir):
+    publish(project_dir, 1)
+
+    async def read_events():
+        response = live_reload_view(
+            AsyncRequestFactory().get("/", {"page": "my_page", "generation": 1})
+        )
+        assert response.is_async
+
+        events = response.streaming_content.__aiter__()
+        assert (await events.__anext__()).startswith(b"retry:")
+
+        # sleeps on the event loop, until the page is re-built
+        asyncio.get_running_loop().call_later(0.05, publish, project_dir, 2)
+        return await asyncio.wait_for(events.__anext__(), 1)
+
+    with override_settings(**LIVE_RELOAD_SETTINGS):
+        assert b'"generation": 2' in asyncio.run(read_events())
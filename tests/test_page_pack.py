@@ -0,0 +1,85 @@
+import json
+
+import pytest
+from django.test import override_settings
+
+from react_pages.conf import get_page_store
+from react_pages.page_pack import MmapPageStore, write_pack
+from react_pages.templatetags.react_pages import get_page_renderer
+
+MMAP_SETTINGS = {
+    "REACT_PAGES_PAGE_STORE": "mmap",
+    "REACT_PAGES_PAGE_CACHE_CHECK_INTERVAL": 0,
+}
+
+
+@pytest.fixture
+def build_dir(project_dir):
+    build_dir = project_dir / "build"
+    (build_dir / ".react-pages-generations.json").write_text(
+        json.dumps({"generation": 3, "pages": {"my_page": 3}})
+    )
+    return build_dir
+
+
+def test_new_pack_generation_is_picked_up(build_dir):
+    write_pack(build_dir)
+
+    with override_settings(**MMAP_SETTINGS):
+        store = get_page_store()
+        assert isinstance(store, MmapPageStore)
+
+        assert b"main.js" in get_page_renderer("my_page").render({})
+        assert store.generation == 1
+        assert store.get_entry("my_page").generation == 3
+
+        (build_dir / "my_page" / "index.html").write_text(
+            '<html><body><div id="root"></div><script src="v2.js"></script></body></html>'
+        )
+        write_pack(build_dir)
+
+        assert store.generation == 2
+        assert b"v2.js" in get_page_renderer("my_page").render({})
+        assert store.stats()["remaps"] == 2
+
+
+def test_packed_pages_match_the_memory_store(build_dir):
+    page_dir = build_dir / "my_page"
+    (page_dir / "css").mkdir()
+    (page_dir / "css" / "main.css").write_text("body { color: red; }")
+    (page_dir / "asset-manifest.json").write_text(
+        json.dumps({"main.css": "/static/my_page/css/main.css"})
+    )
+    write_pack(build_dir)
+
+    settings = {"REACT_PAGES_INLINE_CSS_MAX_SIZE": 1024, "DEBUG": True}
+    rendered = {}
+
+    for backend in ("memory", "mmap"):
+        with override_settings(REACT_PAGES_PAGE_STORE=backend, **settings):
+            renderer = get_page_renderer("my_page")
+            rendered[backend] = renderer.render({})
+
+    assert rendered["mmap"] == rendered["memory"]
+    assert b"<style>body { color: red; }</style>" in rendered["mmap"]
+    assert b"EventSource" in rendered["mmap"]
+
+
+def test_pages_rebuilt_after_packing_are_served_from_the_build(build_dir):
+    write_pack(build_dir)
+
+    with override_settings(**MMAP_SETTINGS):
+        store = get_page_store()
+        assert b"main.js" in get_page_renderer("my_page").render({})
+
+        # a `react-pages deploy`, without a `react-pages pack`
+        (build_dir / "my_page" / "index.html").write_text(
+            '<html><body><div id="root"></div><script src="v2.js"></script></body></html>'
+        )
+        (build_dir / ".react-pages-generations.json").write_text(
+            json.dumps({"generation": 4, "pages": {"my_page": 4}})
+        )
+
+        assert b"v2.js" in get_page_renderer("my_page").render({})
+        assert store.get_entry("my_page").generation == 4
+        assert store.generation == 1
@@ -0,0 +1,19 @@
+import pytest
+
+from react_pages.page_store import manifest_path_to_relative
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("./css/main.123.css", "css/main.123.css"),
+        ("js/main.123.js", "js/main.123.js"),
+        ("/static/my_page/media/logo.123.svg", "media/logo.123.svg"),
+        ("/static/abcss/js/main.123.js", "js/main.123.js"),
+        ("/static/js/js/main.123.js", "js/main.123.js"),
+        ("/static/media/css/main.123.css", "css/main.123.css"),
+        ("./favicon.ico", "favicon.ico"),
+    ],
+)
+def test_manifest_path_to_relative(path, expected):
+    assert manifest_path_to_relative(path) == expected
@@ -0,0 +1,40 @@
+import json
+
+from react_pages.renderer import PageRenderer, escape_json_for_script
+
+VALUE = {
+    "a": "</script><script>alert(1)</script>",
+    "b": "<!-- x -->",
+    "c": "\u2028\u2029&",
+}
+
+
+def test_escape_json_for_script():
+    data = escape_json_for_script(json.dumps(VALUE, ensure_ascii=False).encode())
+
+    for unsafe in (
+        b"</script",
+        b"<!--",
+        b"<",
+        b">",
+        "\u2028".encode(),
+        "\u2029".encode(),
+    ):
+        assert unsafe not in data
+    assert json.loads(data) == VALUE
+
+
+def test_render_splits_around_the_bundles():
+    renderer = PageRenderer.from_html(
+        "<html><head><script>head()</script></head>"
+        '<body><div id="root"></div><script src="main.js"></script></body></html>'
+    )
+
+    assert renderer.head.endswith(b'<div id="root"></div>')
+    assert renderer.tail.startswith(b'<script src="main.js">')
+
+    data = escape_json_for_script(json.dumps(VALUE, ensure_ascii=False).encode())
+    html = renderer.render({"ctx": data}, root_html=b"<p>hi</p>")
+
+    assert html.count(b"</script>") == 3
+    assert b'<div id="root"><p>hi</p></div><script>const ctx = ' in html
@@ -0,0 +1,111 @@
+import datetime
+import decimal
+import json
+import uuid
+
+import pytest
+from django.db.models import F
+from django.test import override_settings
+from django.utils.translation import gettext_lazy
+
+from react_pages.serializers import (
+    BACKENDS,
+    QuerySetValues,
+    RawJSON,
+    dumps,
+    get_backend,
+    get_default_backend,
+)
+
+VALUE = {
+    "decimal": decimal.Decimal("1.5"),
+    "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "datetime": datetime.datetime(2020, 1, 2, 3, 4, 5, 678901, datetime.timezone.utc),
+    "date": datetime.date(2020, 1, 2),
+    "time": datetime.time(3, 4, 5, 678901),
+    "timedelta": datetime.timedelta(days=1, seconds=2),
+    "tuple": (1, 2),
+    "lazy": gettext_lazy("hello"),
+    "text": "naïve </script>",
+    "nested": [{"a": None, "b": True, "c": 1.25}],
+}
+
+EXPECTED = (
+    '{"decimal":"1.5",'
+    '"uuid":"12345678-1234-5678-1234-567812345678",'
+    '"datetime":"2020-01-02T03:04:05.678Z",'
+    '"date":"2020-01-02",'
+    '"time":"03:04:05.678",'
+    '"timedelta":"P1DT00H00M02S",'
+    '"tuple":[1,2],'
+    '"lazy":"hello",'
+    '"text":"naïve </script>",'
+    '"nested":[{"a":null,"b":true,"c":1.25}]}'
+).encode()
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_backends_produce_the_same_output(name):
+    try:
+        backend = get_backend(name)
+    except ImportError:
+        pytest.skip(f"{name} isn't installed")
+
+    assert backend.dumps(VALUE) == EXPECTED
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_backend("ujson")
+
+
+def test_default_backend_follows_settings():
+    with override_settings(REACT_PAGES_JSON_BACKEND="json"):
+        assert get_default_backend().name == "json"
+        assert dumps({"d": decimal.Decimal("2")}) == b'{"d":"2"}'
+
+    with override_settings(REACT_PAGES_JSON_BACKEND="nope"):
+        with pytest.raises(ValueError):
+            get_default_backend()
+
+
+def test_raw_json_is_emitted_as_is():
+    assert dumps(RawJSON('{"a": 1}')) == b'{"a": 1}'
+
+
+@pytest.fixture
+def groups():
+    from django.contrib.auth.models import Group
+    from django.core.management import call_command
+
+    call_command("migrate", "auth", verbosity=0)
+    Group.objects.bulk_create([Group(name="a"), Group(name="b")])
+    yield Group.objects.order_by("id")
+    Group.objects.all().delete()
+
+
+def test_queryset_values(groups):
+    assert (
+        QuerySetValues(groups, ["name"], chunk_size=1).serialize(get_backend("json"))
+        == b'[{"name":"a"},{"name":"b"}]'
+    )
+
+
+def test_queryset_values_columnar_keeps_the_field_order(groups):
+    ids = list(groups.values_list("id", flat=True))
+    qs = groups.annotate(up=F("name"))
+
+    data = json.loads(
+        QuerySetValues(qs, ["up", "id"], columnar=True).serialize(get_backend("json"))
+    )
+
+    assert data == {"fields": ["up", "id"], "rows": [["a", ids[0]], ["b", ids[1]]]}
+
+
+def test_queryset_values_columnar_without_fields(groups):
+    data = json.loads(
+        QuerySetValues(groups, columnar=True).serialize(get_backend("json"))
+    )
+
+    assert data["fields"] == ["id", "name"]
+    assert [row[1] for row in data["rows"]] == ["a", "b"]
@@ -0,0 +1,102 @@
+import json
+import shutil
+
+import pytest
+from django.test import RequestFactory, override_settings
+
+from react_pages import ssr
+from react_pages.data_store import DeferredPromise
+from react_pages.templatetags.react_pages import get_page
+from react_pages.views import ReactPageView
+
+rf = RequestFactory()
+
+needs_node = pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+
+
+class MyPageView(ReactPageView):
+    page_name = "my_page"
+
+    def get_js_context(self):
+        return {"greeting": "hi"}
+
+
+@pytest.fixture
+def server_bundle(project_dir):
+    """Write the server bundle of "my_page", rendering with the given js."""
+
+    def write(render_js):
+        bundle = project_dir / "build" / "my_page" / ssr.SERVER_BUNDLE
+        bundle.parent.mkdir(parents=True, exist_ok=True)
+        bundle.write_text(f"module.exports = {{render: {render_js}}};")
+        return bundle
+
+    yield write
+    ssr.close()
+
+
+@needs_node
+def test_render(server_bundle):
+    server_bundle("(context) => '<p>' + context.greeting + '</p>'")
+
+    with override_settings(REACT_PAGES_SSR=True):
+        response = MyPageView.as_view()(rf.get("/"))
+
+    assert response.status_code == 200
+    assert b'<div id="root"><p>hi</p></div>' in response.content
+
+
+def test_missing_node_falls_back(server_bundle):
+    server_bundle("() => '<p>server</p>'")
+
+    with override_settings(
+        REACT_PAGES_SSR=True,
+        REACT_PAGES_NODE="/nonexistent/node",
+        REACT_PAGES_SSR_WORKERS=1,
+    ):
+        for _ in range(2):
+            response = MyPageView.as_view()(rf.get("/"))
+
+            assert response.status_code == 200
+            assert b'<div id="root"></div>' in response.content
+
+        # the worker slot was released, after each failure
+        assert ssr.get_pool()._slots.acquire(blocking=False)
+
+
+@needs_node
+def test_timeout_falls_back(server_bundle):
+    server_bundle("() => { for (;;) {} }")
+
+    with override_settings(REACT_PAGES_SSR=True, REACT_PAGES_SSR_TIMEOUT=0.2):
+        js_vars = {"greeting": b'"hi"'}
+        assert ssr.render_root("my_page", get_page("my_page"), js_vars) is None
+
+        # the stuck worker was killed, not put back into the pool
+        assert ssr.get_pool()._idle.empty()
+
+
+def test_stuck_worker_times_out_while_writing(server_bundle, tmp_path):
+    server_bundle("() => '<p>server</p>'")
+
+    # never reads its stdin
+    stuck_node = tmp_path / "stuck-node"
+    stuck_node.write_text("#!/bin/sh\nexec sleep 10\n")
+    stuck_node.chmod(0o755)
+
+    with override_settings(
+        REACT_PAGES_SSR=True,
+        REACT_PAGES_NODE=str(stuck_node),
+        REACT_PAGES_SSR_TIMEOUT=0.2,
+    ):
+        # much bigger than the pipe buffer
+        js_vars = {"greeting": b'"' + b"x" * (1024 * 1024) + b'"'}
+        assert ssr.render_root("my_page", get_page("my_page"), js_vars) is None
+        assert ssr.get_pool()._idle.empty()
+
+
+def test_deferred_values_are_left_out():
+    js_vars = {"a": b"1", "b": DeferredPromise(b'fetch("/data.json")')}
+    payload = json.loads(ssr.make_payload("server.js", js_vars))
+
+    assert payload["context"] == {"a": 1}
@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+
+from django.test import RequestFactory, override_settings
+from django.utils.asyncio import async_unsafe
+from django.utils.functional import SimpleLazyObject
+
+from react_pages.views import AsyncReactPageView, ReactPageView
+
+rf = RequestFactory()
+
+
+class MyPageView(ReactPageView):
+    page_name = "my_page"
+    conditional_response = True
+    context_calls = 0
+
+    def get_js_context(self):
+        MyPageView.context_calls += 1
+        return {"greeting": "hi"}
+
+
+class AsyncMyPageView(AsyncReactPageView):
+    page_name = "my_page"
+    conditional_response = True
+
+    async def get_js_context(self):
+        return {"greeting": "hi"}
+
+
+class VersionedPageView(MyPageView):
+    def get_etag(self):
+        return "v1"
+
+
+def test_render(project_dir):
+    response = MyPageView.as_view()(rf.get("/"))
+
+    assert response.status_code == 200
+    assert b"const greeting = " in response.content
+    assert b'"hi"' in response.content
+
+
+def test_etag_from_context(project_dir):
+    response = MyPageView.as_view()(rf.get("/"))
+    etag = response["ETag"]
+
+    response = MyPageView.as_view()(rf.get("/", HTTP_IF_NONE_MATCH=etag))
+    assert response.status_code == 304
+
+    # a different build of the page, changes the ETag
+    (project_dir / "build" / "my_page" / "index.html").write_text("<html></html>")
+    with override_settings(REACT_PAGES_PAGE_CACHE_CHECK_INTERVAL=0):
+        response = MyPageView.as_view()(rf.get("/", HTTP_IF_NONE_MATCH=etag))
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+def test_user_supplied_etag_skips_context(project_dir):
+    etag = VersionedPageView.as_view()(rf.get("/"))["ETag"]
+
+    calls = MyPageView.context_calls
+    response = VersionedPageView.as_view()(rf.get("/", HTTP_IF_NONE_MATCH=etag))
+
+    assert response.status_code == 304
+    assert MyPageView.context_calls == calls
+
+
+def test_async_etag(project_dir):
+    response = asyncio.run(AsyncMyPageView.as_view()(rf.get("/")))
+    assert response.status_code == 200
+    etag = response["ETag"]
+
+    # the same ETag as the sync view
+    assert MyPageView.as_view()(rf.get("/"))["ETag"] == etag
+
+    request = rf.get("/", HTTP_IF_NONE_MATCH=etag)
+    response = asyncio.run(AsyncMyPageView.as_view()(request))
+    assert response.status_code == 304
+
+
+@async_unsafe
+def load_user():
+    return SimpleNamespace(is_staff=True)
+
+
+def test_async_profiling_loads_the_user_outside_the_event_loop(project_dir):
+    request = rf.get("/?_profile")
+    request.user = SimpleLazyObject(load_user)
+
+    with override_settings(REACT_PAGES_PROFILER_PARAM="_profile"):
+        response = asyncio.run(AsyncMyPageView.as_view()(request))
+
+    assert response["Content-Type"].startswith("text/plain")
@@ -0,0 +1,3 @@
+from django.urls import include, path
+
+urlpatterns = [path("react-pages/", include("react_pages.urls"))]